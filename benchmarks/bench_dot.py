@@ -0,0 +1,43 @@
+"""benchmark DOT output on synthetic package trees
+
+Each package has sub-packages and modules, every module imports
+a module of its parent package.
+Time should grow close to linearly with the number of packages.
+
+    python benchmarks/bench_dot.py
+"""
+
+import io
+import time
+
+from import_deps.__main__ import write_dot
+
+
+def package_tree(num_packages, fanout=4, modules_per_pkg=3):
+    """packages are created breadth-first, `fanout` sub-packages each"""
+    results = []
+    packages = ['pkg']
+    for pkg in packages:
+        if len(packages) < num_packages:
+            packages.extend(f'{pkg}.sub{i}' for i in range(fanout))
+        parent = pkg.rsplit('.', 1)[0]
+        for i in range(modules_per_pkg):
+            imports = [f'{parent}.mod0'] if parent != pkg else []
+            results.append({'module': f'{pkg}.mod{i}', 'imports': imports})
+    return results
+
+
+def main():
+    previous = None
+    for size in (1250, 2500, 5000):
+        results = package_tree(size)
+        start = time.perf_counter()
+        write_dot(results, io.StringIO())
+        elapsed = time.perf_counter() - start
+        ratio = f'x{elapsed / previous:.2f}' if previous else ''
+        print(f'{size:5} packages, {len(results):6} modules: {elapsed:.3f}s {ratio}')
+        previous = elapsed
+
+
+if __name__ == '__main__':
+    main()
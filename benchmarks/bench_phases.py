@@ -0,0 +1,221 @@
+"""benchmark each phase of the analysis on synthetic packages
+
+Packages are generated by `synthetic.py` (on a temporary directory).
+For each size, phases are timed separately (best of `--repeat` runs),
+then executed again under `tracemalloc` (on a new process)
+to get their peak memory allocation.
+
+Results are compared with stored baselines, a phase slower or using more
+memory than its baseline (plus tolerance) is reported as a regression
+and the exit code is 1.
+Baselines depend on the machine, update them with `--save-baseline`.
+
+    python benchmarks/bench_phases.py --sizes 1000,10000
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import pathlib
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+from import_deps import ModuleSet
+from import_deps.__main__ import detect_cycles, topological_sort, write_dot
+from import_deps.discovery import ModuleFinder
+from import_deps.graph import DependencyGraph
+
+import synthetic
+
+
+BASELINE = pathlib.Path(__file__).parent / 'baseline.json'
+
+# differences smaller than this (seconds) are not considered a regression
+MIN_TIME_DIFF = 0.005
+
+
+def discovery(state):
+    state['modules'] = ModuleFinder().find(state['path'])
+
+
+def module_set(state):
+    state['mset'] = ModuleSet(state['modules'])
+
+
+def parse(state):
+    mset = state['mset']
+    state['raw'] = mset.parse_modules(mset.by_name.values())
+
+
+def resolve(state):
+    mset, raw = state['mset'], state['raw']
+    state['results'] = [
+        {'module': name,
+         'imports': sorted(mset._resolve_imports(mod, raw[mod], True))}
+        for name, mod in sorted(mset.by_name.items())]
+
+
+def graph(state):
+    state['graph'] = DependencyGraph.from_results(state['results'])
+
+
+def cycles(state):
+    detect_cycles(state['graph'])
+
+
+def sort(state):
+    topological_sort(state['graph'])
+
+
+def dot(state):
+    write_dot(state['graph'], io.StringIO())
+
+
+PHASES = [discovery, module_set, parse, resolve, graph, cycles, sort, dot]
+
+
+def run_phases(path, repeat=3, memory=True):
+    """time of a phase is the best of `repeat` executions
+    :return: (dict) phase name => dict with `time` and `memory` (bytes)
+    """
+    stats = {phase.__name__: {'time': float('inf')} for phase in PHASES}
+    for _ in range(repeat):
+        state = {'path': path}
+        for phase in PHASES:
+            start = time.perf_counter()
+            phase(state)
+            elapsed = time.perf_counter() - start
+            stats[phase.__name__]['time'] = min(stats[phase.__name__]['time'], elapsed)
+    if memory:
+        # memory allocated by the interpreter (i.e. parser arenas) depends
+        # on previous executions, measure it on a new process
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(1, mp_context=context) as executor:
+            peaks = executor.submit(measure_memory, path).result()
+        for name, peak in peaks.items():
+            stats[name]['memory'] = peak
+    return stats
+
+
+def measure_memory(path):
+    """peak memory allocated by each phase, after an untimed warm-up pass
+    :return: (dict) phase name => bytes
+    """
+    state = {'path': path}
+    for phase in PHASES:
+        phase(state)
+    peaks = {}
+    # phases only depend on state of previous phases, can be executed again
+    for phase in PHASES:
+        tracemalloc.start()
+        phase(dict(state))
+        peaks[phase.__name__] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return peaks
+
+
+def compare(stats, baseline, tolerance, memory_tolerance):
+    """:return: (list - str) description of regressions"""
+    regressions = []
+    for name, phase in stats.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        limit = base['time'] * (1 + tolerance)
+        if phase['time'] > limit and phase['time'] - base['time'] > MIN_TIME_DIFF:
+            regressions.append(f"{name}: time {phase['time']:.3f}s, "
+                               f"baseline {base['time']:.3f}s")
+        if 'memory' in phase and 'memory' in base:
+            if phase['memory'] > base['memory'] * (1 + memory_tolerance):
+                regressions.append(f"{name}: memory {phase['memory'] / 2**20:.1f} MB, "
+                                   f"baseline {base['memory'] / 2**20:.1f} MB")
+    return regressions
+
+
+def print_stats(size, stats, baseline):
+    print(f'{size} modules')
+    for name, phase in stats.items():
+        line = f"  {name:12} {phase['time']:8.3f}s"
+        base = baseline.get(name)
+        if base:
+            line += f" (x{phase['time'] / base['time']:.2f})" if base['time'] else ''
+        if 'memory' in phase:
+            line += f"  {phase['memory'] / 2**20:8.1f} MB"
+            if base and base.get('memory'):
+                line += f" (x{phase['memory'] / base['memory']:.2f})"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', default='1000,10000',
+                        help='comma separated number of modules (default: 1000,10000)')
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--fanout', type=int, default=8)
+    parser.add_argument('--imports', type=int, default=4)
+    parser.add_argument('--relative-ratio', type=float, default=0.3)
+    parser.add_argument('--cycle-density', type=float, default=0.01)
+    parser.add_argument('--baseline', default=str(BASELINE))
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='store results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='accepted time increase (default: 0.5 = 50%%)')
+    parser.add_argument('--memory-tolerance', type=float, default=0.2,
+                        help='accepted memory increase (default: 0.2 = 20%%)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of times phases are timed (default: 3)')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='do not measure memory (faster)')
+    args = parser.parse_args()
+
+    params = {'depth': args.depth, 'fanout': args.fanout, 'imports': args.imports,
+              'relative_ratio': args.relative_ratio,
+              'cycle_density': args.cycle_density}
+    baseline_path = pathlib.Path(args.baseline)
+    baselines = {}
+    if baseline_path.exists():
+        baselines = json.loads(baseline_path.read_text())
+        if baselines.get('params') != params:
+            print('Warning: baseline generated with different parameters, ignored',
+                  file=sys.stderr)
+            baselines = {}
+
+    regressions = []
+    results = {}
+    for size in [int(size) for size in args.sizes.split(',')]:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            synthetic.generate(tmp_dir, size, depth=args.depth, fanout=args.fanout,
+                               imports_per_module=args.imports,
+                               relative_ratio=args.relative_ratio,
+                               cycle_density=args.cycle_density)
+            stats = run_phases(pathlib.Path(tmp_dir) / 'synth', repeat=args.repeat,
+                               memory=not args.no_memory)
+        results[str(size)] = stats
+        baseline = baselines.get('sizes', {}).get(str(size), {})
+        print_stats(size, stats, baseline)
+        regressions.extend(f'{size} modules, {regression}' for regression
+                           in compare(stats, baseline, args.tolerance,
+                                      args.memory_tolerance))
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f'peak RSS: {max_rss / 1024:.1f} MB')
+
+    if args.save_baseline:
+        sizes = baselines.get('sizes', {})
+        sizes.update(results)
+        baseline_path.write_text(json.dumps({'params': params, 'sizes': sizes},
+                                            indent=2, sort_keys=True) + '\n')
+        print(f'baseline saved: {baseline_path}')
+    elif regressions:
+        print('Regressions:')
+        for regression in regressions:
+            print(f'  {regression}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""benchmark topological sort on synthetic wide and deep graphs
+
+Time should grow close to linearly with the number of modules.
+
+    python benchmarks/bench_toposort.py
+"""
+
+import time
+
+from import_deps.__main__ import topological_sort
+
+
+def wide_graph(size):
+    """one core module imported by all others, each imported by a leaf"""
+    results = [{'module': 'core', 'imports': []}]
+    for i in range(size // 2):
+        results.append({'module': f'mid{i:06}', 'imports': ['core']})
+        results.append({'module': f'leaf{i:06}', 'imports': [f'mid{i:06}']})
+    return results
+
+
+def deep_graph(size):
+    """chain of modules, each also importing all of the 3 previous ones"""
+    results = []
+    for i in range(size):
+        imports = [f'm{j:06}' for j in range(max(0, i - 3), i)]
+        results.append({'module': f'm{i:06}', 'imports': imports})
+    return results
+
+
+def main():
+    for name, make_graph in (('wide', wide_graph), ('deep', deep_graph)):
+        previous = None
+        for size in (10000, 20000, 40000):
+            results = make_graph(size)
+            start = time.perf_counter()
+            topological_sort(results)
+            elapsed = time.perf_counter() - start
+            ratio = f'x{elapsed / previous:.2f}' if previous else ''
+            print(f'{name:5} {size:7} modules: {elapsed:.3f}s {ratio}')
+            previous = elapsed
+
+
+if __name__ == '__main__':
+    main()
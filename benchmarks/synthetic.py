@@ -0,0 +1,123 @@
+"""generate synthetic python packages to be analysed by benchmarks
+
+Output is deterministic for given parameters (and seed).
+Modules are spread over a tree of packages (breadth-first).
+Imports of a module point to modules created before it,
+so the graph has no cycles unless `cycle_density` is given.
+
+    python benchmarks/synthetic.py OUT_DIR --modules 10000
+"""
+
+import argparse
+import pathlib
+import random
+
+
+BODY = '''
+
+CONSTANT = {num}
+
+
+class Model{num}(object):
+    """model {num}"""
+    def __init__(self, value):
+        self.value = value
+
+    def double(self):
+        return [self.value * 2 for _ in range(CONSTANT)]
+
+
+def helper(items):
+    total = 0
+    for item in items:
+        if item > CONSTANT:
+            total += item
+    return total
+'''
+
+
+def package_names(num_packages, depth, fanout, root='synth'):
+    """package names (fqn as list) created breadth-first"""
+    packages = [[root]]
+    for pkg in packages:
+        if len(packages) >= num_packages:
+            break
+        if len(pkg) <= depth:
+            for i in range(fanout):
+                packages.append(pkg + [f'p{i}'])
+    return packages[:num_packages]
+
+
+def import_line(source_pkg, target, relative):
+    """import statement of module `target` (fqn) from a module of `source_pkg`"""
+    target_pkg, name = target[:-1], target[-1]
+    if not relative:
+        if len(target) % 2:
+            return f'import {".".join(target)}\n'
+        return f'from {".".join(target_pkg)} import {name}\n'
+    common = 0
+    for a, b in zip(source_pkg, target_pkg):
+        if a != b:
+            break
+        common += 1
+    dots = '.' * (len(source_pkg) - common + 1)
+    return f'from {dots}{".".join(target_pkg[common:])} import {name}\n'
+
+
+def generate(base_path, num_modules, depth=3, fanout=8, imports_per_module=4,
+             relative_ratio=0.3, cycle_density=0.0, seed=0):
+    """write package tree on base_path
+    :param depth: (int) max depth of sub-packages
+    :param fanout: (int) number of sub-packages of each package
+    :param relative_ratio: (float) probability of an import being relative
+    :param cycle_density: (float) probability of an import pointing to a
+                          module created later (creating cycles)
+    :return: (list - str) module names, package `__init__` not included
+    """
+    rand = random.Random(seed)
+    base_path = pathlib.Path(base_path)
+    max_packages = sum(fanout ** level for level in range(depth + 1))
+    num_packages = max(1, min(max_packages, num_modules // 16))
+    packages = package_names(num_packages, depth, fanout)
+    for pkg in packages:
+        pkg_path = base_path.joinpath(*pkg)
+        pkg_path.mkdir(parents=True, exist_ok=True)
+        (pkg_path / '__init__.py').write_text('')
+
+    modules = [packages[num % len(packages)] + [f'm{num}']
+               for num in range(num_modules)]
+    for num, fqn in enumerate(modules):
+        lines = [f'"""synthetic module {num}"""\n']
+        for _ in range(min(num, imports_per_module)):
+            if rand.random() < cycle_density:
+                target = modules[rand.randrange(num, num_modules)]
+            else:
+                target = modules[rand.randrange(num)]
+            if target != fqn:
+                lines.append(import_line(fqn[:-1], target,
+                                         rand.random() < relative_ratio))
+        lines.append(BODY.format(num=num))
+        base_path.joinpath(*fqn[:-1], fqn[-1] + '.py').write_text(''.join(lines))
+    return ['.'.join(fqn) for fqn in modules]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('out', help='output directory')
+    parser.add_argument('--modules', type=int, default=1000)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--fanout', type=int, default=8)
+    parser.add_argument('--imports', type=int, default=4)
+    parser.add_argument('--relative-ratio', type=float, default=0.3)
+    parser.add_argument('--cycle-density', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    names = generate(args.out, args.modules, depth=args.depth, fanout=args.fanout,
+                     imports_per_module=args.imports,
+                     relative_ratio=args.relative_ratio,
+                     cycle_density=args.cycle_density, seed=args.seed)
+    print(f'{len(names)} modules written to {args.out}')
+
+
+if __name__ == '__main__':
+    main()
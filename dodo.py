@@ -1,3 +1,4 @@
+from doit.action import CmdAction
 from doitpy.pyflakes import Pyflakes
 from doitpy.coverage import Coverage, PythonPackage
 
@@ -12,6 +13,7 @@ def task_pyflakes():
     yield flaker.tasks('*.py')
     yield flaker.tasks('import_deps/*.py')
     yield flaker.tasks('tests/*.py')
+    yield flaker.tasks('benchmarks/*.py')
 
 
 def task_coverage():
@@ -22,3 +24,25 @@ def task_coverage():
     )
     yield cov.all() # create task `coverage`
     yield cov.src() # create task `coverage_src`
+
+
+def task_benchmark():
+    """time each phase on synthetic packages, compare with stored baseline"""
+    def cmd(sizes, tolerance, save_baseline):
+        args = f'--sizes {sizes} --tolerance {tolerance}'
+        if save_baseline:
+            args += ' --save-baseline'
+        return f'python benchmarks/bench_phases.py {args}'
+    return {
+        'actions': [CmdAction(cmd)],
+        'params': [
+            {'name': 'sizes', 'long': 'sizes', 'default': '1000,10000',
+             'help': 'comma separated number of modules, i.e. 1000,10000,100000'},
+            {'name': 'tolerance', 'long': 'tolerance', 'type': float, 'default': 0.5,
+             'help': 'accepted time increase over baseline'},
+            {'name': 'save_baseline', 'long': 'save-baseline', 'type': bool,
+             'default': False, 'help': 'store results as the new baseline'},
+        ],
+        'verbosity': 2,
+        'uptodate': [False],
+    }
@@ -1,39 +1,178 @@
 __version__ = (0, 4, 'dev0')
 
 import ast
+import collections
+import concurrent.futures
+import functools
+import mmap
+import os
 import pathlib
+import re
+import time
 
 
-class _ImportsFinder(ast.NodeVisitor):
+class _ImportsFinder(object):
     """find all imports
+
+    Imports are statements, so only fields of statement nodes
+    that contain other statements are visited (expressions are skipped).
+
     :ivar imports: (list - tuple) (module, name, asname, level)
+    :ivar top_level_only: (bool) do not visit body of functions,
+                          only imports executed when module is imported
     """
-    def __init__(self):
-        ast.NodeVisitor.__init__(self)
+    # fields that contain a list of statements (in source order)
+    STMT_FIELDS = ('body', 'handlers', 'orelse', 'finalbody', 'cases')
+    FUNCTIONS = (ast.FunctionDef, ast.AsyncFunctionDef)
+
+    def __init__(self, top_level_only=False):
+        self.top_level_only = top_level_only
         self.imports = []
 
-    def visit_Import(self, node):
-        """callback for 'import' statement"""
-        self.imports.extend((None, n.name, n.asname, None)
-                            for n in node.names)
-        ast.NodeVisitor.generic_visit(self, node)
+    def visit(self, node):
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, ast.Import):
+                self.imports.extend((None, n.name, n.asname, None)
+                                    for n in node.names)
+            elif isinstance(node, ast.ImportFrom):
+                self.imports.extend((node.module, n.name, n.asname, node.level)
+                                    for n in node.names)
+            elif not (self.top_level_only and
+                      isinstance(node, self.FUNCTIONS)):
+                children = []
+                for field in self.STMT_FIELDS:
+                    children.extend(getattr(node, field, ()))
+                stack.extend(reversed(children))
+
 
-    def visit_ImportFrom(self, node):
-        """callback for 'import from' statement"""
-        self.imports.extend((node.module, n.name, n.asname, node.level)
-                            for n in node.names)
-        ast.NodeVisitor.generic_visit(self, node)
+def _parse_imports(source, file_path, top_level_only=False):
+    """get list of imports from python source code
+    :param source: (str or bytes) module's source code
+    :param file_path: used only on error messages
+    :param top_level_only: see `ast_imports()`
+    :return: (list - tuple) (module, name, asname, level)
+    """
+    mod_ast = ast.parse(source, str(file_path))
+    finder = _ImportsFinder(top_level_only)
+    finder.visit(mod_ast)
+    return finder.imports
 
-def ast_imports(file_path):
+
+def ast_imports(file_path, top_level_only=False):
     """get list of import from python module
+    :param top_level_only: (bool) skip imports inside functions,
+                           only imports executed when module is imported
     :return: (list - tuple) (module, name, asname, level)
     """
     with pathlib.Path(file_path).open('r') as fp:
         text = fp.read()
-    mod_ast = ast.parse(text, str(file_path))
-    finder = _ImportsFinder()
-    finder.visit(mod_ast)
-    return finder.imports
+    return _parse_imports(text, file_path, top_level_only)
+
+
+def _timed_parse(parse, path):
+    """:return: (tuple) (imports, time taken in seconds, file size)"""
+    start = time.perf_counter()
+    imports = parse(path)
+    elapsed = time.perf_counter() - start
+    return imports, elapsed, os.stat(path).st_size
+
+
+# files at least this size (bytes) are memory-mapped by prefilter
+PREFILTER_MMAP_SIZE = 64 * 1024
+
+
+def _trie_pattern(words):
+    """regex matching any of given words, with common prefixes factored
+    (faster than a plain alternation for many words)
+    :param words: (iterable - str)
+    :return: (str) regex
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+    def build(node):
+        alts = [re.escape(char) + build(child)
+                for char, child in sorted(node.items()) if char]
+        if not alts:
+            return ''
+        optional = '' in node
+        if len(alts) == 1 and not optional:
+            return alts[0]
+        return '(?:' + '|'.join(alts) + ')' + ('?' if optional else '')
+    return build(trie)
+
+
+def _prefilter_pattern(top_level_names):
+    """compile regex matching source (bytes) of modules that might import
+    one of given top-level packages/modules: any word equal to one of
+    the names or a relative import.
+    :return: (re.Pattern) None if names can not be matched (non-ASCII)
+    """
+    if not all(name.isascii() for name in top_level_names):
+        return None
+    # "from ." also matches "from.mod" and line continuations
+    relative = r'from[\s\\]*\.'
+    if not top_level_names:
+        return re.compile(relative.encode())
+    names = r'(?<![A-Za-z0-9_])(?:{})(?![A-Za-z0-9_])'.format(
+        _trie_pattern(top_level_names))
+    return re.compile('{}|{}'.format(names, relative).encode())
+
+
+def _prefilter_match(pattern, path):
+    """check if content of file matches prefilter pattern"""
+    with open(path, 'rb') as fp:
+        if os.fstat(fp.fileno()).st_size >= PREFILTER_MMAP_SIZE:
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return pattern.search(data) is not None
+        return pattern.search(fp.read()) is not None
+
+
+def _filtered_parse(parse, pattern, path):
+    """parse file only if it matches prefilter pattern
+    :return: import entries, None if file was not parsed
+    """
+    if not _prefilter_match(pattern, path):
+        return None
+    return parse(path)
+
+
+def _parse_chunk(parse, paths, timed=False):
+    """get imports of a list of files (executed on worker processes)
+    :param timed: return result of `_timed_parse()` instead of imports
+    """
+    if timed:
+        return [_timed_parse(parse, path) for path in paths]
+    return [parse(path) for path in paths]
+
+
+def _make_chunks(paths, jobs):
+    """split list of files in chunks with similar total size (in bytes)
+
+    Chunks are returned biggest files first, so a few huge files
+    are processed in parallel from start instead of delaying the end.
+    :return: (list - list - path)
+    """
+    sizes = {path: os.stat(path).st_size for path in paths}
+    target = sum(sizes.values()) / (jobs * 4)
+    chunks = []
+    current = []
+    current_size = 0
+    for path in sorted(paths, key=lambda p: sizes[p], reverse=True):
+        current.append(path)
+        current_size += sizes[path]
+        if current_size >= target:
+            chunks.append(current)
+            current = []
+            current_size = 0
+    if current:
+        chunks.append(current)
+    return chunks
 
 
 ##########
@@ -45,10 +184,10 @@ class PyModule(object):
     :ivar path: (pathlib.Path) module's path
     :ivar fqn: (list - str) full qualified name as list of strings
     """
-    def __init__(self, path):
+    def __init__(self, path, fqn=None):
         self.path = pathlib.Path(path)
         assert self.path.suffix == '.py'
-        self.fqn = self._get_fqn(self.path)
+        self.fqn = self._get_fqn(self.path) if fqn is None else fqn
 
     def __repr__(self):
         return "<PyModule {}>".format(self.path)
@@ -85,19 +224,111 @@ class PyModule(object):
 
 
 class ModuleSet(object):
-    """helper to filter import list only from within packages"""
-    def __init__(self, path_list):
+    """helper to filter import list only from within packages
+
+    :ivar cache: (ParseCache) optional cache of `ast_imports` results
+    :ivar parse: function used to get import entries from a file,
+                 `ast_imports` or `scanner.fast_imports`
+    :ivar max_file_size: (int) files bigger than this (in bytes)
+                         are not parsed, considered to have no imports
+    :ivar skipped: (list - PyModule) modules not parsed due to max_file_size
+    :ivar hooks: (list) functions called for every module parsed or found
+                 on cache: `hook(module, elapsed, size, cached)`.
+                 `elapsed` is time taken to parse in seconds,
+                 `size` number of bytes read (0 for cached modules)
+    :ivar prefilter: (bool) do not parse files that do not contain
+                     the name of any top-level package/module of the set
+                     or a relative import (they can not import modules
+                     of the set). Their import entries are reported as empty,
+                     so they are not stored on cache.
+    :ivar num_prefiltered: (int) number of files not parsed due to prefilter
+    :ivar resolve_hits: (int) number of import entries resolved from memo
+    :ivar resolve_misses: (int) number of import entries looked up on the set
+    """
+    def __init__(self, path_list, cache=None, parse=ast_imports,
+                 max_file_size=None, prefilter=False):
+        """
+        :param path_list: list of module's path or `PyModule`
+        """
+        self.cache = cache
+        self.parse = parse
+        self.max_file_size = max_file_size
+        self.prefilter = prefilter
+        self.num_prefiltered = 0
+        self.skipped = []
+        self.hooks = []
+        self._top_level = collections.Counter() # name => number of modules
+        self._pattern = None # (top-level names, compiled prefilter)
+        self._resolved = {} # entry or name => (path, name) of module or None
+        self.resolve_hits = 0
+        self.resolve_misses = 0
         self.pkgs = set() # str of fqn (dot separed)
         self.by_path = {} # module by path
         self.by_name = {} # module by name (dot separated)
+        self._shadowed = {} # name => other modules with same name
 
         for path in path_list:
-            # create modules object
+            self.add_module(path)
+
+
+    def add_module(self, path):
+        """add a module to the set
+
+        If many modules have the same name (i.e. scripts on different
+        directories) the one with the smallest path is used by `by_name`.
+        :param path: module's path or `PyModule`
+        :return: PyModule
+        """
+        # create modules object
+        if isinstance(path, PyModule):
+            mod = path
+            path = mod.path
+        else:
             mod = PyModule(path)
+        if path in self.by_path:
+            self.remove_module(self.by_path[path])
+        self.by_path[path] = mod
+        self._resolved.clear()
+        name = '.'.join(mod.fqn)
+        current = self.by_name.get(name)
+        if current is None:
             if mod.fqn[-1] == '__init__':
                 self.pkgs.add('.'.join(mod.fqn[:-1]))
-            self.by_path[path] = mod
-            self.by_name['.'.join(mod.fqn)] = mod
+            self._top_level[mod.fqn[0]] += 1
+        elif str(current.path) < str(path):
+            self._shadowed.setdefault(name, []).append(mod)
+            return mod
+        else:
+            self._shadowed.setdefault(name, []).append(current)
+        self.by_name[name] = mod
+        return mod
+
+
+    def remove_module(self, mod):
+        """remove a module (PyModule) from the set.
+        A module with same name takes its place (see `add_module()`).
+        """
+        if self.by_path.get(mod.path) is not mod:
+            return
+        del self.by_path[mod.path]
+        self._resolved.clear()
+        name = '.'.join(mod.fqn)
+        shadowed = self._shadowed.get(name)
+        if self.by_name[name] is not mod:
+            shadowed.remove(mod)
+        elif shadowed:
+            other = min(shadowed, key=lambda m: str(m.path))
+            shadowed.remove(other)
+            self.by_name[name] = other
+        else:
+            del self.by_name[name]
+            if mod.fqn[-1] == '__init__':
+                self.pkgs.discard('.'.join(mod.fqn[:-1]))
+            self._top_level[mod.fqn[0]] -= 1
+            if not self._top_level[mod.fqn[0]]:
+                del self._top_level[mod.fqn[0]]
+        if shadowed is not None and not shadowed:
+            del self._shadowed[name]
 
 
     def _get_imported_module(self, module_name):
@@ -124,33 +355,242 @@ class ModuleSet(object):
             return self.by_name[pkg_name]
 
 
+    def _resolve_entry(self, module, import_entry):
+        """memoized `_get_imported_module()` of an import entry.
+        Absolute imports are memoized by entry (same result for all modules),
+        relative imports by their full name.
+        Memo is cleared when modules are added/removed.
+        :return: (tuple) (path, dot separated name) of imported module,
+                 None if not found
+        """
+        relative = import_entry[3]
+        key = self.import_name(module, import_entry) if relative else import_entry
+        try:
+            resolved = self._resolved[key]
+        except KeyError:
+            self.resolve_misses += 1
+            name = key if relative else self.import_name(module, import_entry)
+            mod = self._get_imported_module(name)
+            resolved = None if mod is None else (mod.path, '.'.join(mod.fqn))
+            self._resolved[key] = resolved
+        else:
+            self.resolve_hits += 1
+        return resolved
+
+
+    def _raw_imports(self, module):
+        """return list of import entries (as `ast_imports`) for module"""
+        return self.parse_modules([module])[module]
+
+
+    def iter_parse(self, modules, jobs=1):
+        """get raw import entries of many modules, as soon as parsed
+
+        Cached modules come first, in given order.
+        Other modules are in given order if `jobs == 1`,
+        on order of completion otherwise.
+        :param modules: (list - PyModule)
+        :param jobs: (int) number of worker processes used to parse files.
+                     0 means number of CPUs
+        :return: (generator - tuple) (PyModule, list of raw import entries)
+        """
+        jobs = jobs or os.cpu_count() or 1
+        to_parse = []
+        for mod in modules:
+            imports = self._lookup(mod)
+            if imports is None:
+                to_parse.append(mod)
+            else:
+                yield mod, imports
+
+        timed = bool(self.hooks)
+        parse_file = self._parse_function()
+        parse = functools.partial(_timed_parse, parse_file) if timed else parse_file
+        if jobs == 1 or len(to_parse) < 2:
+            for mod in to_parse:
+                yield mod, self._parsed(mod, parse(mod.path), timed)
+        else:
+            by_path = {mod.path: mod for mod in to_parse}
+            chunks = _make_chunks(list(by_path), jobs)
+            with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+                futures = {executor.submit(_parse_chunk, parse_file, chunk, timed): chunk
+                           for chunk in chunks}
+                for future in concurrent.futures.as_completed(futures):
+                    for path, result in zip(futures[future], future.result()):
+                        mod = by_path[path]
+                        yield mod, self._parsed(mod, result, timed)
+
+
+    def _parse_function(self):
+        """:return: function that parses a file (given its path),
+                 returns None for files discarded by prefilter
+        """
+        if not self.prefilter:
+            return self.parse
+        names = frozenset(self._top_level)
+        if self._pattern is None or self._pattern[0] != names:
+            self._pattern = (names, _prefilter_pattern(names))
+        if self._pattern[1] is None:
+            return self.parse
+        return functools.partial(_filtered_parse, self.parse, self._pattern[1])
+
+
+    def _lookup(self, mod):
+        """get import entries of a module without parsing it
+        :return: (list - tuple) entries of cached module, empty for modules
+                 bigger than `max_file_size`. None if module must be parsed.
+        """
+        if (self.max_file_size is not None and
+                os.stat(mod.path).st_size > self.max_file_size):
+            self.skipped.append(mod)
+            return []
+        if self.cache is not None:
+            cached = self.cache.lookup(mod.path)
+            if cached is not None:
+                for hook in self.hooks:
+                    hook(mod, 0.0, 0, True)
+                return cached
+        return None
+
+
+    def _parsed(self, mod, result, timed):
+        """store entries of a parsed module on cache and call hooks
+        :param result: result of `_parse_function()` or `_timed_parse()`
+                       if timed
+        :return: (list - tuple) import entries
+        """
+        if timed:
+            imports, elapsed, size = result
+            for hook in self.hooks:
+                hook(mod, elapsed, size, False)
+        else:
+            imports = result
+        if imports is None:
+            # discarded by prefilter, entries are not known
+            self.num_prefiltered += 1
+            return []
+        if self.cache is not None:
+            self.cache.store(mod.path, imports)
+        return imports
+
+
+    def parse_modules(self, modules, jobs=1):
+        """get raw import entries of many modules, see `iter_parse()`
+        :return: (dict) PyModule => (list - tuple) as `ast_imports`
+        """
+        return dict(self.iter_parse(modules, jobs=jobs))
+
+
     def get_imports(self, module, return_fqn=False):
         """return set of imported modules that are in self
         :param module: PyModule
         :return: (set - Path)
                  (set - str) if return_fqn == True
         """
-        # print('####', module.fqn)
-        # print(self.by_name.keys(), '\n\n')
+        return self._resolve_imports(module, self._raw_imports(module),
+                                     return_fqn)
+
+
+    def get_all_imports(self, return_fqn=False, jobs=1):
+        """return imports of all modules, ordered by module name
+        :param jobs: (int) number of worker processes, see `parse_modules()`
+        :return: (list - tuple) (module name, imports as in `get_imports()`)
+        """
+        return sorted(self.iter_imports(return_fqn=return_fqn, jobs=jobs),
+                      key=lambda item: item[0])
+
+
+    def iter_imports(self, return_fqn=False, jobs=1):
+        """imports of all modules, each one as soon as it is parsed
+
+        Modules are not ordered (ordered by name if `jobs == 1` and
+        no module is cached).
+        :param jobs: (int) number of worker processes, see `iter_parse()`
+        :return: (generator - tuple) (module name, imports as in `get_imports()`)
+        """
+        modules = [self.by_name[name] for name in sorted(self.by_name)]
+        for mod, raw in self.iter_parse(modules, jobs=jobs):
+            yield '.'.join(mod.fqn), self._resolve_imports(mod, raw, return_fqn)
+
+
+    async def aiter_imports(self, return_fqn=False, concurrency=8, executor=None):
+        """async version of `iter_imports()`, modules ordered by name
+
+        Files are read and parsed on `executor` (so the event loop is not
+        blocked) with at most `concurrency` modules being processed,
+        a thread waiting to read a file does not prevent others from parsing.
+        New files are only read when results are consumed (backpressure).
+        Closing the generator or cancelling the task consuming it
+        cancels modules not started.
+        :param concurrency: (int) max number of modules processed at once
+        :param executor: (concurrent.futures.Executor) default is a
+                         `ThreadPoolExecutor` with `concurrency` threads.
+                         A `ProcessPoolExecutor` parses files in parallel.
+        :return: (async generator - tuple) (module name, imports as in
+                 `get_imports()`)
+        """
+        import asyncio # only imported when used, slow to import
+        loop = asyncio.get_running_loop()
+        own_executor = executor is None
+        if own_executor:
+            executor = concurrent.futures.ThreadPoolExecutor(concurrency)
+        timed = bool(self.hooks)
+        parse = self._parse_function()
+        if timed:
+            parse = functools.partial(_timed_parse, parse)
+        modules = iter([self.by_name[name] for name in sorted(self.by_name)])
+        # (PyModule, future, must call _parsed()), ordered by name
+        pending = collections.deque()
+        try:
+            while True:
+                while len(pending) < concurrency:
+                    mod = next(modules, None)
+                    if mod is None:
+                        break
+                    imports = self._lookup(mod)
+                    if imports is None:
+                        future = loop.run_in_executor(executor, parse, mod.path)
+                    else:
+                        future = loop.create_future()
+                        future.set_result(imports)
+                    pending.append((mod, future, imports is None))
+                if not pending:
+                    break
+                mod, future, parsed = pending[0]
+                result = await future
+                pending.popleft()
+                imports = self._parsed(mod, result, timed) if parsed else result
+                yield '.'.join(mod.fqn), self._resolve_imports(mod, imports, return_fqn)
+        finally:
+            for _, future, _ in pending:
+                future.cancel()
+            if own_executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+
+    @staticmethod
+    def import_name(module, import_entry):
+        """full name (dot separated) of import entry done by module.
+        Might refer to a module or an object inside a module.
+        """
+        # join 'from' and 'import' part of import statement
+        full = ".".join(s for s in import_entry[:2] if s)
+
+        import_level = import_entry[3]
+        if import_level:
+            # intra package imports
+            return '.'.join(module.fqn[:-import_level] + [full])
+        return full
+
+
+    def _resolve_imports(self, module, raw_imports, return_fqn):
+        """filter raw import entries of module, see `get_imports()`"""
         imports = set()
-        raw_imports = ast_imports(module.path)
+        index = 1 if return_fqn else 0
         for import_entry in raw_imports:
-            # join 'from' and 'import' part of import statement
-            full = ".".join(s for s in import_entry[:2] if s)
-
-            import_level = import_entry[3]
-            if import_level:
-                # intra package imports
-                intra = '.'.join(module.fqn[:-import_level] + [full])
-                imported = self._get_imported_module(intra)
-            else:
-                imported = self._get_imported_module(full)
-
-            if imported:
-                if return_fqn:
-                    imports.add('.'.join(imported.fqn))
-                else:
-                    imports.add(imported.path)
+            resolved = self._resolve_entry(module, import_entry)
+            if resolved is not None:
+                imports.add(resolved[index])
         return imports
 
 
@@ -158,3 +598,96 @@ class ModuleSet(object):
     def mod_imports(self, mod_fqn):
         mod = self.by_name[mod_fqn]
         return self.get_imports(mod, return_fqn=True)
+
+
+
+class LazyModuleSet(ModuleSet):
+    """ModuleSet that finds modules on demand, instead of receiving all
+    modules on initialization.
+
+    To resolve an import, candidate modules are looked up on the file
+    system under `base_path` (`a/b/c.py`, `a/b/c/__init__.py`),
+    results are memoized. Useful to get imports of a few modules
+    without indexing a whole tree.
+
+    Note that, like the python import system, a module is found only if
+    all its parent directories are packages (contain `__init__.py`).
+
+    :ivar base_path: (pathlib.Path) directory that contains top-level
+                     packages/modules (as in PYTHONPATH)
+    :ivar finder: (discovery.ModuleFinder) its exclude/include patterns
+                  are applied to found modules (same modules as
+                  `ModuleSet` of modules found by `finder.find(base_path)`)
+    """
+    def __init__(self, base_path, cache=None, parse=ast_imports,
+                 max_file_size=None, finder=None):
+        ModuleSet.__init__(self, [], cache=cache, parse=parse,
+                           max_file_size=max_file_size)
+        self.base_path = pathlib.Path(base_path)
+        self.finder = finder
+        self._found = {} # name => PyModule or None (not found)
+        self._included = set() # name of found modules matching include
+
+
+    def _excluded(self, parts):
+        """check if file (or one of its directories) matches exclude patterns
+        :param parts: (list - str) path relative to base_path
+        """
+        return any(self.finder._match(self.finder._exclude, name,
+                                      '/'.join(parts[:index + 1]))
+                   for index, name in enumerate(parts))
+
+
+    def _find(self, mod_name):
+        """find module by name on file system
+        :param mod_name: (str) dot separated, packages end with `.__init__`
+        :return: PyModule or None
+        """
+        try:
+            return self._found[mod_name]
+        except KeyError:
+            pass
+        fqn = mod_name.split('.')
+        parent = fqn[:-2] if fqn[-1] == '__init__' else fqn[:-1]
+        mod = None
+        parts = fqn[:-1] + [fqn[-1] + '.py']
+        if all(fqn) and (not parent or
+                         self._find('.'.join(parent) + '.__init__')):
+            path = self.base_path.joinpath(*parts)
+            if path.is_file() and not (self.finder and self._excluded(parts)):
+                mod = PyModule(path, fqn=fqn)
+        self._found[mod_name] = mod
+        # modules not matching include patterns are found (as packages),
+        # but not part of the set
+        if mod is not None and (self.finder is None or
+                                self.finder._include is None or
+                                self.finder._match(self.finder._include,
+                                                   parts[-1], '/'.join(parts))):
+            if fqn[-1] == '__init__':
+                self.pkgs.add('.'.join(fqn[:-1]))
+            self.by_path[mod.path] = mod
+            self.by_name[mod_name] = mod
+            self._included.add(mod_name)
+        return mod
+
+
+    def _find_included(self, mod_name):
+        """find module by name, None if not matching include patterns"""
+        mod = self._find(mod_name)
+        return mod if mod_name in self._included else None
+
+
+    def _get_imported_module(self, module_name):
+        """try to get imported module reference by its name"""
+        no_obj = module_name.rsplit('.', 1)[0]
+        return (self._find_included(module_name) or
+                self._find_included(no_obj) or
+                self._find_included(module_name + '.__init__') or
+                self._find_included(no_obj + '.__init__'))
+
+
+    def mod_imports(self, mod_fqn):
+        mod = self._find(mod_fqn)
+        if mod is None:
+            raise KeyError(mod_fqn)
+        return self.get_imports(mod, return_fqn=True)
@@ -1,370 +1,935 @@
 import argparse
+import functools
+import io
 import json
+import os
 import pathlib
+import sqlite3
 import sys
+import time
 
-from . import __version__, PyModule, ModuleSet
+from . import __version__, PyModule, ModuleSet, LazyModuleSet, ast_imports, _parse_imports
+from .cache import ParseCache, DEFAULT_CACHE_DIR
+from .config import ConfigError, load_config, source_roots
+from .diff import revision_graph, graph_diff
+from .discovery import ModuleFinder, DEFAULT_EXCLUDE, _compile_patterns
+from . import server, watch
+from .git import GitRepo, GitError
+from .graph import DependencyGraph, ReachabilityIndex
+from .scanner import fast_imports, scan_imports
+from .snapshot import GraphSnapshot, save_graph
+from .stats import Stats
+
+
+ENGINES = {
+    'ast': ast_imports,
+    'fast': fast_imports,
+}
+
+# parse source code (bytes) instead of a file
+SOURCE_ENGINES = {
+    'ast': _parse_imports,
+    'fast': scan_imports,
+}
+
+
+def _as_graph(results):
+    if isinstance(results, DependencyGraph):
+        return results
+    return DependencyGraph.from_results(results)
 
 
 def detect_cycles(results):
-    """Detect circular dependencies using DFS
-    Returns set of edges (module, import) that create cycles
+    """Detect circular dependencies using strongly connected components (SCC).
+    :param results: list of dict (module, imports) or DependencyGraph
+    Returns set of edges (module, import) that are part of a cycle
     """
-    # Build adjacency list
-    graph = {}
-    for result in results:
-        module = result['module']
-        graph[module] = result['imports']
-
-    cycle_edges = set()
-    visited = set()
-    rec_stack = set()
-
-    def dfs(node, path):
-        visited.add(node)
-        rec_stack.add(node)
-        path.append(node)
-
-        for neighbor in graph.get(node, []):
-            if neighbor not in visited:
-                if neighbor in graph:  # Only follow if it's in our tracked modules
-                    dfs(neighbor, path)
-            elif neighbor in rec_stack:
-                # Found a cycle - mark all edges in the cycle
-                cycle_start_idx = path.index(neighbor)
-                for i in range(cycle_start_idx, len(path)):
-                    if i + 1 < len(path):
-                        cycle_edges.add((path[i], path[i + 1]))
-                # Add the back edge
-                cycle_edges.add((node, neighbor))
-
-        rec_stack.remove(node)
-        path.pop()
-
-    for module in graph:
-        if module not in visited:
-            dfs(module, [])
-
-    return cycle_edges
+    return _as_graph(results).cycle_edges()
 
 
 def topological_sort(results):
     """Topological sort of modules (dependencies before dependents).
-    Uses Kahn's algorithm with rank-based ordering for stability.
-    Rank is defined as the longest path from any leaf node (module that imports but isn't imported).
-    When multiple nodes become available, nodes with higher rank are output first.
+    See `DependencyGraph.topological_sort()`.
+    :param results: list of dict (module, imports) or DependencyGraph
+    Returns list of module names in topological order (dependencies before dependents).
+    """
+    return _as_graph(results).topological_sort()
 
-    Handles circular dependencies gracefully:
-    - Nodes actually in cycles are identified and processed last
-    - Nodes that depend on cycles (but aren't in them) are processed normally
-    - Isolated nodes (no dependencies, no dependents) are placed last
 
-    Returns list of module names in topological order (dependencies before dependents).
+def dependents(graph, names, include_self=False):
+    """all modules that import, directly or not, any of given modules
+    :param graph: (DependencyGraph)
+    :param names: (iterable - str) module names in graph
+    :param include_self: include given modules in result
+    :return: (list - str) sorted module names
     """
-    # Collect all modules
-    all_modules = set(result['module'] for result in results)
-
-    # Build dependencies: module -> list of modules it imports (its dependencies)
-    dependencies = {module: [] for module in all_modules}
-    for result in results:
-        module = result['module']
-        dependencies[module] = [imp for imp in result['imports'] if imp in all_modules]
-
-    # Build reverse graph: module -> list of modules that import it (its dependents)
-    dependents = {module: [] for module in all_modules}
-
-    for module in all_modules:
-        for dep in dependencies[module]:
-            dependents[dep].append(module)
-
-    # Calculate rank for each node (longest path from any leaf node)
-    # Leaf nodes are those that have no dependents (nothing imports them)
-    # Detect cycles using DFS with recursion stack
-    rank = {}
-    in_cycle = set()
-
-    def calculate_rank(node, visiting=None, rec_path=None):
-        if visiting is None:
-            visiting = set()
-        if rec_path is None:
-            rec_path = []
-
-        if node in rank:
-            return rank[node]
-
-        if node in visiting:
-            # Cycle detected - mark all nodes in the cycle path
-            cycle_start = rec_path.index(node)
-            for i in range(cycle_start, len(rec_path)):
-                in_cycle.add(rec_path[i])
-            in_cycle.add(node)
-            return -1  # Special value for cycles
-
-        visiting.add(node)
-        rec_path.append(node)
-        deps = dependents[node]  # Use dependents (who imports this node)
-
-        if not deps:
-            rank[node] = 1  # Leaf nodes (not imported by anyone) have rank 1
-        else:
-            dep_ranks = []
-            for dep in deps:
-                dep_rank = calculate_rank(dep, visiting, rec_path)
-                if dep_rank == -1:
-                    # Dependent is in cycle
-                    pass
-                else:
-                    dep_ranks.append(dep_rank)
-
-            # Only mark as cycle if this node is actually in the cycle
-            if node in in_cycle:
-                rank[node] = -1
-            elif dep_ranks:
-                rank[node] = max(dep_ranks) + 1
-            else:
-                # All dependents are in cycles, but this node isn't
-                rank[node] = 2
-
-        rec_path.pop()
-        visiting.remove(node)
-        return rank[node]
-
-    for module in all_modules:
-        if module not in rank:
-            calculate_rank(module)
-
-    # Topological sort: start with roots (nodes with no dependencies)
-    # in_degree tracks how many unprocessed dependencies each node has
-    in_degree = {module: len(dependencies[module]) for module in all_modules}
-
-    # Separate cycle nodes and isolated nodes from regular nodes
-    cycle_nodes = {node for node in all_modules if rank[node] == -1}
-    isolated_nodes = {node for node in all_modules
-                      if len(dependencies[node]) == 0 and len(dependents[node]) == 0}
-
-    non_cycle_roots = [node for node in all_modules
-                       if in_degree[node] == 0
-                       and node not in cycle_nodes
-                       and node not in isolated_nodes]
-
-    # Initial queue: non-cycle, non-isolated roots, sorted by rank DESC then name ASC
-    queue = sorted(non_cycle_roots, key=lambda x: (-rank[x], x))
-    sorted_list = []
-
-    while queue:
-        node = queue.pop(0)
-        sorted_list.append(node)
-
-        # Process all dependents of this node (nodes that import this node)
-        for dependent in dependents[node]:
-            if dependent not in cycle_nodes and dependent not in isolated_nodes:
-                in_degree[dependent] -= 1
-                if in_degree[dependent] == 0:
-                    # Insert maintaining rank order (higher rank first)
-                    # Within same rank, maintain FIFO order
-                    dep_rank = rank[dependent]
-                    insert_idx = len(queue)
-                    for i, queued_node in enumerate(queue):
-                        if rank[queued_node] < dep_rank:
-                            insert_idx = i
-                            break
-                    queue.insert(insert_idx, dependent)
-
-    # Handle remaining nodes (cycles and nodes not yet processed, but not isolated)
-    remaining = all_modules - set(sorted_list) - isolated_nodes
-    if remaining:
-        # Add remaining nodes sorted alphabetically
-        sorted_list.extend(sorted(remaining))
-
-    # Add isolated nodes last (sorted alphabetically)
-    if isolated_nodes:
-        sorted_list.extend(sorted(isolated_nodes))
-
-    return sorted_list
+    nodes = [graph.ids[name] for name in names]
+    if not include_self:
+        nodes = [dep for node in nodes for dep in graph.dependents(node)]
+    return sorted(graph.names[node] for node in graph.reverse_reach(nodes))
 
 
 def format_dot(results, highlight_cycles=True):
-    """Format results as DOT graph for graphviz"""
-    lines = ['digraph imports {']
-    lines.append('    rankdir=LR;')
-    lines.append('    node [shape=box, style="rounded,filled", fillcolor=lightblue, fontname="Arial"];')
-    lines.append('    edge [fontname="Arial"];')
+    """Format results as DOT graph for graphviz
+    :param results: list of dict (module, imports) or DependencyGraph
+    """
+    out = io.StringIO()
+    write_dot(results, out, highlight_cycles)
+    return out.getvalue()[:-1]
+
+
+def write_dot(results, out, highlight_cycles=True):
+    """Write DOT graph for graphviz to a stream, line by line
+    Modules are grouped in (nested) clusters by package.
+    :param results: list of dict (module, imports) or DependencyGraph
+    :param out: text stream
+    """
+    graph = _as_graph(results)
+    names = graph.names
+    out.write('digraph imports {\n')
+    out.write('    rankdir=LR;\n')
+    out.write('    node [shape=box, style="rounded,filled", fillcolor=lightblue, fontname="Arial"];\n')
+    out.write('    edge [fontname="Arial"];\n')
 
     # Detect cycles
-    cycle_edges = detect_cycles(results) if highlight_cycles else set()
+    cycle_edges = graph.cycle_edges() if highlight_cycles else set()
 
-    # Group modules by package
+    # Package tree: package => direct children modules / sub-packages.
+    # Only packages that contain modules are part of the tree.
     packages = {}
-    all_modules = set()
-
-    for result in results:
-        module = result['module']
-        all_modules.add(module)
-        # Extract package hierarchy
-        parts = module.split('.')
+    for module in names[:graph.num_modules]:
+        parts = module.rsplit('.', 1)
         if len(parts) > 1:
-            # Get package path (everything except last part)
-            pkg = '.'.join(parts[:-1])
-            if pkg not in packages:
-                packages[pkg] = []
-            packages[pkg].append(module)
-
-    # Create subgraphs for packages
-    def create_subgraph(pkg_name, modules, indent=1):
-        ind = '    ' * indent
-        lines.append(f'{ind}subgraph cluster_{pkg_name.replace(".", "_")} {{')
-        lines.append(f'{ind}    label = "{pkg_name}";')
-        lines.append(f'{ind}    style = "rounded,dashed";')
-        lines.append(f'{ind}    color = gray40;')
-        lines.append(f'{ind}    fontsize = 11;')
-        lines.append(f'{ind}    fontcolor = gray20;')
-        lines.append(f'{ind}    penwidth = 1.5;')
-
-        # Find direct children of this package
-        for mod in sorted(modules):
-            if mod.rsplit('.', 1)[0] == pkg_name:
-                lines.append(f'{ind}    "{mod}";')
-
-        # Find sub-packages
-        sub_pkgs = {}
-        for other_pkg, other_modules in packages.items():
-            if other_pkg.startswith(pkg_name + '.') and other_pkg.count('.') == pkg_name.count('.') + 1:
-                sub_pkgs[other_pkg] = other_modules
-
-        for sub_pkg in sorted(sub_pkgs.keys()):
-            create_subgraph(sub_pkg, sub_pkgs[sub_pkg], indent + 1)
-
-        lines.append(f'{ind}}}')
-
-    # Create top-level packages
+            packages.setdefault(parts[0], []).append(module)
+    sub_pkgs = {}
     top_level_pkgs = set()
     for pkg in packages:
-        top = pkg.split('.')[0]
-        top_level_pkgs.add(top)
-
-    for top_pkg in sorted(top_level_pkgs):
-        pkg_modules = [m for pkg, modules in packages.items()
-                       if pkg.startswith(top_pkg)
-                       for m in modules]
-        if pkg_modules:
-            create_subgraph(top_pkg, pkg_modules)
+        parts = pkg.rsplit('.', 1)
+        if len(parts) > 1:
+            sub_pkgs.setdefault(parts[0], []).append(pkg)
+        top_level_pkgs.add(pkg.split('.', 1)[0])
+
+    # Create subgraphs for packages, depth-first
+    # stack of (package name, indent level), None indent closes a subgraph
+    stack = [(pkg, 1) for pkg in sorted(top_level_pkgs, reverse=True)]
+    while stack:
+        pkg_name, indent = stack.pop()
+        if pkg_name is None:
+            out.write(f'{indent}}}\n')
+            continue
+        ind = '    ' * indent
+        out.write(f'{ind}subgraph cluster_{pkg_name.replace(".", "_")} {{\n')
+        out.write(f'{ind}    label = "{pkg_name}";\n')
+        out.write(f'{ind}    style = "rounded,dashed";\n')
+        out.write(f'{ind}    color = gray40;\n')
+        out.write(f'{ind}    fontsize = 11;\n')
+        out.write(f'{ind}    fontcolor = gray20;\n')
+        out.write(f'{ind}    penwidth = 1.5;\n')
+        for mod in sorted(packages.get(pkg_name, ())):
+            out.write(f'{ind}    "{mod}";\n')
+        stack.append((None, ind))
+        for sub_pkg in sorted(sub_pkgs.get(pkg_name, ()), reverse=True):
+            stack.append((sub_pkg, indent + 1))
 
     # Add edges with cycle detection
-    lines.append('')
-    for result in results:
-        module = result['module']
-
-        for imp in result['imports']:
+    out.write('\n')
+    for node in range(graph.num_modules):
+        module = names[node]
+        for dep in graph.imports(node):
+            imp = names[dep]
             # Check if this edge is part of a cycle
             if (module, imp) in cycle_edges:
-                lines.append(f'    "{module}" -> "{imp}" [color=red, penwidth=2.0];')
+                out.write(f'    "{module}" -> "{imp}" [color=red, penwidth=2.0];\n')
             else:
-                lines.append(f'    "{module}" -> "{imp}";')
-
-    lines.append('}')
-    return '\n'.join(lines)
+                out.write(f'    "{module}" -> "{imp}";\n')
 
+    out.write('}\n')
 
-def main(argv=sys.argv):
-    parser = argparse.ArgumentParser(prog='import_deps')
-    parser.add_argument('path', metavar='PATH',
-                        help='Python file or package directory to analyze')
-    parser.add_argument('--json', action='store_true',
-                        help='Output results in JSON format')
-    parser.add_argument('--dot', action='store_true',
-                        help='Output results in DOT format for graphviz')
-    parser.add_argument('--check', action='store_true',
-                        help='Check for circular dependencies and exit with error if found')
-    parser.add_argument('--sort', action='store_true',
-                        help='Output modules in topological sort order (dependencies first)')
-    parser.add_argument('--version', action='version',
-                        version='.'.join(str(i) for i in __version__))
-    config = parser.parse_args(argv[1:])
 
-    # Check for mutually exclusive flags
-    output_flags = sum([config.json, config.dot, config.sort])
-    if output_flags > 1:
-        print("Error: --json, --dot, and --sort are mutually exclusive", file=sys.stderr)
+def analysis_options(config, path):
+    """get options from command line and configuration file
+    :return: (tuple) (ModuleFinder, parse function, ParseCache or None,
+                      max file size)
+    """
+    try:
+        options = load_config(path)
+    except ConfigError as exc:
+        print(f"Error: {exc}", file=sys.stderr)
         sys.exit(1)
-
-    path = pathlib.Path(config.path)
+    finder = ModuleFinder(
+        exclude=DEFAULT_EXCLUDE + tuple(options.get('exclude', ())) + tuple(config.exclude),
+        include=config.include or options.get('include', ()))
+    max_file_size = config.max_file_size
+    if max_file_size is None:
+        max_file_size = options.get('max-file-size')
+
+    parse = ENGINES[config.engine]
+    # engines are not equivalent (i.e. "fast" does not detect all syntax
+    # errors), each combination of options uses its own cache file
+    name_parts = ['imports']
+    if config.engine != 'ast':
+        name_parts.append(config.engine)
+    if config.top_level_only:
+        parse = functools.partial(parse, top_level_only=True)
+        name_parts.append('top-level')
+    cache_file = '-'.join(name_parts) + '.json'
+    cache = None
+    if not config.no_cache:
+        cache = ParseCache(config.cache_dir, file_name=cache_file)
+    return finder, parse, cache, max_file_size
+
+
+def find_roots(paths, finder):
+    """find modules on all source roots of given directories
+
+    Directories containing a `pyproject.toml` are expanded into their
+    declared source roots (see `config.source_roots()`).
+    Modules found on more than one root are included only once.
+    :return: (tuple) (list - PyModule, list of tuple (root, modules found
+             on root, discovery time in seconds))
+    """
+    roots = []
+    for path in paths:
+        try:
+            path_roots = source_roots(path)
+        except ConfigError as exc:
+            print(f"Error: {exc}", file=sys.stderr)
+            sys.exit(1)
+        for root in path_roots:
+            root = root.resolve()
+            if root not in roots:
+                roots.append(root)
+    modules = []
+    seen = set()
+    root_info = []
+    for root in roots:
+        found = [mod for mod in finder.find(root) if mod.path not in seen]
+        seen.update(mod.path for mod in found)
+        modules.extend(found)
+        root_info.append((root, found, finder.elapsed))
+    return modules, root_info
+
+
+def analyse(config, paths, options=None, stats=None):
+    """find modules on paths and their imports, as specified by command line
+    :param paths: (list - pathlib.Path) a single file or package directories
+    :param options: (tuple) as returned by `analysis_options()`
+    :param stats: (Stats) record time of phases and parsed files
+    :return: (tuple) (list of dict (module, imports),
+                      dict module name => path, base path,
+                      dict module name => raw import entries or None)
+    """
+    path = paths[0]
+    hooks = [] if stats is None else [stats]
+    stats = Stats() if stats is None else stats
+    stats.start('setup')
+    if options is None:
+        options = analysis_options(config, path)
+    finder, parse, cache, max_file_size = options
 
     # Collect data
-    if path.is_file():
+    if len(paths) == 1 and path.is_file():
         # Single file analysis
-        module = PyModule(config.path)
+        stats.start('parse')
+        module = PyModule(path)
         base_path = module.pkg_path().resolve()
-        mset = ModuleSet(base_path.glob('**/*.py'))
-        imports = mset.get_imports(module, return_fqn=True)
+        if config.no_lazy:
+            modules = finder.find(base_path)
+            mset = ModuleSet(modules, cache=cache, parse=parse,
+                             max_file_size=max_file_size)
+        else:
+            mset = LazyModuleSet(base_path, cache=cache, parse=parse,
+                                 max_file_size=max_file_size, finder=finder)
+        mset.hooks.extend(hooks)
+        mod_raw = mset._raw_imports(module)
+        imports = mset._resolve_imports(module, mod_raw, True)
 
         results = [{
             'module': '.'.join(module.fqn),
             'imports': sorted(imports)
         }]
+        raw = {'.'.join(module.fqn): mod_raw}
+
+    elif all(path.is_dir() for path in paths):
+        # Package analysis, all roots on a single ModuleSet
+        stats.start('discovery')
+        modules, root_info = find_roots(paths, finder)
+        roots = [root for root, _, _ in root_info]
+        base_path = pathlib.Path(os.path.commonpath(roots))
+        mset = ModuleSet(modules, cache=cache, parse=parse,
+                         max_file_size=max_file_size, prefilter=config.prefilter)
+        mset.hooks.extend(hooks)
+        if len(mset.by_name) < len(modules):
+            names = {}
+            for mod in modules:
+                names.setdefault('.'.join(mod.fqn), []).append(mod)
+            print("Warning: modules with same name on different roots, "
+                  "only one is used:", file=sys.stderr)
+            for name, mods in sorted(names.items()):
+                if len(mods) > 1:
+                    print(f"  {name}: " + ', '.join(str(mod.path) for mod in mods),
+                          file=sys.stderr)
+
+        stats.start('parse')
+        results = []
+        raw = None
+        if config.jsonl:
+            # stream results, they are not kept in memory
+            try:
+                for mod_name, imports in mset.iter_imports(return_fqn=True,
+                                                           jobs=config.jobs):
+                    print(json.dumps({'module': mod_name, 'imports': sorted(imports)}),
+                          flush=True)
+            except BrokenPipeError:
+                # consumer stopped reading, avoid another error on exit
+                os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+                sys.exit(1)
+        else:
+            known = {}
+            if config.since:
+                known = unchanged_since(config, base_path)
+            to_parse = [mod for mod in modules if mod.path not in known]
+            if config.since:
+                print(f"Parsing {len(to_parse)} of {len(modules)} modules "
+                      f"(changed since {config.since})", file=sys.stderr)
+            if len(roots) == 1 or not hooks:
+                parsed = mset.parse_modules(to_parse, jobs=config.jobs)
+            else:
+                # parse root by root to report time taken by each one
+                parsed = {}
+                for root, found, find_elapsed in root_info:
+                    start = time.perf_counter()
+                    parsed.update(mset.parse_modules(
+                        [mod for mod in found if mod.path not in known],
+                        jobs=config.jobs))
+                    stats.roots.append({
+                        'path': str(root), 'modules': len(found),
+                        'discovery': find_elapsed,
+                        'parse': time.perf_counter() - start})
+            stats.start('resolve')
+            raw = {}
+            for mod_name in sorted(mset.by_name):
+                mod = mset.by_name[mod_name]
+                mod_raw = known[mod.path] if mod.path in known else parsed[mod]
+                raw[mod_name] = mod_raw
+                results.append({
+                    'module': mod_name,
+                    'imports': sorted(mset._resolve_imports(mod, mod_raw, True))
+                })
 
-    elif path.is_dir():
-        # Package analysis
-        base_path = path.resolve()
-        py_files = list(base_path.glob('**/*.py'))
-        mset = ModuleSet(py_files)
+    else:
+        if len(paths) == 1:
+            print(f"Error: {path} is not a valid file or directory", file=sys.stderr)
+        else:
+            print("Error: multiple PATHs must be package directories", file=sys.stderr)
+        sys.exit(1)
+
+    stats.num_prefiltered += mset.num_prefiltered
+    stats.resolve_hits += mset.resolve_hits
+    stats.resolve_misses += mset.resolve_misses
+    if cache is not None:
+        stats.start('cache')
+        cache.save()
+    stats.stop()
+
+    if mset.skipped:
+        print(f"Warning: modules bigger than {max_file_size} bytes were not parsed:",
+              file=sys.stderr)
+        for mod in mset.skipped:
+            print(f"  {mod.path}", file=sys.stderr)
+            if raw is not None:
+                # not known, must be parsed when graph is used by --since
+                raw['.'.join(mod.fqn)] = None
+
+    module_paths = {name: mod.path for name, mod in mset.by_name.items()}
+    return results, module_paths, base_path, raw
+
+
+def saved_options(config):
+    """options that affect raw import entries, stored on saved graphs"""
+    return {'top_level_only': str(int(config.top_level_only))}
 
-        results = []
-        for mod_name in sorted(mset.by_name.keys()):
-            mod = mset.by_name[mod_name]
-            imports = mset.get_imports(mod, return_fqn=True)
-            results.append({
-                'module': mod_name,
-                'imports': sorted(imports)
-            })
 
+def unchanged_since(config, base_path):
+    """raw import entries of modules not modified since git revision
+    `config.since`, taken from graph saved on that revision
+    :return: (dict) module path => raw import entries
+    """
+    try:
+        snapshot = GraphSnapshot(config.base_graph)
+        repo = GitRepo(base_path)
+        changed = repo.changed_files(config.since)
+        tracked = repo.tracked_files()
+    except (ValueError, GitError) as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        sys.exit(1)
+    if snapshot.options != saved_options(config) or snapshot.base_path is None:
+        print(f"Error: {config.base_graph} was saved with different options",
+              file=sys.stderr)
+        sys.exit(1)
+    known = {}
+    for old_path, mod_raw in snapshot.raw_imports().items():
+        try:
+            path = base_path / old_path.relative_to(snapshot.base_path)
+        except ValueError:
+            continue
+        # untracked files (even if ignored) might have been modified
+        rel_path = repo.rel_path(path)
+        if rel_path in tracked and rel_path not in changed:
+            known[path] = mod_raw
+    snapshot.close()
+    return known
+
+
+def _cached_parse(cache, parse, file_path):
+    """raw import entries of a file, taken from cache if available"""
+    if cache is not None:
+        cached = cache.lookup(file_path)
+        if cached is not None:
+            return cached
+    return parse(file_path)
+
+
+def compare(config, path):
+    """compare graphs of git revisions, saved graphs or working tree
+    :return: (dict) see `diff.graph_diff()`
+    """
+    options = analysis_options(config, path)
+    finder, parse, cache, _ = options
+    parse_source = SOURCE_ENGINES[config.engine]
+    if config.top_level_only:
+        parse_source = functools.partial(parse_source, top_level_only=True)
+
+    worktree = None
+    worktree_parse = None
+    if len(config.diff) == 1:
+        # compare with working tree, analysed first so files not modified
+        # since the revision are found on the cache
+        if not path.is_dir():
+            print("Error: PATH must be a package directory", file=sys.stderr)
+            sys.exit(1)
+        worktree = DependencyGraph.from_results(analyse(config, [path], options)[0])
+        worktree_parse = functools.partial(_cached_parse, cache, parse)
+
+    repo = None
+    parsed = {} # blob id => raw imports, shared by revisions
+    graphs = []
+    for rev in config.diff:
+        if os.path.isfile(rev):
+            snapshot = GraphSnapshot(rev)
+            graphs.append(snapshot.graph())
+            snapshot.close()
+            continue
+        if not path.is_dir():
+            print("Error: comparing git revisions requires a package directory",
+                  file=sys.stderr)
+            sys.exit(1)
+        if repo is None:
+            repo = GitRepo(path)
+        graphs.append(revision_graph(repo, rev, path.resolve(), finder=finder,
+                                     parse_source=parse_source, parsed=parsed,
+                                     worktree_parse=worktree_parse))
+    if worktree is not None:
+        graphs.append(worktree)
+    return graph_diff(*graphs)
+
+
+def print_diff(diff, out=sys.stdout):
+    sections = (
+        ('added_modules', 'Added modules'),
+        ('removed_modules', 'Removed modules'),
+        ('added_imports', 'Added imports'),
+        ('removed_imports', 'Removed imports'),
+        ('added_cycles', 'New circular dependencies'),
+        ('removed_cycles', 'Removed circular dependencies'),
+    )
+    if not any(diff.values()):
+        print("No changes in imports.", file=out)
+        return
+    for key, title in sections:
+        if not diff[key]:
+            continue
+        print(f"{title}:", file=out)
+        for item in diff[key]:
+            if key.endswith('_modules'):
+                print(f"  {item}", file=out)
+            elif key.endswith('_imports'):
+                print(f"  {item[0]} -> {item[1]}", file=out)
+            else:
+                print(f"  {', '.join(item)}", file=out)
+
+
+def exit_cycles(cycle_edges):
+    """print result of --check and exit, with error if there are cycles
+    :param cycle_edges: (set - tuple) edges (module, import) part of a cycle
+    """
+    if cycle_edges:
+        print("Circular dependencies detected:", file=sys.stderr)
+
+        # Group cycles by modules involved
+        cycles_by_module = {}
+        for src, dst in cycle_edges:
+            if src not in cycles_by_module:
+                cycles_by_module[src] = []
+            cycles_by_module[src].append(dst)
+
+        for src in sorted(cycles_by_module.keys()):
+            for dst in sorted(cycles_by_module[src]):
+                print(f"  {src} -> {dst}", file=sys.stderr)
+
+        sys.exit(1)
     else:
-        print(f"Error: {config.path} is not a valid file or directory", file=sys.stderr)
+        print("No circular dependencies found.")
+        sys.exit(0)
+
+
+def print_text(results):
+    """print results on text format"""
+    if len(results) == 1:
+        # Single file - just list imports
+        print('\n'.join(results[0]['imports']))
+    else:
+        # Multiple modules - show module names with imports
+        for result in results:
+            print(f"{result['module']}:")
+            for imp in result['imports']:
+                print(f"  {imp}")
+
+
+def watch_path(config, path):
+    """print cycles of path whenever its files change, until stopped"""
+    if not path.is_dir():
+        print("Error: --watch requires a package directory", file=sys.stderr)
         sys.exit(1)
+    finder, parse, _, max_file_size = analysis_options(config, path)
+    graph = watch.IncrementalGraph(path.resolve(), finder=finder, parse=parse,
+                                   max_file_size=max_file_size, jobs=config.jobs)
+    print(f"Watching {len(graph.imports)} modules: "
+          f"loaded in {graph.elapsed * 1000:.1f} ms")
+    watch.print_cycles(graph.cycle_edges)
+    try:
+        watch.run(graph, config.watch_interval)
+    except KeyboardInterrupt:
+        pass
+    sys.exit(0)
+
+
+def serve(config, path):
+    """keep graph of path in memory, answer queries on socket until stopped"""
+    if server.is_running(config.serve):
+        print(f"Error: server already running on {config.serve}", file=sys.stderr)
+        sys.exit(1)
+    finder, parse, _, max_file_size = analysis_options(config, path)
+    graph = watch.IncrementalGraph(path.resolve(), finder=finder, parse=parse,
+                                   max_file_size=max_file_size, jobs=config.jobs)
+    print(f"Serving {len(graph.imports)} modules on {config.serve}: "
+          f"loaded in {graph.elapsed * 1000:.1f} ms", flush=True)
+    try:
+        server.ImportServer(graph).serve(config.serve)
+    except KeyboardInterrupt:
+        pass
+    except OSError as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        sys.exit(1)
+    sys.exit(0)
 
-    # Check for circular dependencies
-    if config.check:
-        cycle_edges = detect_cycles(results)
-        if cycle_edges:
-            print("Circular dependencies detected:", file=sys.stderr)
 
-            # Group cycles by modules involved
-            cycles_by_module = {}
-            for src, dst in cycle_edges:
-                if src not in cycles_by_module:
-                    cycles_by_module[src] = []
-                cycles_by_module[src].append(dst)
+def query_server(config):
+    """send query to server started with --serve, output as done by `run()`"""
+    fields = {}
+    if config.changed:
+        fields['files'] = [os.path.abspath(path) for path in config.changed]
+    if config.rdeps:
+        query = 'rdeps'
+        fields['modules'] = config.rdeps
+    elif config.check:
+        query = 'cycles'
+    elif config.sort:
+        query = 'sort'
+    else:
+        query = 'deps'
+    try:
+        response = server.request(config.connect, query, **fields)
+    except (OSError, ValueError) as exc:
+        print(f"Error: could not query server on {config.connect}: {exc}",
+              file=sys.stderr)
+        sys.exit(1)
+    if 'error' in response:
+        print(f"Error: {response['error']}", file=sys.stderr)
+        sys.exit(1)
 
-            for src in sorted(cycles_by_module.keys()):
-                for dst in sorted(cycles_by_module[src]):
-                    print(f"  {src} -> {dst}", file=sys.stderr)
+    result = response['result']
+    if query == 'cycles':
+        exit_cycles(set(tuple(edge) for edge in result))
+    if config.json:
+        print(json.dumps(result, indent=2))
+    elif query == 'deps':
+        print_text(result)
+    else:
+        for line in result:
+            print(line)
+    sys.exit(0)
 
+
+def run(config, paths, query, stats):
+    """analyse (or load graph) and output results, as specified by command line
+    :param query: (bool) --rdeps, --affected or --query was given
+    :param stats: (Stats) time of each phase is added to it
+    """
+    if config.load_graph:
+        stats.start('load')
+        try:
+            snapshot = GraphSnapshot(config.load_graph)
+        except ValueError as exc:
+            print(f"Error: {exc}", file=sys.stderr)
             sys.exit(1)
+        graph = snapshot.graph()
+        module_paths = snapshot.paths()
+        base_path = snapshot.base_path
+        snapshot.close()
+        results = [{'module': graph.names[node],
+                    'imports': [graph.names[dep] for dep in graph.imports(node)]}
+                   for node in range(graph.num_modules)]
+    else:
+        hooked = stats if config.stats or config.stats_json else None
+        results, module_paths, base_path, raw = analyse(config, paths, stats=hooked)
+        if config.self_check:
+            stats.start('self-check')
+            # full analysis, without cache and prefilter
+            full_config = argparse.Namespace(**vars(config))
+            full_config.since = None
+            full_config.no_cache = True
+            full_config.prefilter = False
+            full_results = analyse(full_config, paths)[0]
+            if full_results != results:
+                full = {result['module']: result['imports'] for result in full_results}
+                got = {result['module']: result['imports'] for result in results}
+                print("Error: self-check failed, result differs from full analysis:",
+                      file=sys.stderr)
+                for name in sorted(full.keys() | got.keys()):
+                    if full.get(name) != got.get(name):
+                        print(f"  {name}", file=sys.stderr)
+                sys.exit(1)
+            print("Self-check passed: result is the same as full analysis", file=sys.stderr)
+        stats.start('graph')
+        graph = DependencyGraph.from_results(results)
+        if config.save_graph:
+            stats.start('save')
+            try:
+                save_graph(config.save_graph, graph, module_paths, base_path, raw,
+                           saved_options(config))
+            except (sqlite3.Error, OSError) as exc:
+                print(f"Error: can not save graph on {config.save_graph}: {exc}",
+                      file=sys.stderr)
+                sys.exit(1)
+
+    # Reachability queries
+    if config.query:
+        stats.start('query')
+        index = ReachabilityIndex(graph)
+        print(f"Reachability index: {index.num_components} components, "
+              f"{index.nbytes / 1024:.1f} KB, built in {index.elapsed * 1000:.1f} ms",
+              file=sys.stderr)
+        if config.query == '-':
+            lines = sys.stdin.read().splitlines()
+        else:
+            lines = pathlib.Path(config.query).read_text().splitlines()
+        answers = []
+        for line in lines:
+            pair = line.split()
+            if not pair or pair[0].startswith('#'):
+                continue
+            if len(pair) != 2:
+                print(f"Error: invalid query: {line}", file=sys.stderr)
+                sys.exit(1)
+            source, target = pair
+            unknown = [name for name in pair if name not in graph.ids]
+            if unknown:
+                print(f"Warning: module not found: {', '.join(unknown)}", file=sys.stderr)
+                reachable = False
+            else:
+                reachable = index.reaches(source, target)
+            answers.append((source, target, reachable))
+        if config.json:
+            print(json.dumps([{'source': source, 'target': target, 'reachable': reachable}
+                              for source, target, reachable in answers], indent=2))
         else:
-            print("No circular dependencies found.")
-            sys.exit(0)
+            for source, target, reachable in answers:
+                print(f"{source} {target} {'yes' if reachable else 'no'}")
+        sys.exit(0)
+
+    # Reverse dependencies
+    if query:
+        stats.start('query')
+        unknown = [name for name in config.rdeps if name not in graph.ids]
+        if unknown:
+            print(f"Error: module not found: {', '.join(unknown)}", file=sys.stderr)
+            sys.exit(1)
+        selected = set(dependents(graph, config.rdeps))
+        by_path = {mod_path: name for name, mod_path in module_paths.items()}
+        changed = []
+        for file_name in config.affected:
+            name = by_path.get(pathlib.Path(file_name).resolve())
+            if name is None or name not in graph.ids:
+                print(f"Warning: {file_name} is not an analysed module", file=sys.stderr)
+            else:
+                changed.append(name)
+        selected.update(dependents(graph, changed, include_self=True))
+
+        if config.tests:
+            patterns = _compile_patterns(config.tests)
+            def is_test(name):
+                mod_path = module_paths.get(name)
+                if mod_path is None:
+                    return False
+                rel_path = mod_path.relative_to(base_path).as_posix()
+                return ModuleFinder._match(patterns, mod_path.name, rel_path)
+            selected = set(name for name in selected if is_test(name))
+
+        # module names for --rdeps, file paths for --affected
+        if config.affected:
+            output = sorted(str(module_paths[name]) for name in selected
+                            if name in module_paths)
+        else:
+            output = sorted(selected)
+        if config.json:
+            print(json.dumps(output, indent=2))
+        else:
+            for line in output:
+                print(line)
+        sys.exit(0)
+
+    # Check for circular dependencies
+    if config.check:
+        stats.start('cycles')
+        exit_cycles(detect_cycles(graph))
 
     # Output results
+    stats.start('output')
     if config.json:
         print(json.dumps(results, indent=2))
+    elif config.jsonl:
+        # single file, package directory output was already streamed
+        for result in results:
+            print(json.dumps(result))
     elif config.dot:
-        print(format_dot(results))
+        write_dot(graph, sys.stdout)
     elif config.sort:
-        sorted_modules = topological_sort(results)
+        sorted_modules = topological_sort(graph)
         for module in sorted_modules:
             print(module)
     else:
-        # Text format
-        if len(results) == 1:
-            # Single file - just list imports
-            print('\n'.join(results[0]['imports']))
-        else:
-            # Multiple modules - show module names with imports
-            for result in results:
-                print(f"{result['module']}:")
-                for imp in result['imports']:
-                    print(f"  {imp}")
+        print_text(results)
 
     sys.exit(0)
 
+
+def main(argv=sys.argv):
+    parser = argparse.ArgumentParser(prog='import_deps')
+    parser.add_argument('paths', metavar='PATH', nargs='*',
+                        help='Python file or package directories to analyze '
+                             '(source roots declared on pyproject.toml are expanded)')
+    parser.add_argument('--json', action='store_true',
+                        help='Output results in JSON format')
+    parser.add_argument('--jsonl', action='store_true',
+                        help='Output one JSON object per line, each module '
+                        'is printed as soon as it is analysed (unordered)')
+    parser.add_argument('--dot', action='store_true',
+                        help='Output results in DOT format for graphviz')
+    parser.add_argument('--check', action='store_true',
+                        help='Check for circular dependencies and exit with error if found')
+    parser.add_argument('--sort', action='store_true',
+                        help='Output modules in topological sort order (dependencies first)')
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='ast',
+                        help='How imports are extracted from source: "ast" parses whole module, '
+                        '"fast" scans the source for import statements (default: %(default)s)')
+    parser.add_argument('--top-level-only', action='store_true',
+                        help='Skip imports inside functions (only imports executed when module is imported)')
+    parser.add_argument('--jobs', '-j', metavar='N', type=int, default=1,
+                        help='Number of processes used to parse files, 0 for number of CPUs (default: 1)')
+    parser.add_argument('--cache-dir', metavar='DIR', default=DEFAULT_CACHE_DIR,
+                        help='Directory to store cache of parsed files (default: %(default)s)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Do not read or write the cache of parsed files')
+    parser.add_argument('--exclude', metavar='PATTERN', action='append', default=[],
+                        help='Glob pattern of files/directories to skip (can be repeated). '
+                        'Added to default patterns: ' + ' '.join(DEFAULT_EXCLUDE))
+    parser.add_argument('--include', metavar='PATTERN', action='append', default=[],
+                        help='Glob pattern of files to analyze (can be repeated)')
+    parser.add_argument('--max-file-size', metavar='BYTES', type=int, default=None,
+                        help='Do not parse files bigger than BYTES')
+    parser.add_argument('--prefilter', action='store_true',
+                        help='Do not parse files that do not contain the name of any '
+                        'analysed top-level package or a relative import')
+    parser.add_argument('--no-lazy', action='store_true',
+                        help='On single file analysis, find all modules of the package '
+                        'instead of looking up only imported modules')
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep running, report circular dependencies whenever files change')
+    parser.add_argument('--watch-interval', metavar='SECONDS', type=float, default=1.0,
+                        help='Time between polls for file changes on --watch mode (default: %(default)s)')
+    parser.add_argument('--rdeps', metavar='MODULE', action='append', default=[],
+                        help='Output modules that import MODULE, directly or indirectly (can be repeated)')
+    parser.add_argument('--affected', metavar='FILE', nargs='+', default=[],
+                        help='Output files of modules affected by changes on FILE '
+                        '(the modules and all modules that import them)')
+    parser.add_argument('--tests', metavar='PATTERN', action='append', default=[],
+                        help='With --rdeps or --affected, only output modules whose file '
+                        'matches glob PATTERN, i.e. "test_*.py" (can be repeated)')
+    parser.add_argument('--query', metavar='FILE',
+                        help='Answer if module A imports module B, directly or indirectly, '
+                        'for each line "A B" of FILE ("-" for stdin)')
+    parser.add_argument('--save-graph', metavar='FILE',
+                        help='Save modules and imports on a SQLite database')
+    parser.add_argument('--load-graph', metavar='FILE',
+                        help='Use graph saved with --save-graph instead of analysing PATH')
+    parser.add_argument('--diff', metavar='REV', nargs='+',
+                        help='Compare imports of PATH at git revision REV with working tree, '
+                        'or between 2 revisions. REV can also be a file saved with --save-graph')
+    parser.add_argument('--since', metavar='REV',
+                        help='Only parse files modified (on git) since revision REV, '
+                        'imports of other files are taken from --base-graph')
+    parser.add_argument('--base-graph', metavar='FILE',
+                        help='Graph saved with --save-graph on revision given by --since')
+    parser.add_argument('--self-check', action='store_true',
+                        help='Check the result is the same as a full analysis without cache')
+    parser.add_argument('--stats', action='store_true',
+                        help='Print time of each phase and parse statistics to stderr')
+    parser.add_argument('--stats-json', metavar='FILE',
+                        help='Write time of each phase and parse statistics as JSON '
+                             'to FILE ("-" for stderr)')
+    parser.add_argument('--stats-slowest', metavar='N', type=int, default=10,
+                        help='Number of slowest files to parse on stats (default: 10)')
+    parser.add_argument('--serve', metavar='SOCKET',
+                        help='Keep graph of PATH in memory, answer queries on '
+                             'Unix socket SOCKET')
+    parser.add_argument('--connect', metavar='SOCKET',
+                        help='Get result from server started with --serve '
+                             '(with --json, --check, --sort or --rdeps)')
+    parser.add_argument('--changed', metavar='FILE', nargs='+', default=[],
+                        help='With --connect: files that might have been modified, '
+                             'other files are not checked')
+    parser.add_argument('--version', action='version',
+                        version='.'.join(str(i) for i in __version__))
+    config = parser.parse_args(argv[1:])
+    config.path = config.paths[0] if config.paths else None
+    if config.jobs < 0:
+        print("Error: --jobs must be 0 or greater", file=sys.stderr)
+        sys.exit(1)
+
+    # Check for mutually exclusive flags
+    output_flags = sum([config.json, config.jsonl, config.dot, config.sort])
+    if output_flags > 1:
+        print("Error: --json, --jsonl, --dot, and --sort are mutually exclusive",
+              file=sys.stderr)
+        sys.exit(1)
+    if config.jsonl and (config.check or config.watch):
+        print("Error: --jsonl can not be used with --check or --watch", file=sys.stderr)
+        sys.exit(1)
+    if config.connect:
+        if (config.paths or config.jsonl or config.dot or config.affected
+                or config.query or config.watch or config.diff or config.load_graph
+                or config.save_graph or config.since or config.self_check
+                or config.stats or config.stats_json or config.serve):
+            print("Error: --connect can only be used with --json, --check, --sort, "
+                  "--rdeps and --changed", file=sys.stderr)
+            sys.exit(1)
+        query_server(config)
+    if config.changed:
+        print("Error: --changed requires --connect", file=sys.stderr)
+        sys.exit(1)
+    if config.serve:
+        if (len(config.paths) != 1 or not pathlib.Path(config.path).is_dir()
+                or config.json or config.jsonl or config.dot or config.sort
+                or config.check or config.rdeps or config.affected or config.query
+                or config.watch or config.diff or config.load_graph
+                or config.save_graph or config.since or config.self_check
+                or config.stats or config.stats_json):
+            print("Error: --serve requires a single package directory "
+                  "and no other mode or output option", file=sys.stderr)
+            sys.exit(1)
+        serve(config, pathlib.Path(config.path))
+    query = bool(config.rdeps or config.affected or config.query)
+    if query and (config.jsonl or config.dot or config.sort or config.check or config.watch):
+        print("Error: --rdeps, --affected and --query can only be used with --json",
+              file=sys.stderr)
+        sys.exit(1)
+    if config.query and (config.rdeps or config.affected):
+        print("Error: --query can not be used with --rdeps or --affected", file=sys.stderr)
+        sys.exit(1)
+
+    if config.load_graph:
+        if config.path is not None or config.watch:
+            print("Error: --load-graph can not be used with PATH or --watch", file=sys.stderr)
+            sys.exit(1)
+    elif config.path is None and not config.diff:
+        print("Error: PATH is required (unless --load-graph is used)", file=sys.stderr)
+        sys.exit(1)
+    if len(config.paths) > 1 and (config.watch or config.diff or config.since):
+        print("Error: --watch, --diff and --since take a single PATH", file=sys.stderr)
+        sys.exit(1)
+    if config.diff:
+        if len(config.diff) > 2:
+            print("Error: --diff takes 1 or 2 revisions", file=sys.stderr)
+            sys.exit(1)
+        if (query or config.load_graph or config.save_graph or config.watch
+                or config.since or config.jsonl or config.dot or config.sort
+                or config.stats or config.stats_json):
+            print("Error: --diff can only be used with --json and --check", file=sys.stderr)
+            sys.exit(1)
+        path = pathlib.Path(config.path or '.')
+        try:
+            diff = compare(config, path)
+        except (GitError, ValueError) as exc:
+            print(f"Error: {exc}", file=sys.stderr)
+            sys.exit(1)
+        if config.json:
+            print(json.dumps(diff, indent=2))
+        else:
+            print_diff(diff, sys.stdout)
+        sys.exit(1 if config.check and diff['added_cycles'] else 0)
+    if config.since or config.self_check:
+        if config.load_graph or config.watch or config.jsonl:
+            print("Error: --since and --self-check can not be used with "
+                  "--load-graph, --watch or --jsonl", file=sys.stderr)
+            sys.exit(1)
+        if config.since and not (config.base_graph and config.path
+                                 and pathlib.Path(config.path).is_dir()):
+            print("Error: --since requires --base-graph and a package directory",
+                  file=sys.stderr)
+            sys.exit(1)
+    if (config.stats or config.stats_json) and config.watch:
+        print("Error: --stats can not be used with --watch", file=sys.stderr)
+        sys.exit(1)
+    if config.jsonl and config.save_graph:
+        print("Error: --jsonl can not be used with --save-graph", file=sys.stderr)
+        sys.exit(1)
+    if config.prefilter and config.save_graph:
+        # raw entries of files discarded by prefilter are not known
+        print("Error: --prefilter can not be used with --save-graph", file=sys.stderr)
+        sys.exit(1)
+
+    paths = [pathlib.Path(path) for path in config.paths]
+    if query and not config.load_graph and not all(path.is_dir() for path in paths):
+        print("Error: --rdeps, --affected and --query require a package directory",
+              file=sys.stderr)
+        sys.exit(1)
+
+    if config.watch:
+        watch_path(config, paths[0])
+
+    stats = Stats(config.stats_slowest)
+    try:
+        run(config, paths, query, stats)
+    finally:
+        stats.stop()
+        if config.stats:
+            stats.write(sys.stderr)
+        if config.stats_json == '-':
+            print(json.dumps(stats.report(), indent=2), file=sys.stderr)
+        elif config.stats_json:
+            with open(config.stats_json, 'w') as fp:
+                json.dump(stats.report(), fp, indent=2)
+
 if __name__ == '__main__':
     main(sys.argv)
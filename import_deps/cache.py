@@ -0,0 +1,168 @@
+"""persistent on-disk cache for `ast_imports` results"""
+
+import hashlib
+import json
+import os
+import time
+
+from . import ast_imports
+
+
+DEFAULT_CACHE_DIR = '.import_deps_cache'
+DEFAULT_MAX_ENTRIES = 200000
+FILE_NAME = 'imports.json'
+
+# a file modified less than this (ns) before it was read might be
+# modified again without changing its mtime (coarse file system timestamps)
+RACY_NS = 2 * 10**9
+
+
+class ParseCache(object):
+    """Cache of raw import entries per file, persisted between runs.
+
+    An entry is valid while file's path, mtime and size are unchanged.
+    Files modified recently (`RACY_NS`) are not stored.
+    If `use_hash` is set, a file whose mtime/size changed is hashed and
+    its entry is re-used if the content is the same (i.e. after a
+    `git checkout` that touches files without modifying them).
+
+    Results of different parse options must be stored on different
+    files, see `file_name`.
+
+    :ivar hits: (int) number of lookups served from cache
+    :ivar misses: (int) number of files that had to be parsed
+    """
+    VERSION = 1
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, use_hash=False,
+                 max_entries=DEFAULT_MAX_ENTRIES, file_name=FILE_NAME):
+        self.cache_dir = cache_dir
+        self.file_name = file_name
+        self.use_hash = use_hash
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        # run counter, used to evict oldest entries first
+        self._run = 0
+        # path (str) => [mtime_ns, size, hash, imports, run when stored]
+        self._entries = {}
+        # stat/hash of files not found on lookup, used by store()
+        self._pending = {}
+        self._load()
+
+    @property
+    def file_path(self):
+        return os.path.join(self.cache_dir, self.file_name)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _load(self):
+        try:
+            with open(self.file_path, 'r') as fp:
+                data = json.load(fp)
+        except (OSError, ValueError):
+            return
+        if data.get('version') != self.VERSION:
+            return
+        self._run = data['run'] + 1
+        self._entries = data['entries']
+
+    @staticmethod
+    def _hash(content):
+        return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+    def lookup(self, file_path):
+        """get cached import entries for file
+        :return: (list - tuple) or None if there is no valid entry
+        """
+        key = os.path.abspath(file_path)
+        stat = os.stat(key)
+        entry = self._entries.get(key)
+        if (entry is not None and entry[0] == stat.st_mtime_ns
+                and entry[1] == stat.st_size):
+            self.hits += 1
+            return [tuple(imp) for imp in entry[3]]
+
+        content_hash = None
+        if self.use_hash:
+            with open(key, 'rb') as fp:
+                content_hash = self._hash(fp.read())
+            if entry is not None and content_hash == entry[2]:
+                self.hits += 1
+                imports = [tuple(imp) for imp in entry[3]]
+                if not self._racy(stat.st_mtime_ns):
+                    self._entries[key] = [stat.st_mtime_ns, stat.st_size,
+                                          content_hash, entry[3], self._run]
+                    self._dirty = True
+                return imports
+        self.misses += 1
+        self._pending[key] = (stat.st_mtime_ns, stat.st_size, content_hash)
+        return None
+
+    @staticmethod
+    def _racy(mtime):
+        """file might be modified again keeping same mtime"""
+        return mtime > time.time_ns() - RACY_NS
+
+    def store(self, file_path, imports):
+        """save import entries of a file previously missed by `lookup()`"""
+        key = os.path.abspath(file_path)
+        mtime, size, content_hash = self._pending.pop(key)
+        if self._racy(mtime):
+            return
+        self._entries[key] = [mtime, size, content_hash, imports, self._run]
+        self._dirty = True
+
+    def ast_imports(self, file_path):
+        """same as `import_deps.ast_imports` but use cached value if available
+        :return: (list - tuple) (module, name, asname, level)
+        """
+        imports = self.lookup(file_path)
+        if imports is None:
+            imports = ast_imports(file_path)
+            self.store(file_path, imports)
+        return imports
+
+    def _evict(self):
+        """enforce `max_entries`.
+        Entries for deleted files are removed first,
+        then the oldest entries.
+        """
+        if len(self._entries) <= self.max_entries:
+            return
+        for key in [k for k, e in self._entries.items()
+                    if e[4] != self._run and not os.path.exists(k)]:
+            del self._entries[key]
+        excess = len(self._entries) - self.max_entries
+        if excess > 0:
+            by_age = sorted(self._entries, key=lambda k: self._entries[k][4])
+            for key in by_age[:excess]:
+                del self._entries[key]
+
+    def save(self):
+        """write cache to disk (only if modified).
+        Errors writing the cache are ignored.
+        """
+        if not self._dirty:
+            return
+        self._evict()
+        data = {
+            'version': self.VERSION,
+            'run': self._run,
+            'entries': self._entries,
+        }
+        tmp_path = self.file_path + '.{}.tmp'.format(os.getpid())
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            ignore_path = os.path.join(self.cache_dir, '.gitignore')
+            if not os.path.exists(ignore_path):
+                with open(ignore_path, 'w') as fp:
+                    fp.write('# created by import_deps\n*\n')
+            with open(tmp_path, 'w') as fp:
+                json.dump(data, fp, separators=(',', ':'))
+            os.replace(tmp_path, self.file_path)
+        except OSError:
+            return
+        self._dirty = False
@@ -0,0 +1,134 @@
+"""read configuration from `[tool.import_deps]` section of pyproject.toml"""
+
+import pathlib
+import sys
+
+try:
+    import tomllib
+except ImportError: # python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+
+SECTION = 'tool.import_deps'
+
+# option => (type, description), values are validated on `load_config()`
+OPTION_TYPES = {
+    'exclude': (list, 'a list of strings'),
+    'include': (list, 'a list of strings'),
+    'roots': (list, 'a list of strings'),
+    'max-file-size': (int, 'an integer'),
+}
+
+
+class ConfigError(Exception):
+    """invalid configuration file"""
+
+
+def find_pyproject(path):
+    """find nearest pyproject.toml on given path or its parents
+    :return: (pathlib.Path) or None if not found
+    """
+    path = pathlib.Path(path).resolve()
+    if not path.is_dir():
+        path = path.parent
+    for directory in (path, *path.parents):
+        candidate = directory / 'pyproject.toml'
+        if candidate.is_file():
+            return candidate
+    return None
+
+
+def _warn_no_toml(pyproject):
+    """warn that pyproject.toml can not be read (no `tomli` on python < 3.11)"""
+    content = pyproject.read_text()
+    if ('[{}]'.format(SECTION) in content or
+            '[tool.setuptools.packages.find]' in content):
+        print('Warning: install "tomli" to read configuration from {}'
+              .format(pyproject), file=sys.stderr)
+
+
+def _load(pyproject):
+    """:raise ConfigError: if file can not be parsed"""
+    try:
+        with pyproject.open('rb') as fp:
+            return tomllib.load(fp)
+    except (OSError, tomllib.TOMLDecodeError) as exc:
+        raise ConfigError('invalid {}: {}'.format(pyproject, exc))
+
+
+def _section(pyproject, data):
+    """get `[tool.import_deps]` section, checking type of values
+    :raise ConfigError: if a value has a wrong type
+    """
+    section = data.get('tool', {}).get('import_deps', {})
+    for key, (value_type, description) in OPTION_TYPES.items():
+        if key not in section:
+            continue
+        value = section[key]
+        if value_type is list:
+            valid = (isinstance(value, list) and
+                     all(isinstance(item, str) for item in value))
+        else:
+            valid = isinstance(value, int) and not isinstance(value, bool)
+        if not valid:
+            raise ConfigError('invalid {}: {}.{} must be {}'.format(
+                pyproject, SECTION, key, description))
+    return section
+
+
+def load_config(path):
+    """get configuration for analysing given path
+
+    Only nearest pyproject.toml is used, even if it doesn't
+    contain a `[tool.import_deps]` section.
+    :return: (dict) options from section, keys as in the toml file
+    :raise ConfigError: if file can not be parsed or has invalid values
+    """
+    pyproject = find_pyproject(path)
+    if pyproject is None:
+        return {}
+    if tomllib is None:
+        _warn_no_toml(pyproject)
+        return {}
+    return _section(pyproject, _load(pyproject))
+
+
+def source_roots(path):
+    """source roots of a project directory
+
+    Roots are declared on pyproject.toml located on given directory,
+    as glob patterns in `[tool.import_deps] roots`, or as directories
+    in `[tool.setuptools.packages.find] where` (i.e. "src" layout).
+    :return: (list - pathlib.Path) `[path]` if no roots are declared
+    :raise ConfigError: if file can not be parsed or has invalid values
+    """
+    path = pathlib.Path(path)
+    pyproject = path / 'pyproject.toml'
+    if not pyproject.is_file():
+        return [path]
+    if tomllib is None:
+        _warn_no_toml(pyproject)
+        return [path]
+    data = _load(pyproject)
+    patterns = _section(pyproject, data).get('roots')
+    if patterns is None:
+        packages = data.get('tool', {}).get('setuptools', {}).get('packages', {})
+        find = packages.get('find') if isinstance(packages, dict) else None
+        if isinstance(find, dict):
+            patterns = find.get('where')
+            if not (isinstance(patterns, list) and
+                    all(isinstance(item, str) for item in patterns)):
+                patterns = None
+    if not patterns:
+        return [path]
+    roots = []
+    for pattern in patterns:
+        if pattern.strip('/') in ('', '.'):
+            roots.append(path)
+        else:
+            roots.extend(sorted(root for root in path.glob(pattern.strip('/'))
+                                if root.is_dir()))
+    return roots
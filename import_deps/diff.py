@@ -0,0 +1,87 @@
+"""compare import graphs, i.e. of 2 git revisions"""
+
+from . import ModuleSet, _parse_imports
+from .discovery import ModuleFinder
+from .graph import DependencyGraph
+
+
+def revision_graph(repo, rev, base_path, finder=None, parse_source=_parse_imports,
+                   parsed=None, worktree_parse=None):
+    """import graph of modules on base_path at a git revision
+
+    Files are read from git objects (not checked out).
+    :param repo: (git.GitRepo)
+    :param base_path: directory (on working tree) to be analysed
+    :param parse_source: function (source bytes, file path) => raw import entries
+    :param parsed: (dict) blob id => raw import entries.
+                   Blobs in this dict are not parsed again, newly parsed
+                   blobs are added (share between revisions)
+    :param worktree_parse: function (path) => raw import entries, used to
+                           get imports of files that are not modified on the
+                           working tree since rev (i.e. using the cache)
+    :return: (DependencyGraph)
+    """
+    finder = ModuleFinder() if finder is None else finder
+    parsed = {} if parsed is None else parsed
+    tree = repo.ls_tree(rev)
+    base_rel = repo.rel_path(base_path)
+    prefix = base_rel + '/' if base_rel else ''
+
+    # packages above base_path
+    parent_fqn = []
+    directory = base_rel.rpartition('/')[0] if base_rel else ''
+    while directory and directory + '/__init__.py' in tree:
+        directory, _, name = directory.rpartition('/')
+        parent_fqn.insert(0, name)
+
+    rel_paths = [path[len(prefix):] for path in tree if path.startswith(prefix)]
+    modules = finder.find_paths(base_path, rel_paths, parent_fqn or None)
+
+    unchanged = set()
+    if worktree_parse is not None:
+        changed = repo.changed_files(rev)
+        unchanged = set(mod.path for mod in modules
+                        if prefix + mod.path.relative_to(base_path).as_posix()
+                        not in changed)
+    blob_ids = {}
+    for mod in modules:
+        if mod.path not in unchanged:
+            blob_ids[mod.path] = tree[prefix + mod.path.relative_to(base_path).as_posix()]
+    to_read = set(obj_id for obj_id in blob_ids.values() if obj_id not in parsed)
+    paths = {obj_id: path for path, obj_id in blob_ids.items()}
+    for obj_id, content in repo.cat_blobs(sorted(to_read)):
+        parsed[obj_id] = parse_source(content, '{}:{}'.format(rev, paths[obj_id]))
+
+    def parse(path):
+        if path in unchanged:
+            return worktree_parse(path)
+        return parsed[blob_ids[path]]
+    mset = ModuleSet(modules, parse=parse)
+    return DependencyGraph((name, sorted(imports)) for name, imports
+                           in mset.get_all_imports(return_fqn=True))
+
+
+def graph_diff(old, new):
+    """compare 2 graphs
+    :param old: (DependencyGraph)
+    :param new: (DependencyGraph)
+    :return: (dict) sorted lists of `added_modules`, `removed_modules`,
+             `added_imports`, `removed_imports` (module, import),
+             `added_cycles`, `removed_cycles` (sorted list of modules in SCC)
+    """
+    def get_sets(graph):
+        names = graph.names
+        modules = set(names[:graph.num_modules])
+        edges = set((names[node], names[dep]) for node, dep in graph.edges())
+        cycles = set(frozenset(members) for members, _ in graph.cycles())
+        return modules, edges, cycles
+    old_modules, old_edges, old_cycles = get_sets(old)
+    new_modules, new_edges, new_cycles = get_sets(new)
+    return {
+        'added_modules': sorted(new_modules - old_modules),
+        'removed_modules': sorted(old_modules - new_modules),
+        'added_imports': sorted(new_edges - old_edges),
+        'removed_imports': sorted(old_edges - new_edges),
+        'added_cycles': sorted(sorted(scc) for scc in new_cycles - old_cycles),
+        'removed_cycles': sorted(sorted(scc) for scc in old_cycles - new_cycles),
+    }
@@ -0,0 +1,199 @@
+"""find python modules in a directory tree"""
+
+import fnmatch
+import os
+import pathlib
+import re
+import time
+
+from . import PyModule
+
+
+# directories that are not part of the analysed code.
+# "build" and "dist" only on the top directory, packages might use these names.
+DEFAULT_EXCLUDE = (
+    '.git', '.hg', '.svn',
+    '.venv', 'venv', '.tox', '.nox', 'site-packages',
+    '/build', '/dist', '*.egg-info', '.eggs', 'node_modules',
+    '__pycache__', '.mypy_cache', '.pytest_cache', '.ruff_cache',
+)
+
+
+def _compile_patterns(patterns):
+    """compile glob patterns into 2 regex: for names and relative paths
+
+    Patterns containing a "/" are matched against the path relative
+    to the base path (a leading "/" is ignored),
+    others against the file/directory name.
+    :return: (tuple) (name_re or None, path_re or None)
+    """
+    name_patterns = []
+    path_patterns = []
+    for pattern in patterns:
+        pattern = pattern.rstrip('/')
+        if '/' in pattern:
+            path_patterns.append(fnmatch.translate(pattern.lstrip('/')))
+        else:
+            name_patterns.append(fnmatch.translate(pattern))
+    return tuple(re.compile('|'.join(pats)) if pats else None
+                 for pats in (name_patterns, path_patterns))
+
+
+class ModuleFinder(object):
+    """Find all python modules in a directory tree with a single walk.
+
+    Directories are listed once with `os.scandir()`, the presence of
+    `__init__.py` is recorded while walking, so the full qualified name
+    of modules is computed without extra `stat` calls
+    (as done by `PyModule` for every single module).
+
+    Symbolic links to directories are not followed.
+
+    Directories and files matching an `exclude` glob pattern are skipped,
+    excluded directories are not listed at all.
+    If `include` patterns are given, only files matching them are returned.
+
+    :ivar elapsed: (float) time in seconds taken by last `find()`
+    :ivar num_dirs: (int) number of directories listed
+    :ivar num_files: (int) number of python modules found
+    :ivar num_excluded: (int) number of files and directories excluded
+    :ivar dirs: (list - str) directories listed by last `find()`
+    """
+    def __init__(self, exclude=DEFAULT_EXCLUDE, include=()):
+        self._exclude = _compile_patterns(exclude)
+        self._include = _compile_patterns(include) if include else None
+        self.elapsed = 0.0
+        self.num_dirs = 0
+        self.num_files = 0
+        self.num_excluded = 0
+        self.dirs = []
+
+    @staticmethod
+    def _match(patterns, name, rel_path):
+        name_re, path_re = patterns
+        return bool((name_re and name_re.match(name)) or
+                    (path_re and path_re.match(rel_path)))
+
+    @staticmethod
+    def _pkg_fqn(path):
+        """return fqn (list - str) of package on given path,
+        None if path is not a package"""
+        if path.name in ('', '.', '..') or not PyModule.is_pkg(path):
+            return None
+        return PyModule._get_fqn(path / '__init__.py')[:-1]
+
+    def find(self, base_path):
+        """find modules on base_path and its sub-directories
+        :param base_path: (str or pathlib.Path) directory
+        :return: (list - PyModule)
+        """
+        start = time.perf_counter()
+        modules = []
+        self.dirs = []
+        base_path = pathlib.Path(base_path)
+        prefix_len = len(os.path.join(str(base_path), ''))
+        # stack of (directory path, directory name, fqn of parent package)
+        stack = [(str(base_path), base_path.name,
+                  self._pkg_fqn(base_path.parent))]
+        while stack:
+            dir_path, dir_name, parent_fqn = stack.pop()
+            self.num_dirs += 1
+            self.dirs.append(dir_path)
+            sub_dirs = []
+            py_files = []
+            has_init = False
+            try:
+                with os.scandir(dir_path) as entries:
+                    for entry in entries:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        if not (is_dir or entry.name.endswith('.py')):
+                            continue
+                        rel_path = entry.path[prefix_len:]
+                        if os.sep != '/':
+                            rel_path = rel_path.replace(os.sep, '/')
+                        if self._match(self._exclude, entry.name, rel_path):
+                            self.num_excluded += 1
+                        elif is_dir:
+                            sub_dirs.append(entry)
+                        elif entry.is_file():
+                            if entry.name == '__init__.py':
+                                has_init = True
+                            if (self._include is None or self._match(
+                                    self._include, entry.name, rel_path)):
+                                py_files.append(entry)
+            except OSError:
+                continue
+
+            dir_fqn = None
+            if has_init and dir_name not in ('', '.', '..'):
+                dir_fqn = (parent_fqn or []) + [dir_name]
+            for entry in py_files:
+                name = entry.name[:-3]
+                fqn = [name] if dir_fqn is None else dir_fqn + [name]
+                modules.append(PyModule(pathlib.Path(entry.path), fqn=fqn))
+            self.num_files += len(py_files)
+
+            for entry in reversed(sub_dirs):
+                stack.append((entry.path, entry.name, dir_fqn))
+        self.elapsed = time.perf_counter() - start
+        return modules
+
+    def find_paths(self, base_path, file_paths, parent_fqn=None):
+        """find modules on a list of files instead of walking directories
+
+        Same result as `find()` on a directory containing only given
+        files, i.e. files of a git tree.
+        :param base_path: (str or pathlib.Path) directory
+        :param file_paths: (iterable - str) "/" separated, relative to base_path
+        :param parent_fqn: (list - str) fqn of package containing base_path,
+                           None if it is not inside a package
+        :return: (list - PyModule)
+        """
+        start = time.perf_counter()
+        base_path = pathlib.Path(base_path)
+        excluded = {'': False} # directory => excluded
+        def is_excluded(rel_dir):
+            if rel_dir not in excluded:
+                parent, _, name = rel_dir.rpartition('/')
+                excluded[rel_dir] = (is_excluded(parent) or
+                                     self._match(self._exclude, name, rel_dir))
+            return excluded[rel_dir]
+
+        py_files = []
+        init_dirs = set()
+        for rel_path in sorted(file_paths):
+            if not rel_path.endswith('.py'):
+                continue
+            rel_dir, _, name = rel_path.rpartition('/')
+            if is_excluded(rel_dir) or self._match(self._exclude, name, rel_path):
+                self.num_excluded += 1
+                continue
+            if name == '__init__.py':
+                init_dirs.add(rel_dir)
+            if (self._include is None or
+                    self._match(self._include, name, rel_path)):
+                py_files.append((rel_dir, name))
+
+        dir_fqns = {} # directory => fqn, None if not a package
+        def get_fqn(rel_dir):
+            if rel_dir not in dir_fqns:
+                if rel_dir:
+                    parent, _, name = rel_dir.rpartition('/')
+                    parent_pkg = get_fqn(parent)
+                else:
+                    name, parent_pkg = base_path.name, parent_fqn
+                fqn = None
+                if rel_dir in init_dirs and name not in ('', '.', '..'):
+                    fqn = (parent_pkg or []) + [name]
+                dir_fqns[rel_dir] = fqn
+            return dir_fqns[rel_dir]
+
+        modules = []
+        for rel_dir, name in py_files:
+            dir_fqn = get_fqn(rel_dir)
+            fqn = [name[:-3]] if dir_fqn is None else dir_fqn + [name[:-3]]
+            path = base_path / rel_dir / name if rel_dir else base_path / name
+            modules.append(PyModule(path, fqn=fqn))
+        self.num_files += len(modules)
+        self.elapsed = time.perf_counter() - start
+        return modules
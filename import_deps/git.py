@@ -0,0 +1,91 @@
+"""read files of a git repository at any revision, without a checkout"""
+
+import pathlib
+import subprocess
+
+
+class GitError(Exception):
+    """git command failed or path is not inside a git repository"""
+
+
+class GitRepo(object):
+    """Git repository containing a path.
+
+    :ivar top: (pathlib.Path) top level directory of the working tree
+    """
+    def __init__(self, path):
+        path = pathlib.Path(path).resolve()
+        if not path.is_dir():
+            path = path.parent
+        self.top = path
+        self.top = pathlib.Path(self._run('rev-parse', '--show-toplevel').strip())
+
+    def _run(self, *args):
+        try:
+            proc = subprocess.run(('git',) + args, cwd=str(self.top),
+                                  stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError as exc:
+            raise GitError('could not execute git: {}'.format(exc))
+        if proc.returncode != 0:
+            raise GitError(proc.stderr.decode(errors='replace').strip())
+        return proc.stdout.decode('utf-8', errors='surrogateescape')
+
+    def rel_path(self, path):
+        """path relative to top directory, "/" separated ("" for top)"""
+        rel = pathlib.Path(path).resolve().relative_to(self.top).as_posix()
+        return '' if rel == '.' else rel
+
+    def ls_tree(self, rev):
+        """all files at given revision
+        :return: (dict) path relative to top => blob id
+        """
+        files = {}
+        for line in self._run('ls-tree', '-r', '-z', '--full-tree', rev).split('\0'):
+            if not line:
+                continue
+            info, path = line.split('\t', 1)
+            _, obj_type, obj_id = info.split()
+            if obj_type == 'blob':
+                files[path] = obj_id
+        return files
+
+    def changed_files(self, rev, other=None):
+        """files modified, added or deleted between 2 revisions.
+        Renamed files are reported with both old and new paths.
+        :param other: revision, working tree if not given
+        :return: (set - str) paths relative to top
+        """
+        args = ['diff', '--no-renames', '--name-only', '-z', rev]
+        if other is not None:
+            args.append(other)
+        args.append('--')
+        return set(path for path in self._run(*args).split('\0') if path)
+
+    def tracked_files(self):
+        """files tracked by git (on the index)
+        :return: (set - str) paths relative to top
+        """
+        output = self._run('ls-files', '-z')
+        return set(path for path in output.split('\0') if path)
+
+    def cat_blobs(self, obj_ids):
+        """read content of many objects with a single git process
+        :param obj_ids: (iterable - str)
+        :return: (generator - tuple) (object id, content as bytes)
+        """
+        proc = subprocess.Popen(['git', 'cat-file', '--batch'], cwd=str(self.top),
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        try:
+            for obj_id in obj_ids:
+                proc.stdin.write(obj_id.encode() + b'\n')
+                proc.stdin.flush()
+                header = proc.stdout.readline().split()
+                if len(header) != 3:
+                    raise GitError('object not found: {}'.format(obj_id))
+                content = proc.stdout.read(int(header[2]))
+                proc.stdout.read(1) # newline after content
+                yield obj_id, content
+        finally:
+            proc.stdin.close()
+            proc.stdout.close()
+            proc.wait()
@@ -0,0 +1,412 @@
+"""graph algorithms on import graphs
+
+A graph is a dict: node => iterable of nodes (imported modules).
+Nodes not present as keys of the dict are ignored.
+"""
+
+import heapq
+import sys
+import time
+from array import array
+
+
+def strongly_connected_components(graph, nodes=None):
+    """find strongly connected components (SCC) with Tarjan's algorithm
+
+    Iterative implementation, runs in linear time and doesn't hit
+    the recursion limit on long import chains.
+    :param graph: (dict) node => iterable of nodes
+    :param nodes: (iterable) only find SCCs reachable from these nodes,
+                  default: all nodes of graph
+    :return: (list - list) every SCC, dependencies before dependents
+    """
+    index = {}
+    lowlink = {}
+    on_stack = set()
+    stack = []
+    result = []
+    for root in (graph if nodes is None else nodes):
+        if root in index or root not in graph:
+            continue
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(graph[root]))]
+        while work:
+            node, successors = work[-1]
+            for succ in successors:
+                if succ not in graph:
+                    continue
+                if succ not in index:
+                    index[succ] = lowlink[succ] = len(index)
+                    stack.append(succ)
+                    on_stack.add(succ)
+                    work.append((succ, iter(graph[succ])))
+                    break
+                if succ in on_stack and index[succ] < lowlink[node]:
+                    lowlink[node] = index[succ]
+            else:
+                # all successors visited
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    if lowlink[node] < lowlink[parent]:
+                        lowlink[parent] = lowlink[node]
+                if lowlink[node] == index[node]:
+                    scc = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        scc.append(member)
+                        if member == node:
+                            break
+                    result.append(scc)
+    return result
+
+
+def cycles(graph, nodes=None):
+    """find circular dependencies
+
+    A cycle is a SCC with more than one node, or a node that imports itself.
+    :param nodes: see `strongly_connected_components()`
+    :return: (list - tuple) (set of nodes in SCC, set of edges in SCC)
+    """
+    result = []
+    for scc in strongly_connected_components(graph, nodes):
+        members = set(scc)
+        edges = set((node, dep) for node in scc
+                    for dep in graph[node] if dep in members)
+        if edges:
+            result.append((members, edges))
+    return result
+
+
+class DependencyGraph(object):
+    """Import graph with module names interned as integer ids.
+
+    Edges are stored in compact arrays (CSR format), for both directions:
+    imports of node `i` are `targets[offsets[i]:offsets[i+1]]`.
+
+    Analysed modules get ids `0 .. num_modules - 1` (in given order),
+    imported names that are not analysed modules get the following ids
+    (they have no imports).
+
+    :ivar names: (list - str) module name by id
+    :ivar ids: (dict) module name => id
+    :ivar num_modules: (int) number of analysed modules
+    """
+    def __init__(self, modules):
+        """
+        :param modules: (iterable - tuple) (module name, list of imported names)
+        """
+        self.names = []
+        self.ids = {}
+        imports = []
+        for name, imported in modules:
+            imports.append((self._intern(name), imported))
+        self.num_modules = len(self.names)
+
+        self._offsets = array('i', [0])
+        self._targets = array('i')
+        by_id = [()] * self.num_modules
+        for node, imported in imports:
+            by_id[node] = imported
+        for imported in by_id:
+            self._targets.extend(self._intern(name) for name in imported)
+            self._offsets.append(len(self._targets))
+        for _ in range(self.num_modules, len(self.names)):
+            self._offsets.append(len(self._targets))
+
+        # reverse edges (counting sort by target), sources in id order
+        size = len(self.names)
+        counts = [0] * (size + 1)
+        for target in self._targets:
+            counts[target + 1] += 1
+        for i in range(size):
+            counts[i + 1] += counts[i]
+        self._rev_offsets = array('i', counts)
+        rev_targets = [0] * len(self._targets)
+        position = counts[:-1]
+        for source in range(self.num_modules):
+            for i in range(self._offsets[source], self._offsets[source + 1]):
+                target = self._targets[i]
+                rev_targets[position[target]] = source
+                position[target] += 1
+        self._rev_targets = array('i', rev_targets)
+
+    def _intern(self, name):
+        node = self.ids.get(name)
+        if node is None:
+            node = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return node
+
+    @classmethod
+    def from_results(cls, results):
+        """create from list of dict with keys `module` and `imports`"""
+        return cls((result['module'], result['imports']) for result in results)
+
+    @classmethod
+    def from_module_set(cls, mset, jobs=1):
+        """create from all modules of a `ModuleSet`, ordered by name"""
+        return cls((name, sorted(imports)) for name, imports
+                   in mset.get_all_imports(return_fqn=True, jobs=jobs))
+
+    def __len__(self):
+        return len(self.names)
+
+    def imports(self, node):
+        """ids of modules imported by node"""
+        return self._targets[self._offsets[node]:self._offsets[node + 1]]
+
+    def dependents(self, node):
+        """ids of modules that import node"""
+        return self._rev_targets[self._rev_offsets[node]:
+                                 self._rev_offsets[node + 1]]
+
+    def edges(self):
+        """iterate over all edges as (module id, imported id)"""
+        targets = self._targets
+        offsets = self._offsets
+        for node in range(self.num_modules):
+            for i in range(offsets[node], offsets[node + 1]):
+                yield node, targets[i]
+
+    def reverse_reach(self, nodes):
+        """given nodes and all modules that import them, directly or not
+
+        Modules are found with a single traversal of reverse edges,
+        shared by all given nodes.
+        :param nodes: (iterable - int)
+        :return: (list - int)
+        """
+        seen = bytearray(len(self.names))
+        result = []
+        for node in nodes:
+            if not seen[node]:
+                seen[node] = 1
+                result.append(node)
+        offsets = self._rev_offsets
+        targets = self._rev_targets
+        stack = list(result)
+        while stack:
+            node = stack.pop()
+            for i in range(offsets[node], offsets[node + 1]):
+                dependent = targets[i]
+                if not seen[dependent]:
+                    seen[dependent] = 1
+                    result.append(dependent)
+                    stack.append(dependent)
+        return result
+
+    def sccs(self, reverse=False):
+        """strongly connected components, Tarjan's algorithm (iterative)
+        :param reverse: use reverse edges
+        :return: (list - list - int) dependencies before dependents
+                 (dependents before dependencies if `reverse`)
+        """
+        if reverse:
+            offsets, targets = self._rev_offsets, self._rev_targets
+        else:
+            offsets, targets = self._offsets, self._targets
+        size = len(self.names)
+        index = [-1] * size
+        lowlink = [0] * size
+        cursor = list(offsets[:size])
+        on_stack = bytearray(size)
+        stack = []
+        result = []
+        counter = 0
+        for root in range(size):
+            if index[root] != -1:
+                continue
+            index[root] = lowlink[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = 1
+            work = [root]
+            while work:
+                node = work[-1]
+                i = cursor[node]
+                end = offsets[node + 1]
+                while i < end:
+                    succ = targets[i]
+                    i += 1
+                    if index[succ] == -1:
+                        cursor[node] = i
+                        index[succ] = lowlink[succ] = counter
+                        counter += 1
+                        stack.append(succ)
+                        on_stack[succ] = 1
+                        work.append(succ)
+                        break
+                    if on_stack[succ] and index[succ] < lowlink[node]:
+                        lowlink[node] = index[succ]
+                else:
+                    # all successors visited
+                    cursor[node] = i
+                    work.pop()
+                    if work and lowlink[node] < lowlink[work[-1]]:
+                        lowlink[work[-1]] = lowlink[node]
+                    if lowlink[node] == index[node]:
+                        scc = []
+                        while True:
+                            member = stack.pop()
+                            on_stack[member] = 0
+                            scc.append(member)
+                            if member == node:
+                                break
+                        result.append(scc)
+        return result
+
+    def cycles(self):
+        """find circular dependencies, see `cycles()`
+        :return: (list - tuple) (set of names in SCC, set of edges in SCC)
+        """
+        result = []
+        names = self.names
+        for scc in self.sccs():
+            members = set(scc)
+            edges = set((names[node], names[dep]) for node in scc
+                        for dep in self.imports(node) if dep in members)
+            if edges:
+                result.append((set(names[node] for node in scc), edges))
+        return result
+
+    def cycle_edges(self):
+        """set of edges (module, import) that are part of a cycle"""
+        cycle_edges = set()
+        for _, edges in self.cycles():
+            cycle_edges.update(edges)
+        return cycle_edges
+
+    def topological_sort(self):
+        """Topological sort of analysed modules (dependencies before dependents).
+
+        Kahn's algorithm with rank-based ordering for stability.
+        Rank is the longest path from any leaf node (module not imported).
+        When multiple nodes become available, higher rank is output first.
+        Nodes in cycles are output after all others, isolated nodes
+        (no dependencies, no dependents) are output last.
+        Imported names that are not analysed modules are not included.
+        :return: (list - str) module names
+        """
+        size = self.num_modules
+        names = self.names
+        offsets = self._offsets
+        targets = self._targets
+        rev_offsets = self._rev_offsets
+        in_degree = [0] * size
+        for node in range(size):
+            for i in range(offsets[node], offsets[node + 1]):
+                if targets[i] < size:
+                    in_degree[node] += 1
+
+        # SCCs of reverse graph are returned with dependents first
+        rank = [0] * len(names)
+        for scc in self.sccs(reverse=True):
+            node = scc[0]
+            dependents = self.dependents(node)
+            if len(scc) > 1 or node in dependents:
+                for member in scc:
+                    rank[member] = -1
+            elif not dependents:
+                rank[node] = 1
+            else:
+                dep_ranks = [rank[dep] for dep in dependents if rank[dep] != -1]
+                # all dependents in cycles, but this node isn't: rank 2
+                rank[node] = max(dep_ranks) + 1 if dep_ranks else 2
+
+        isolated = [node for node in range(size) if in_degree[node] == 0
+                    and rev_offsets[node] == rev_offsets[node + 1]]
+        skip = bytearray(size)
+        for node in isolated:
+            skip[node] = 1
+        for node in range(size):
+            if rank[node] == -1:
+                skip[node] = 1
+
+        # heap of (-rank, insertion order, node): higher rank first, FIFO
+        roots = [node for node in range(size)
+                 if in_degree[node] == 0 and not skip[node]]
+        roots.sort(key=lambda node: (-rank[node], names[node]))
+        queue = [(-rank[node], order, node) for order, node in enumerate(roots)]
+        order = len(queue)
+        done = bytearray(size)
+        sorted_list = []
+        while queue:
+            node = heapq.heappop(queue)[2]
+            done[node] = 1
+            sorted_list.append(names[node])
+            for dependent in self.dependents(node):
+                if not skip[dependent]:
+                    in_degree[dependent] -= 1
+                    if in_degree[dependent] == 0:
+                        heapq.heappush(queue, (-rank[dependent], order, dependent))
+                        order += 1
+
+        for node in isolated:
+            done[node] = 1
+        sorted_list.extend(sorted(names[node] for node in range(size)
+                                  if not done[node]))
+        sorted_list.extend(sorted(names[node] for node in isolated))
+        return sorted_list
+
+
+class ReachabilityIndex(object):
+    """Transitive closure of a `DependencyGraph`, answers in constant time
+    if a module imports another one, directly or indirectly.
+
+    All modules of a SCC reach the same modules, so the closure is
+    computed on the condensed graph (DAG of SCCs): one bitset per SCC,
+    the union of bitsets of imported SCCs.
+    SCCs are numbered with dependencies first, so a bitset only
+    needs as many bits as the number of its SCC.
+
+    :ivar graph: (DependencyGraph)
+    :ivar num_components: (int) number of SCCs
+    :ivar nbytes: (int) memory used by the index
+    :ivar elapsed: (float) time in seconds taken to build the index
+    """
+    def __init__(self, graph):
+        start = time.perf_counter()
+        self.graph = graph
+        sccs = graph.sccs()
+        self.num_components = len(sccs)
+        self._component = array('i', [0]) * len(graph)
+        for comp, scc in enumerate(sccs):
+            for node in scc:
+                self._component[node] = comp
+
+        # bitsets as python int while building (fast OR)
+        component = self._component
+        closure = []
+        for comp, scc in enumerate(sccs):
+            bits = 1 << comp
+            for node in scc:
+                for dep in graph.imports(node):
+                    dep_comp = component[dep]
+                    if dep_comp != comp:
+                        bits |= closure[dep_comp]
+            closure.append(bits)
+        # as bytes, constant time to test a bit
+        for comp, bits in enumerate(closure):
+            closure[comp] = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+        self._rows = closure
+
+        self.nbytes = (sys.getsizeof(self._component) + sys.getsizeof(closure)
+                       + sum(sys.getsizeof(row) for row in closure))
+        self.elapsed = time.perf_counter() - start
+
+    def reaches(self, source, target):
+        """True if module `source` imports `target`, directly or not.
+        A module always reaches itself.
+        :param source: (str) module name
+        :param target: (str) module name
+        :raise KeyError: if a module is not part of the graph
+        """
+        ids = self.graph.ids
+        row = self._rows[self._component[ids[source]]]
+        comp = self._component[ids[target]]
+        pos = comp >> 3
+        return pos < len(row) and bool(row[pos] >> (comp & 7) & 1)
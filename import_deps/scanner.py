@@ -0,0 +1,144 @@
+"""fast import scanner, alternative to parsing the whole module with `ast`
+
+Instead of building the AST of the whole module, source code is scanned
+with a regular expression that skips over strings and comments and
+locates `import` / `from` keywords.
+Only the text of import statements is parsed with `ast`.
+
+When the scanner finds something it can not handle with confidence
+(compound statements like `if x: import y`, `;` separated statements,
+non utf-8 source...) the whole module is parsed with `ast`.
+
+Note: unlike `ast_imports`, syntax errors outside import statements
+are not detected.
+"""
+
+import ast
+import re
+
+from . import _ImportsFinder, _parse_imports
+
+
+_TOKEN_RE = re.compile(r'''
+    (?P<string>
+        (?:"""|\'\'\')            # triple quoted string
+        |"(?:\\.|[^\\"\n])*"   # single line strings
+        |'(?:\\.|[^\\'\n])*'
+    )
+    |(?P<comment>\#[^\n]*)
+    |(?P<keyword>\b(?:import|from)\b)
+''', re.VERBOSE | re.DOTALL)
+
+_TRIPLE_END = {
+    '"""': re.compile(r'(?:\\.|[^\\])*?"""', re.DOTALL),
+    "'''": re.compile(r"(?:\\.|[^\\])*?'''", re.DOTALL),
+}
+
+_FROM_IMPORT_RE = re.compile(r'from\s+[\w.]+\s+import\b')
+
+_CODING_RE = re.compile(rb'^[ \t\f]*#.*?coding[:=][ \t]*([-\w.]+)',
+                        re.MULTILINE)
+
+
+def _is_utf8(source):
+    """check encoding declared on first 2 lines (default utf-8)"""
+    first = source.find(b'\n')
+    second = source.find(b'\n', first + 1) if first != -1 else -1
+    end = len(source) if second == -1 else second
+    match = _CODING_RE.search(source, 0, end)
+    if match is None:
+        return True
+    return match.group(1).lower().replace(b'_', b'-') in (b'utf-8', b'utf8')
+
+
+class _Fallback(Exception):
+    """source can not be handled by scanner"""
+
+
+def _statement_end(text, pos):
+    """return position of end of import statement starting at `pos`
+
+    Import statements contain no strings, so parenthesis can be counted
+    ignoring comments.
+    """
+    depth = 0
+    while True:
+        eol = text.find('\n', pos)
+        if eol == -1:
+            eol = len(text)
+        line = text[pos:eol].split('#', 1)[0].rstrip('\r')
+        if ';' in line:
+            raise _Fallback()
+        depth += line.count('(') - line.count(')')
+        if eol == len(text) or (depth <= 0 and not line.endswith('\\')):
+            return eol
+        pos = eol + 1
+
+
+def _scan(text, top_level_only):
+    """return list of source code of all import statements"""
+    statements = []
+    pos = 0
+    while True:
+        match = _TOKEN_RE.search(text, pos)
+        if match is None:
+            return statements
+        kind = match.lastgroup
+        pos = match.end()
+        if kind == 'string':
+            if match.group() in _TRIPLE_END:
+                end = _TRIPLE_END[match.group()].match(text, pos)
+                if end is None:
+                    raise _Fallback()
+                pos = end.end()
+            continue
+        if kind == 'comment':
+            continue
+
+        # import/from keyword
+        start = match.start()
+        line_start = text.rfind('\n', 0, start) + 1
+        before = text[line_start:start]
+        if not before.strip():
+            if before and top_level_only:
+                # scanner does not know if it is inside a function
+                raise _Fallback()
+            end = _statement_end(text, start)
+            statements.append(text[start:end])
+            pos = end
+        elif match.group() == 'import':
+            # i.e. "if x: import y"
+            raise _Fallback()
+        elif before.rstrip().endswith('yield'):
+            continue
+        elif _FROM_IMPORT_RE.match(text, start):
+            raise _Fallback()
+        # else "raise X from Y"
+
+
+def scan_imports(source, file_path='<unknown>', top_level_only=False):
+    """get list of imports from python source code (bytes)
+    :param top_level_only: see `import_deps.ast_imports()`
+    :return: (list - tuple) (module, name, asname, level)
+    """
+    if b'import' not in source:
+        return []
+    try:
+        if source.startswith(b'\xef\xbb\xbf') or not _is_utf8(source):
+            raise _Fallback()
+        statements = _scan(source.decode('utf-8'), top_level_only)
+        mod_ast = ast.parse('\n'.join(statements), str(file_path))
+    except (_Fallback, UnicodeDecodeError, SyntaxError):
+        return _parse_imports(source, file_path, top_level_only)
+    finder = _ImportsFinder()
+    finder.visit(mod_ast)
+    return finder.imports
+
+
+def fast_imports(file_path, top_level_only=False):
+    """same as `import_deps.ast_imports` using the fast scanner
+    :return: (list - tuple) (module, name, asname, level)
+    """
+    with open(file_path, 'rb') as fp:
+        source = fp.read()
+    return scan_imports(source, file_path, top_level_only)
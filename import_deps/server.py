@@ -0,0 +1,172 @@
+"""answer import queries from a long running process, over a Unix socket
+
+The graph is kept in memory (`watch.IncrementalGraph`) and refreshed
+before each query, only modified files are parsed again.
+
+Protocol: a request is a JSON object on a single line,
+the response is a JSON object on a single line.
+Many requests can be sent on the same connection.
+
+Request fields:
+
+- `query`: `deps`, `rdeps`, `cycles`, `sort`, `status` or `stop`
+- `modules`: (list - str) module names, required by `rdeps`.
+  For `deps` only imports of these modules are returned (all if not given)
+- `files`: (list - str) absolute path of files that might have been
+  modified. If all of them are known modules, other files are not checked.
+
+Response is `{"result": ...}` or `{"error": "message"}`.
+"""
+
+import json
+import os
+import pathlib
+import socket
+import socketserver
+import stat
+import time
+
+from .graph import DependencyGraph
+
+
+def request(socket_path, query, **fields):
+    """send a single request to server
+    :return: (dict) response
+    :raise OSError: if server is not available
+    """
+    fields['query'] = query
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(str(socket_path))
+        sock.sendall(json.dumps(fields).encode() + b'\n')
+        with sock.makefile('rb') as fp:
+            line = fp.readline()
+    if not line:
+        raise OSError('no response from server')
+    return json.loads(line)
+
+
+def is_running(socket_path):
+    """check if a server is answering on socket_path"""
+    if not os.path.exists(str(socket_path)):
+        return False
+    try:
+        request(socket_path, 'status')
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+class QueryError(Exception):
+    """invalid request, sent back to the client"""
+
+
+class ImportServer(object):
+    """Answer queries about an `IncrementalGraph`.
+
+    :ivar graph: (watch.IncrementalGraph)
+    :ivar stopped: (bool) a `stop` request was received
+    """
+    def __init__(self, graph):
+        self.graph = graph
+        self.stopped = False
+        self._results = {} # query => result, until graph is modified
+
+    def refresh(self, files=None):
+        """update graph, checking only given files if possible"""
+        paths = None
+        if files is not None:
+            paths = [pathlib.Path(os.path.abspath(path)) for path in files]
+        added, removed, modified = self.graph.update(paths)
+        if added or removed or modified:
+            self._results.clear()
+
+    def _check_modules(self, names):
+        unknown = [name for name in names if name not in self.graph.imports]
+        if unknown:
+            raise QueryError(f"module not found: {', '.join(unknown)}")
+
+    def handle(self, req):
+        """:return: (dict) response to a request"""
+        try:
+            query = req.get('query')
+            modules = req.get('modules')
+            if query == 'stop':
+                self.stopped = True
+                return {'result': None}
+            if query not in ('deps', 'rdeps', 'cycles', 'sort', 'status'):
+                raise QueryError(f'invalid query: {query}')
+            for field in ('modules', 'files'):
+                value = req.get(field)
+                if value is not None and not (isinstance(value, list) and
+                                              all(isinstance(v, str) for v in value)):
+                    raise QueryError(f'{field} must be a list of strings')
+            if query == 'rdeps' and not modules:
+                raise QueryError('rdeps requires modules')
+            start = time.perf_counter()
+            self.refresh(req.get('files'))
+            imports = self.graph.imports
+
+            if query in self._results and modules is None:
+                result = self._results[query]
+            elif query == 'deps':
+                names = sorted(imports) if modules is None else modules
+                self._check_modules(names)
+                result = [{'module': name, 'imports': sorted(imports[name])}
+                          for name in names]
+                if modules is None:
+                    self._results[query] = result
+            elif query == 'rdeps':
+                self._check_modules(modules)
+                dependents = self.graph._dependents
+                direct = [dep for name in modules for dep in dependents.get(name, ())]
+                result = sorted(self.graph._reach(direct, dependents))
+            elif query == 'cycles':
+                result = self._results[query] = sorted(self.graph.cycle_edges)
+            elif query == 'sort':
+                graph = DependencyGraph((name, sorted(imports[name]))
+                                        for name in sorted(imports))
+                result = self._results[query] = graph.topological_sort()
+            else:
+                result = {'base_path': str(self.graph.base_path),
+                          'modules': len(imports),
+                          'pid': os.getpid()}
+            return {'result': result, 'elapsed': time.perf_counter() - start}
+        except QueryError as exc:
+            return {'error': str(exc)}
+
+    def serve(self, socket_path):
+        """handle requests until a `stop` request is received
+        :raise OSError: if socket can not be created
+        """
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    try:
+                        req = json.loads(line)
+                    except ValueError:
+                        response = {'error': 'invalid JSON request'}
+                    else:
+                        if isinstance(req, dict):
+                            response = server.handle(req)
+                        else:
+                            response = {'error': 'request must be an object'}
+                    self.wfile.write(json.dumps(response).encode() + b'\n')
+                    self.wfile.flush()
+                    if server.stopped:
+                        break
+
+        socket_path = str(socket_path)
+        if is_running(socket_path):
+            raise OSError(f'server already running on {socket_path}')
+        if os.path.exists(socket_path):
+            if not stat.S_ISSOCK(os.stat(socket_path).st_mode):
+                raise OSError(f'not a socket: {socket_path}')
+            os.unlink(socket_path) # left by a process that died
+        with socketserver.UnixStreamServer(socket_path, Handler) as unix_server:
+            try:
+                while not self.stopped:
+                    unix_server.handle_request()
+            finally:
+                os.unlink(socket_path)
@@ -0,0 +1,178 @@
+"""store an import graph on a SQLite database
+
+Modules are stored with their file metadata (path, mtime and size)
+and raw import entries, edges are indexed on both directions,
+so imports and dependents of a module can be queried without loading
+the whole graph.
+"""
+
+import json
+import os
+import pathlib
+import sqlite3
+
+from .graph import DependencyGraph
+
+
+VERSION = 2
+
+SCHEMA = '''
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE module (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    path TEXT,
+    mtime_ns INTEGER,
+    size INTEGER,
+    raw TEXT
+);
+CREATE TABLE edge (
+    source INTEGER NOT NULL,
+    target INTEGER NOT NULL,
+    PRIMARY KEY (source, target)
+) WITHOUT ROWID;
+'''
+
+# created after edges are inserted, faster than updating it on every insert
+INDEX = 'CREATE INDEX edge_target ON edge (target, source)'
+
+
+def save_graph(file_path, graph, paths=None, base_path=None, raw=None,
+               options=None):
+    """save graph on a new database, replacing existing file
+
+    :param graph: (DependencyGraph)
+    :param paths: (dict) module name => path
+    :param base_path: path modules were searched on
+    :param raw: (dict) module name => raw import entries
+    :param options: (dict - str) options used to get raw entries
+    :raise sqlite3.Error, OSError: if file can not be written,
+                                   the temporary file is removed
+    """
+    paths = paths or {}
+    raw = raw or {}
+    tmp_path = '{}.{}.tmp'.format(file_path, os.getpid())
+    try:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        _write_graph(tmp_path, graph, paths, raw, base_path, options)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _write_graph(tmp_path, graph, paths, raw, base_path, options):
+    """create database, see `save_graph()`"""
+    conn = sqlite3.connect(tmp_path)
+    try:
+        # file is only used after complete, no need for journal
+        conn.execute('PRAGMA journal_mode = OFF')
+        conn.execute('PRAGMA synchronous = OFF')
+        conn.executescript(SCHEMA)
+        meta = [('version', str(VERSION)),
+                ('num_modules', str(graph.num_modules))]
+        if base_path is not None:
+            meta.append(('base_path', str(base_path)))
+        meta.extend(('option.' + key, value) for key, value
+                    in sorted((options or {}).items()))
+        conn.executemany('INSERT INTO meta VALUES (?, ?)', meta)
+
+        def module_rows():
+            for node, name in enumerate(graph.names):
+                path = paths.get(name)
+                mod_raw = raw.get(name)
+                if mod_raw is not None:
+                    mod_raw = json.dumps(mod_raw)
+                if path is None:
+                    yield node, name, None, None, None, mod_raw
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    yield node, name, str(path), None, None, mod_raw
+                else:
+                    yield (node, name, str(path), stat.st_mtime_ns, stat.st_size,
+                           mod_raw)
+        conn.executemany('INSERT INTO module VALUES (?, ?, ?, ?, ?, ?)',
+                         module_rows())
+        conn.executemany('INSERT INTO edge VALUES (?, ?)', graph.edges())
+        conn.execute(INDEX)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class GraphSnapshot(object):
+    """Read a graph saved by `save_graph()`
+
+    :ivar num_modules: (int) number of analysed modules
+    :ivar base_path: (pathlib.Path) or None
+    :ivar options: (dict - str) options used to get raw import entries
+    :raise ValueError: if file is not a snapshot of this version
+    """
+    def __init__(self, file_path):
+        if not os.path.isfile(file_path):
+            raise ValueError('file not found: {}'.format(file_path))
+        self.file_path = file_path
+        self._conn = sqlite3.connect(file_path)
+        try:
+            meta = dict(self._conn.execute('SELECT key, value FROM meta'))
+        except sqlite3.DatabaseError:
+            self._conn.close()
+            raise ValueError('not a graph snapshot: {}'.format(file_path))
+        if meta.get('version') != str(VERSION):
+            self._conn.close()
+            raise ValueError('unsupported snapshot version: {}'.format(file_path))
+        self.num_modules = int(meta['num_modules'])
+        base_path = meta.get('base_path')
+        self.base_path = None if base_path is None else pathlib.Path(base_path)
+        self.options = {key[7:]: value for key, value in meta.items()
+                        if key.startswith('option.')}
+
+    def close(self):
+        self._conn.close()
+
+    def graph(self):
+        """load whole graph, imports of a module are ordered by name
+        :return: (DependencyGraph)
+        """
+        conn = self._conn
+        names = [name for name, in conn.execute('SELECT name FROM module ORDER BY id')]
+        imports = [[] for _ in range(self.num_modules)]
+        for source, target in conn.execute('SELECT source, target FROM edge'):
+            imports[source].append(names[target])
+        return DependencyGraph((names[node], sorted(imports[node]))
+                               for node in range(self.num_modules))
+
+    def paths(self):
+        """:return: (dict) module name => (pathlib.Path) of analysed modules"""
+        rows = self._conn.execute(
+            'SELECT name, path FROM module WHERE id < ? AND path IS NOT NULL',
+            (self.num_modules,))
+        return {name: pathlib.Path(path) for name, path in rows}
+
+    def raw_imports(self):
+        """raw import entries of analysed modules
+        :return: (dict) module path => (list - tuple) raw import entries
+        """
+        rows = self._conn.execute(
+            'SELECT path, raw FROM module WHERE id < ? AND raw IS NOT NULL',
+            (self.num_modules,))
+        return {pathlib.Path(path): [tuple(entry) for entry in json.loads(raw)]
+                for path, raw in rows}
+
+    def imports(self, name):
+        """names of modules imported by given module (uses index on source)"""
+        return [target for target, in self._conn.execute(
+            'SELECT t.name FROM module s JOIN edge ON edge.source = s.id '
+            'JOIN module t ON t.id = edge.target WHERE s.name = ? '
+            'ORDER BY t.name', (name,))]
+
+    def dependents(self, name):
+        """names of modules that import given module (uses index on target)"""
+        return [source for source, in self._conn.execute(
+            'SELECT s.name FROM module t JOIN edge ON edge.target = t.id '
+            'JOIN module s ON s.id = edge.source WHERE t.name = ? '
+            'ORDER BY s.name', (name,))]
@@ -0,0 +1,152 @@
+"""collect time taken by each phase of the analysis and parse statistics"""
+
+import heapq
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError: # pragma: no cover (windows)
+    resource = None
+
+
+def _cpu_time():
+    """CPU time (user + system) of this process and its finished children"""
+    times = os.times()
+    return time.process_time() + times.children_user + times.children_system
+
+
+def peak_rss():
+    """:return: (int) peak resident set size in bytes, None if not available"""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes on other systems
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+class Stats(object):
+    """Time of phases and statistics of parsed files.
+
+    Instances are `ModuleSet` hooks (see `ModuleSet.hooks`).
+    CPU time includes worker processes (after they finish).
+
+    :ivar phases: (dict) phase name => [wall time, CPU time] in seconds
+    :ivar num_parsed: (int) number of files parsed (including prefiltered)
+    :ivar num_prefiltered: (int) number of files discarded by
+                           `ModuleSet.prefilter` (not set by hook)
+    :ivar resolve_hits: (int) import entries resolved from memo
+    :ivar resolve_misses: (int) import entries looked up on `ModuleSet`
+    :ivar num_cached: (int) number of files found on cache
+    :ivar bytes_read: (int) size of parsed files
+    :ivar parse_time: (float) sum of time to parse each file
+    :ivar roots: (list - dict) path, number of modules, discovery and
+                 parse time of each source root (only on multiple roots)
+    """
+    def __init__(self, num_slowest=10):
+        self.num_slowest = num_slowest
+        self.phases = {}
+        self.num_parsed = 0
+        self.num_cached = 0
+        self.num_prefiltered = 0
+        self.resolve_hits = 0
+        self.resolve_misses = 0
+        self.bytes_read = 0
+        self.parse_time = 0.0
+        self.roots = []
+        self._slowest = [] # heap of (elapsed, path, size)
+        self._current = None # (name, wall start, cpu start)
+
+    def start(self, name):
+        """start timing a phase, current phase is stopped.
+        Time of phases with same name are added.
+        """
+        self.stop()
+        self._current = (name, time.perf_counter(), _cpu_time())
+
+    def stop(self):
+        """stop timing current phase (if any)"""
+        if self._current is None:
+            return
+        name, wall, cpu = self._current
+        times = self.phases.setdefault(name, [0.0, 0.0])
+        times[0] += time.perf_counter() - wall
+        times[1] += _cpu_time() - cpu
+        self._current = None
+
+    def __call__(self, module, elapsed, size, cached):
+        if cached:
+            self.num_cached += 1
+            return
+        self.num_parsed += 1
+        self.bytes_read += size
+        self.parse_time += elapsed
+        entry = (elapsed, str(module.path), size)
+        if len(self._slowest) < self.num_slowest:
+            heapq.heappush(self._slowest, entry)
+        elif self._slowest and entry > self._slowest[0]:
+            heapq.heapreplace(self._slowest, entry)
+
+    def slowest(self):
+        """:return: (list - tuple) (time, path, size) slowest files first"""
+        return sorted(self._slowest, reverse=True)
+
+    def report(self):
+        """:return: (dict) all statistics, JSON serializable"""
+        parse_wall = self.phases.get('parse', [0.0])[0]
+        num_files = self.num_parsed + self.num_cached
+        num_resolved = self.resolve_hits + self.resolve_misses
+        return {
+            'phases': [{'name': name, 'wall': wall, 'cpu': cpu}
+                       for name, (wall, cpu) in self.phases.items()],
+            'total': {'wall': sum(wall for wall, _ in self.phases.values()),
+                      'cpu': sum(cpu for _, cpu in self.phases.values())},
+            'files': num_files,
+            'parsed': self.num_parsed - self.num_prefiltered,
+            'prefiltered': self.num_prefiltered,
+            'cache_hits': self.num_cached,
+            'bytes_read': self.bytes_read,
+            'parse_time': self.parse_time,
+            'resolve_hits': self.resolve_hits,
+            'resolve_misses': self.resolve_misses,
+            'resolve_hit_rate': (self.resolve_hits / num_resolved
+                                 if num_resolved else None),
+            'files_per_sec': num_files / parse_wall if parse_wall else None,
+            'peak_rss': peak_rss(),
+            'roots': self.roots,
+            'slowest': [{'path': path, 'time': elapsed, 'size': size}
+                        for elapsed, path, size in self.slowest()],
+        }
+
+    def write(self, out):
+        """write report as text"""
+        data = self.report()
+        out.write('Stats:\n')
+        for phase in data['phases'] + [dict(data['total'], name='total')]:
+            out.write(f"  {phase['name']:10} {phase['wall'] * 1000:10.1f} ms wall "
+                      f"{phase['cpu'] * 1000:10.1f} ms cpu\n")
+        line = (f"  files: {data['files']} ({data['parsed']} parsed, "
+                f"{data['cache_hits']} cache hits, "
+                f"{data['prefiltered']} prefiltered), "
+                f"{data['bytes_read'] / 1024:.1f} KB read")
+        if data['files_per_sec'] is not None:
+            line += f", {data['files_per_sec']:.0f} files/sec"
+        out.write(line + '\n')
+        if data['resolve_hit_rate'] is not None:
+            out.write(f"  resolve memo: {data['resolve_hits']} hits, "
+                      f"{data['resolve_misses']} misses "
+                      f"({data['resolve_hit_rate'] * 100:.1f}% hit rate)\n")
+        if data['roots']:
+            out.write('  roots:\n')
+            for root in data['roots']:
+                out.write(f"    {root['path']}: {root['modules']} modules, found in "
+                          f"{root['discovery'] * 1000:.1f} ms, parsed in "
+                          f"{root['parse'] * 1000:.1f} ms\n")
+        if data['peak_rss'] is not None:
+            out.write(f"  peak RSS: {data['peak_rss'] / 2**20:.1f} MB\n")
+        if data['slowest']:
+            out.write('  slowest files:\n')
+            for entry in data['slowest']:
+                out.write(f"    {entry['time'] * 1000:8.1f} ms "
+                          f"{entry['size'] / 1024:8.1f} KB  {entry['path']}\n")
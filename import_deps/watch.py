@@ -0,0 +1,282 @@
+"""keep import graph of a directory up-to-date by polling file changes"""
+
+import os
+import sys
+import time
+
+from . import ModuleSet, ast_imports
+from .cache import RACY_NS
+from .discovery import ModuleFinder
+from .graph import cycles
+
+
+class IncrementalGraph(object):
+    """Import graph of modules in a directory, updated incrementally.
+
+    On `update()` files are polled for changes (mtime and size),
+    only modified and new files are parsed.
+    Directories are walked again only if their mtime changed
+    (files were added, removed or renamed).
+    Imports of other modules are resolved again only if they might refer
+    to an added/removed module. Cycles are re-computed only for
+    the part of the graph that might be affected by changed edges.
+
+    :ivar mset: (ModuleSet)
+    :ivar imports: (dict) module name => (set - str) imported module names
+    :ivar cycle_edges: (set - tuple) edges (module, import) part of a cycle
+    :ivar elapsed: (float) time in seconds taken by last `update()`
+    """
+    def __init__(self, base_path, finder=None, parse=ast_imports,
+                 max_file_size=None, jobs=1):
+        self.base_path = base_path
+        self.finder = ModuleFinder() if finder is None else finder
+        self.mset = ModuleSet([], parse=parse, max_file_size=max_file_size)
+        self.jobs = jobs
+        self.imports = {}
+        self.cycle_edges = set()
+        self.elapsed = 0.0
+        self._stat = {} # path => (mtime, size)
+        self._dirs = None # directory => mtime, None if must be walked
+        self._raw = {} # module name => raw import entries
+        self._importers = {} # imported name => set of module names
+        self._candidates = {} # module name => list of names it may import
+        self._dependents = {} # module name => set of module names
+        self._scc = {} # module name => set of modules in its cycle
+        self.update()
+
+    def _dirs_changed(self):
+        """directories might contain added/removed files since last walk"""
+        if self._dirs is None:
+            return True
+        for dir_path, mtime in self._dirs.items():
+            try:
+                if os.stat(dir_path).st_mtime_ns != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def _poll_modified(self, paths):
+        """check given files (already known modules) for modifications
+        :return: (list - PyModule) modified, None if files were removed
+        """
+        changed = {}
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                return None
+            stat = (st.st_mtime_ns, st.st_size)
+            if self._stat[path] != stat:
+                changed[path] = stat
+        self._stat.update(changed)
+        return [self.mset.by_path[path] for path in changed]
+
+    def _poll(self, paths=None):
+        """find modules and compare with current modules
+        :param paths: (list - pathlib.Path) only check these files,
+                      if they are all known modules
+        :return: (tuple - list - PyModule) (added, removed, modified)
+        """
+        current = self.mset.by_path
+        if paths is not None and all(path in current for path in paths):
+            modified = self._poll_modified(paths)
+            if modified is not None:
+                return [], [], modified
+        elif not self._dirs_changed():
+            modified = self._poll_modified(list(current))
+            if modified is not None:
+                return [], [], modified
+
+        added = []
+        modified = []
+        found = set()
+        for mod in self.finder.find(self.base_path):
+            try:
+                st = os.stat(mod.path)
+            except OSError:
+                continue
+            found.add(mod.path)
+            stat = (st.st_mtime_ns, st.st_size)
+            old = current.get(mod.path)
+            if old is None or old.fqn != mod.fqn:
+                if old is not None:
+                    found.discard(mod.path)
+                added.append(mod)
+            elif self._stat[mod.path] != stat:
+                modified.append(old)
+            self._stat[mod.path] = stat
+        removed = [mod for path, mod in current.items() if path not in found]
+
+        # directories modified recently might change again with same mtime
+        self._dirs = {}
+        limit = time.time_ns() - RACY_NS
+        for dir_path in self.finder.dirs:
+            try:
+                mtime = os.stat(dir_path).st_mtime_ns
+            except OSError:
+                mtime = None
+            if mtime is None or mtime > limit:
+                self._dirs = None
+                break
+            self._dirs[dir_path] = mtime
+        return added, removed, modified
+
+    def _set_candidates(self, name, mod, raw_imports):
+        """index names that might be imported by module"""
+        for cand in self._candidates.pop(name, ()):
+            self._importers[cand].discard(name)
+        candidates = set()
+        for entry in raw_imports:
+            full = self.mset.import_name(mod, entry)
+            no_obj = full.rsplit('.', 1)[0]
+            candidates.update((full, no_obj, full + '.__init__',
+                               no_obj + '.__init__'))
+        for cand in candidates:
+            self._importers.setdefault(cand, set()).add(name)
+        self._candidates[name] = candidates
+
+    def _set_imports(self, name, imports):
+        """set imports of a module, keeping reverse edges updated"""
+        for dep in self.imports.get(name, ()):
+            self._dependents[dep].discard(name)
+        if imports is None:
+            self.imports.pop(name, None)
+            return
+        self.imports[name] = imports
+        for dep in imports:
+            self._dependents.setdefault(dep, set()).add(name)
+
+    def update(self, paths=None):
+        """check for modified files and update graph
+        :param paths: (list - pathlib.Path) files that might have been
+                      modified. If all are known modules, other files are
+                      not checked (faster on big trees)
+        :return: (tuple - list - str) module names (added, removed, modified)
+        """
+        start = time.perf_counter()
+        added, removed, modified = self._poll(paths)
+        mset = self.mset
+        added_paths = set(mod.path for mod in added)
+        changed_names = set()
+        # modules used for a name (other modules with same name are ignored)
+        old_used = {name: mset.by_name.get(name) for name in
+                    set(self.mod_name(mod) for mod in added + removed)}
+        for mod in removed:
+            mset.remove_module(mod)
+            if mod.path not in added_paths:
+                del self._stat[mod.path]
+        for mod in added:
+            mset.add_module(mod)
+        to_parse = set(mod for mod in modified
+                       if mset.by_name.get(self.mod_name(mod)) is mod)
+        for name, old in old_used.items():
+            new = mset.by_name.get(name)
+            if new is old:
+                continue
+            changed_names.add(name)
+            if new is None:
+                self._set_candidates(name, old, ())
+                self._set_imports(name, None)
+                del self._raw[name]
+            else:
+                to_parse.add(new)
+
+        # modules that need to resolve their imports again
+        to_resolve = set()
+        for name in changed_names:
+            to_resolve.update(self._importers.get(name, ()))
+        parsed = mset.parse_modules(sorted(to_parse, key=self.mod_name),
+                                    jobs=self.jobs)
+        for mod, raw in parsed.items():
+            name = self.mod_name(mod)
+            self._raw[name] = raw
+            self._set_candidates(name, mod, raw)
+            to_resolve.add(name)
+
+        # modules with modified edges
+        dirty = set(name for name in changed_names if name not in mset.by_name)
+        for name in to_resolve:
+            mod = mset.by_name.get(name)
+            if mod is None:
+                continue
+            imports = mset._resolve_imports(mod, self._raw[name], True)
+            if imports != self.imports.get(name):
+                self._set_imports(name, imports)
+                dirty.add(name)
+        self._update_cycles(dirty)
+        self.elapsed = time.perf_counter() - start
+        return ([self.mod_name(m) for m in added],
+                [self.mod_name(m) for m in removed],
+                [self.mod_name(m) for m in modified])
+
+    @staticmethod
+    def mod_name(mod):
+        return '.'.join(mod.fqn)
+
+    @staticmethod
+    def _reach(nodes, edges):
+        """set of nodes reachable from `nodes` (included)"""
+        seen = set(nodes)
+        stack = list(nodes)
+        while stack:
+            for dep in edges.get(stack.pop(), ()):
+                if dep not in seen:
+                    seen.add(dep)
+                    stack.append(dep)
+        return seen
+
+    def _update_cycles(self, dirty):
+        """re-compute cycles that might be affected by modified edges
+
+        A new cycle must contain a dirty node, so its nodes can be reached
+        from and can reach a dirty node. Cycles that contained a dirty
+        node are computed again.
+        :param dirty: (set - str) modules whose imports were modified
+        """
+        if not dirty:
+            return
+        old = set()
+        for name in dirty:
+            old.update(self._scc.get(name, ()))
+        for name in old:
+            del self._scc[name]
+        self.cycle_edges = set(edge for edge in self.cycle_edges
+                               if edge[0] not in old)
+        alive = [name for name in dirty if name in self.imports]
+        region = self._reach(alive, self.imports)
+        region &= self._reach(alive, self._dependents)
+        region |= set(name for name in old if name in self.imports)
+        subgraph = {name: self.imports[name] for name in region}
+        for members, edges in cycles(subgraph):
+            for name in members:
+                self._scc[name] = members
+            self.cycle_edges.update(edges)
+
+
+def run(graph, interval=1.0, max_iterations=None, out=sys.stdout):
+    """poll for changes, print changes and circular dependencies
+    :param graph: (IncrementalGraph)
+    :param max_iterations: (int) stop after given number of polls
+    """
+    iteration = 0
+    while max_iterations is None or iteration < max_iterations:
+        iteration += 1
+        time.sleep(interval)
+        added, removed, modified = graph.update()
+        if not (added or removed or modified):
+            continue
+        print(f"{len(modified)} modified, {len(added)} added, "
+              f"{len(removed)} removed: updated in {graph.elapsed * 1000:.1f} ms",
+              file=out)
+        print_cycles(graph.cycle_edges, out)
+        out.flush()
+
+
+def print_cycles(cycle_edges, out=sys.stdout):
+    if not cycle_edges:
+        print("No circular dependencies found.", file=out)
+        return
+    print("Circular dependencies detected:", file=out)
+    for src, dst in sorted(cycle_edges):
+        print(f"  {src} -> {dst}", file=out)
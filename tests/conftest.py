@@ -0,0 +1,8 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def cwd_tmp_path(tmp_path, monkeypatch):
+    """run tests on a temporary directory,
+    the default cache directory is relative to it"""
+    monkeypatch.chdir(tmp_path)
@@ -0,0 +1,141 @@
+import os
+
+import pytest
+
+from import_deps import ast_imports
+from import_deps import ModuleSet
+from import_deps.cache import ParseCache, FILE_NAME
+from import_deps.__main__ import main
+
+from .test_import_deps import FOO, BAR
+
+
+def write_old(path, content):
+    """write file with mtime in the past, so it can be stored on cache"""
+    path.write_text(content)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns - 10 * 10**9))
+
+
+@pytest.fixture
+def mod_file(tmp_path):
+    path = tmp_path / 'mod.py'
+    write_old(path, 'import os\nfrom . import bar\n')
+    return path
+
+
+def touch(path, content=None):
+    """change mtime (and optionally content) of file"""
+    if content is not None:
+        path.write_text(content)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+class Test_ParseCache(object):
+    def test_same_as_ast_imports(self, tmp_path):
+        cache = ParseCache(tmp_path / 'cache')
+        assert ast_imports(FOO.a) == cache.ast_imports(FOO.a)
+        assert ast_imports(FOO.a) == cache.ast_imports(FOO.a)
+        assert (1, 1) == (cache.hits, cache.misses)
+
+    def test_persist(self, tmp_path, mod_file):
+        cache_dir = tmp_path / 'cache'
+        cache = ParseCache(cache_dir)
+        expected = cache.ast_imports(mod_file)
+        cache.save()
+        assert (cache_dir / '.gitignore').exists()
+
+        cache2 = ParseCache(cache_dir)
+        assert 1 == len(cache2)
+        assert expected == cache2.ast_imports(mod_file)
+        assert (1, 0) == (cache2.hits, cache2.misses)
+
+    def test_modified_file(self, tmp_path, mod_file):
+        cache = ParseCache(tmp_path / 'cache')
+        cache.ast_imports(mod_file)
+        touch(mod_file, 'import sys\n')
+        assert [(None, 'sys', None, None)] == cache.ast_imports(mod_file)
+        assert (0, 2) == (cache.hits, cache.misses)
+
+    def test_touched_file_no_hash(self, tmp_path, mod_file):
+        cache = ParseCache(tmp_path / 'cache')
+        cache.ast_imports(mod_file)
+        touch(mod_file)
+        cache.ast_imports(mod_file)
+        assert (0, 2) == (cache.hits, cache.misses)
+
+    def test_touched_file_use_hash(self, tmp_path, mod_file):
+        cache = ParseCache(tmp_path / 'cache', use_hash=True)
+        expected = cache.ast_imports(mod_file)
+        touch(mod_file)
+        assert expected == cache.ast_imports(mod_file)
+        assert (1, 1) == (cache.hits, cache.misses)
+
+    def test_evict_deleted_files(self, tmp_path):
+        cache_dir = tmp_path / 'cache'
+        paths = []
+        for name in ('a', 'b', 'c'):
+            paths.append(tmp_path / (name + '.py'))
+            write_old(paths[-1], 'import {}\n'.format(name))
+        cache = ParseCache(cache_dir, max_entries=2)
+        cache.ast_imports(paths[0])
+        cache.ast_imports(paths[1])
+        cache.save()
+
+        paths[0].unlink()
+        cache = ParseCache(cache_dir, max_entries=2)
+        cache.ast_imports(paths[2])
+        cache.save()
+        cache = ParseCache(cache_dir, max_entries=2)
+        assert 2 == len(cache)
+        cache.ast_imports(paths[1])
+        cache.ast_imports(paths[2])
+        assert (2, 0) == (cache.hits, cache.misses)
+
+    def test_ignore_invalid_cache_file(self, tmp_path, mod_file):
+        cache_dir = tmp_path / 'cache'
+        cache_dir.mkdir()
+        (cache_dir / FILE_NAME).write_text('{invalid')
+        cache = ParseCache(cache_dir)
+        assert 0 == len(cache)
+        cache.ast_imports(mod_file)
+        cache.save()
+        assert 1 == len(ParseCache(cache_dir))
+
+
+def test_recently_modified_not_stored(tmp_path, mod_file):
+    cache = ParseCache(tmp_path / 'cache')
+    # might be modified again with same mtime and size
+    mod_file.write_text('import os\n')
+    cache.ast_imports(mod_file)
+    assert 0 == len(cache)
+    mod_file.write_text('import re\n')
+    assert [(None, 're', None, None)] == cache.ast_imports(mod_file)
+
+
+def test_module_set_with_cache(tmp_path):
+    cache = ParseCache(tmp_path / 'cache')
+    modset = ModuleSet([FOO.a, BAR], cache=cache)
+    got = modset.get_imports(modset.by_name['foo.foo_a'])
+    assert {BAR} == got
+    assert 1 == cache.misses
+
+
+class Test_CLI_Cache(object):
+    def test_cache_dir(self, tmp_path, capsys):
+        cache_dir = tmp_path / 'cache'
+        with pytest.raises(SystemExit):
+            main(['import_deps', str(FOO.pkg), '--cache-dir', str(cache_dir)])
+        first = capsys.readouterr().out
+        assert 7 == len(ParseCache(cache_dir))
+        with pytest.raises(SystemExit):
+            main(['import_deps', str(FOO.pkg), '--cache-dir', str(cache_dir)])
+        assert first == capsys.readouterr().out
+
+    def test_no_cache(self, tmp_path, capsys):
+        cache_dir = tmp_path / 'cache'
+        with pytest.raises(SystemExit):
+            main(['import_deps', str(FOO.pkg), '--no-cache',
+                  '--cache-dir', str(cache_dir)])
+        assert not cache_dir.exists()
@@ -0,0 +1,156 @@
+import json
+
+import pytest
+
+from import_deps import config
+from import_deps.config import ConfigError, find_pyproject, load_config, source_roots
+from import_deps.__main__ import main
+
+
+def test_find_pyproject(tmp_path):
+    (tmp_path / 'pyproject.toml').write_text('')
+    (tmp_path / 'pkg').mkdir()
+    (tmp_path / 'pkg' / 'mod.py').write_text('')
+    assert tmp_path / 'pyproject.toml' == find_pyproject(tmp_path / 'pkg')
+    assert tmp_path / 'pyproject.toml' == find_pyproject(tmp_path / 'pkg' / 'mod.py')
+
+
+def test_load_config(tmp_path):
+    (tmp_path / 'pyproject.toml').write_text(
+        '[tool.import_deps]\nexclude = ["gen"]\nmax-file-size = 10\n')
+    assert {'exclude': ['gen'], 'max-file-size': 10} == load_config(tmp_path)
+
+
+def test_load_config_no_section(tmp_path):
+    (tmp_path / 'pyproject.toml').write_text('[project]\nname = "x"\n')
+    assert {} == load_config(tmp_path)
+
+
+@pytest.mark.parametrize('content, error', [
+    ('[tool.import_deps\n', 'invalid '),
+    ('[tool.import_deps]\nexclude = "gen"\n',
+     'tool.import_deps.exclude must be a list of strings'),
+    ('[tool.import_deps]\ninclude = [1]\n',
+     'tool.import_deps.include must be a list of strings'),
+    ('[tool.import_deps]\nmax-file-size = "10k"\n',
+     'tool.import_deps.max-file-size must be an integer'),
+    ('[tool.import_deps]\nroots = "src"\n',
+     'tool.import_deps.roots must be a list of strings'),
+])
+def test_load_config_invalid(tmp_path, capsys, content, error):
+    (tmp_path / 'pyproject.toml').write_text(content)
+    with pytest.raises(ConfigError, match=error):
+        load_config(tmp_path)
+    (tmp_path / 'a.py').write_text('')
+    with pytest.raises(SystemExit) as exc_info:
+        main(['import_deps', str(tmp_path), '--no-cache'])
+    assert exc_info.value.code == 1
+    assert f"Error: invalid {tmp_path / 'pyproject.toml'}" in capsys.readouterr().err
+
+
+def test_cli_config(tmp_path, capsys):
+    (tmp_path / 'pyproject.toml').write_text(
+        '[tool.import_deps]\nexclude = ["gen"]\nmax-file-size = 20\n')
+    pkg = tmp_path / 'pkg'
+    (pkg / 'gen').mkdir(parents=True)
+    (pkg / '__init__.py').write_text('')
+    (pkg / 'gen' / '__init__.py').write_text('')
+    (pkg / 'a.py').write_text('from . import b\n')
+    (pkg / 'b.py').write_text('from . import a  # this is a long line\n')
+    with pytest.raises(SystemExit) as exc_info:
+        main(['import_deps', str(pkg), '--no-cache'])
+    assert exc_info.value.code == 0
+    captured = capsys.readouterr()
+    assert 'pkg.gen' not in captured.out
+    assert 'pkg.a:\n  pkg.b\npkg.b:\n' in captured.out
+    assert str(pkg / 'b.py') in captured.err
+
+    # command line options
+    with pytest.raises(SystemExit) as exc_info:
+        main(['import_deps', str(pkg), '--no-cache', '--max-file-size', '100',
+              '--exclude', 'b.py'])
+    captured = capsys.readouterr()
+    # "from . import b" now refers to an object in pkg.__init__
+    assert 'pkg.__init__:\npkg.a:\n  pkg.__init__\n' == captured.out
+    assert '' == captured.err
+
+
+def test_source_roots(tmp_path):
+    assert [tmp_path] == source_roots(tmp_path)
+    (tmp_path / 'src').mkdir()
+    (tmp_path / 'pyproject.toml').write_text(
+        '[tool.setuptools.packages.find]\nwhere = ["src"]\n')
+    assert [tmp_path / 'src'] == source_roots(tmp_path)
+    for name in ('b', 'a'):
+        (tmp_path / 'libs' / name / 'src').mkdir(parents=True)
+    (tmp_path / 'pyproject.toml').write_text(
+        '[tool.import_deps]\nroots = [".", "libs/*/src"]\n')
+    assert [tmp_path, tmp_path / 'libs/a/src', tmp_path / 'libs/b/src'] == \
+        source_roots(tmp_path)
+
+
+def test_source_roots_no_toml(tmp_path, capsys, monkeypatch):
+    # python < 3.11 without tomli
+    monkeypatch.setattr(config, 'tomllib', None)
+    (tmp_path / 'src').mkdir()
+    (tmp_path / 'pyproject.toml').write_text(
+        '[tool.setuptools.packages.find]\nwhere = ["src"]\n')
+    assert [tmp_path] == source_roots(tmp_path)
+    assert 'Warning: install "tomli"' in capsys.readouterr().err
+
+
+def make_monorepo(tmp_path):
+    for name, code in (('a', 'import b.util\n'), ('b', 'from a import core\n')):
+        pkg = tmp_path / 'libs' / name / 'src' / name
+        pkg.mkdir(parents=True)
+        (pkg / '__init__.py').write_text('')
+        (pkg / ('core.py' if name == 'a' else 'util.py')).write_text(code)
+    return tmp_path / 'libs'
+
+
+def test_cli_multiple_paths(tmp_path, capsys):
+    libs = make_monorepo(tmp_path)
+    with pytest.raises(SystemExit) as exc_info:
+        main(['import_deps', str(libs / 'a' / 'src'), str(libs / 'b' / 'src'),
+              '--no-cache', '--check'])
+    assert exc_info.value.code == 1
+    captured = capsys.readouterr()
+    assert '  a.core -> b.util\n  b.util -> a.core\n' in captured.err
+    # time of each root only reported on stats
+    assert 'modules, found in' not in captured.err
+
+
+def test_cli_multiple_paths_stats(tmp_path, capsys):
+    libs = make_monorepo(tmp_path)
+    with pytest.raises(SystemExit) as exc_info:
+        main(['import_deps', str(libs / 'a' / 'src'), str(libs / 'b' / 'src'),
+              '--no-cache', '--stats', '--stats-json', 'stats.json'])
+    assert exc_info.value.code == 0
+    captured = capsys.readouterr()
+    assert '    {}: 2 modules'.format(libs / 'a' / 'src') in captured.err
+    assert '    {}: 2 modules'.format(libs / 'b' / 'src') in captured.err
+    with open('stats.json') as fp:
+        roots = json.load(fp)['roots']
+    assert [str(libs / 'a' / 'src'), str(libs / 'b' / 'src')] == \
+        [root['path'] for root in roots]
+    assert [2, 2] == [root['modules'] for root in roots]
+
+
+def test_cli_declared_roots(tmp_path, capsys):
+    make_monorepo(tmp_path)
+    (tmp_path / 'pyproject.toml').write_text(
+        '[tool.import_deps]\nroots = ["libs/*/src"]\n')
+    with pytest.raises(SystemExit) as exc_info:
+        main(['import_deps', str(tmp_path), '--no-cache', '--json'])
+    assert exc_info.value.code == 0
+    results = json.loads(capsys.readouterr().out)
+    assert {'module': 'b.util', 'imports': ['a.core']} in results
+    assert {'module': 'a.core', 'imports': ['b.util']} in results
+
+
+def test_cli_multiple_paths_error(tmp_path, capsys):
+    libs = make_monorepo(tmp_path)
+    with pytest.raises(SystemExit) as exc_info:
+        main(['import_deps', str(libs / 'a'), str(libs / 'b'), '--watch'])
+    assert exc_info.value.code == 1
+    assert 'single PATH' in capsys.readouterr().err
@@ -0,0 +1,196 @@
+import json
+import subprocess
+
+import pytest
+
+from import_deps.__main__ import main
+from import_deps.diff import graph_diff, revision_graph
+from import_deps.git import GitRepo, GitError
+from import_deps.graph import DependencyGraph
+
+
+def test_graph_diff():
+    old = DependencyGraph([('a', ['b']), ('b', []), ('c', ['a'])])
+    new = DependencyGraph([('a', ['b']), ('b', ['a']), ('d', ['a'])])
+    assert {
+        'added_modules': ['d'],
+        'removed_modules': ['c'],
+        'added_imports': [('b', 'a'), ('d', 'a')],
+        'removed_imports': [('c', 'a')],
+        'added_cycles': [['a', 'b']],
+        'removed_cycles': [],
+    } == graph_diff(old, new)
+
+
+def git(repo, *args):
+    subprocess.run(('git', '-c', 'user.name=test', '-c', 'user.email=test@example.com')
+                   + args, cwd=str(repo), check=True, stdout=subprocess.DEVNULL)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    """git repo with commits "v1" and "v2" of package "pkg" """
+    git(tmp_path, 'init', '-q')
+    pkg = tmp_path / 'pkg'
+    pkg.mkdir()
+    (pkg / '__init__.py').write_text('')
+    (pkg / 'a.py').write_text('from . import b\n')
+    (pkg / 'b.py').write_text('')
+    (pkg / 'c.py').write_text('import pkg.a\n')
+    git(tmp_path, 'add', '.')
+    git(tmp_path, 'commit', '-q', '-m', 'v1')
+    git(tmp_path, 'tag', 'v1')
+    (pkg / 'b.py').write_text('from pkg import a\n')
+    git(tmp_path, 'rm', '-q', 'pkg/c.py')
+    (pkg / 'd.py').write_text('import pkg.b\n')
+    git(tmp_path, 'add', '.')
+    git(tmp_path, 'commit', '-q', '-m', 'v2')
+    git(tmp_path, 'tag', 'v2')
+    return tmp_path
+
+
+class Test_GitRepo(object):
+    def test_files(self, repo):
+        git_repo = GitRepo(repo / 'pkg')
+        assert repo == git_repo.top
+        tree = git_repo.ls_tree('v1')
+        assert ['pkg/__init__.py', 'pkg/a.py', 'pkg/b.py', 'pkg/c.py'] == sorted(tree)
+        assert [(tree['pkg/a.py'], b'from . import b\n')] == list(
+            git_repo.cat_blobs([tree['pkg/a.py']]))
+        assert {'pkg/b.py', 'pkg/c.py', 'pkg/d.py'} == git_repo.changed_files('v1', 'v2')
+
+    def test_not_repo(self, tmp_path):
+        with pytest.raises(GitError):
+            GitRepo(tmp_path)
+
+
+class Test_revision_graph(object):
+    def test_same_as_checkout(self, repo):
+        git_repo = GitRepo(repo)
+        parsed = {}
+        graph = revision_graph(git_repo, 'v1', repo / 'pkg', parsed=parsed)
+        # same content of __init__.py and b.py is parsed once
+        assert 3 == len(parsed)
+        assert [('pkg.a', 'pkg.b'), ('pkg.c', 'pkg.a')] == [
+            (graph.names[a], graph.names[b]) for a, b in graph.edges()]
+        # unchanged blobs are not parsed again
+        revision_graph(git_repo, 'v2', repo / 'pkg', parsed=parsed)
+        assert 5 == len(parsed)
+
+    def test_base_inside_package(self, repo):
+        sub = repo / 'pkg' / 'sub'
+        sub.mkdir()
+        (sub / '__init__.py').write_text('')
+        (sub / 'x.py').write_text('from .. import a\n')
+        git(repo, 'add', '.')
+        git(repo, 'commit', '-q', '-m', 'v3')
+        graph = revision_graph(GitRepo(repo), 'HEAD', sub)
+        assert ['pkg.sub.__init__', 'pkg.sub.x'] == graph.names
+
+
+class Test_CLI(object):
+    def test_revisions(self, repo, capsys):
+        with pytest.raises(SystemExit) as exc_info:
+            main(['import_deps', str(repo / 'pkg'), '--diff', 'v1', 'v2',
+                  '--no-cache', '--check'])
+        assert exc_info.value.code == 1
+        assert capsys.readouterr().out == (
+            'Added modules:\n  pkg.d\n'
+            'Removed modules:\n  pkg.c\n'
+            'Added imports:\n  pkg.b -> pkg.a\n  pkg.d -> pkg.b\n'
+            'Removed imports:\n  pkg.c -> pkg.a\n'
+            'New circular dependencies:\n  pkg.a, pkg.b\n')
+
+    def test_working_tree(self, repo, tmp_path, capsys):
+        (repo / 'pkg' / 'd.py').write_text('')
+        (repo / 'pkg' / 'e.py').write_text('from . import a\n')
+        cache_dir = str(tmp_path / 'cache')
+        with pytest.raises(SystemExit) as exc_info:
+            main(['import_deps', str(repo / 'pkg'), '--diff', 'v2', '--json',
+                  '--cache-dir', cache_dir])
+        assert exc_info.value.code == 0
+        got = json.loads(capsys.readouterr().out)
+        assert ['pkg.e'] == got['added_modules']
+        assert [['pkg.e', 'pkg.a']] == got['added_imports']
+        assert [['pkg.d', 'pkg.b']] == got['removed_imports']
+
+    def test_no_changes(self, repo, capsys):
+        with pytest.raises(SystemExit) as exc_info:
+            main(['import_deps', str(repo / 'pkg'), '--diff', 'HEAD', '--no-cache'])
+        assert exc_info.value.code == 0
+        assert 'No changes in imports.\n' == capsys.readouterr().out
+
+    def test_snapshot(self, repo, tmp_path, capsys):
+        db = str(tmp_path / 'graph.db')
+        with pytest.raises(SystemExit):
+            main(['import_deps', str(repo / 'pkg'), '--save-graph', db, '--no-cache'])
+        capsys.readouterr()
+        with pytest.raises(SystemExit):
+            main(['import_deps', str(repo / 'pkg'), '--diff', 'v1', db, '--no-cache'])
+        assert 'Added modules:\n  pkg.d\n' in capsys.readouterr().out
+
+
+class Test_Since(object):
+    def test_since(self, repo, tmp_path, capsys):
+        db = str(tmp_path / 'v2.db')
+        pkg = str(repo / 'pkg')
+        with pytest.raises(SystemExit):
+            main(['import_deps', pkg, '--save-graph', db, '--no-cache'])
+        expected = capsys.readouterr().out
+        # not modified, imports taken from saved graph
+        with pytest.raises(SystemExit) as exc_info:
+            main(['import_deps', pkg, '--since', 'v2', '--base-graph', db,
+                  '--no-cache', '--self-check'])
+        assert exc_info.value.code == 0
+        captured = capsys.readouterr()
+        assert expected == captured.out
+        assert 'Parsing 0 of 4 modules' in captured.err
+        assert 'Self-check passed' in captured.err
+
+        # modified, renamed and untracked files
+        (repo / 'pkg' / 'a.py').write_text('')
+        git(repo, 'mv', 'pkg/d.py', 'pkg/e.py')
+        (repo / 'pkg' / 'f.py').write_text('from . import e\n')
+        with pytest.raises(SystemExit) as exc_info:
+            main(['import_deps', pkg, '--since', 'v2', '--base-graph', db,
+                  '--no-cache', '--self-check'])
+        assert exc_info.value.code == 0
+        captured = capsys.readouterr()
+        assert 'Parsing 3 of 5 modules' in captured.err
+        assert 'pkg.f:\n  pkg.e\n' in captured.out
+
+    def test_max_file_size(self, repo, tmp_path, capsys):
+        # b.py (18 bytes) not parsed on saved graph
+        db = str(tmp_path / 'v2.db')
+        pkg = str(repo / 'pkg')
+        with pytest.raises(SystemExit):
+            main(['import_deps', pkg, '--save-graph', db, '--no-cache',
+                  '--max-file-size', '17'])
+        assert 'pkg.b:\npkg.d:' in capsys.readouterr().out
+        with pytest.raises(SystemExit) as exc_info:
+            main(['import_deps', pkg, '--since', 'v2', '--base-graph', db,
+                  '--no-cache', '--self-check'])
+        assert exc_info.value.code == 0
+        captured = capsys.readouterr()
+        assert 'Parsing 1 of 4 modules' in captured.err
+        assert 'pkg.b:\n  pkg.a\n' in captured.out
+
+    def test_self_check_fail(self, repo, tmp_path, capsys):
+        db = str(tmp_path / 'v1.db')
+        pkg = str(repo / 'pkg')
+        git(repo, 'checkout', '-q', 'v1')
+        with pytest.raises(SystemExit):
+            main(['import_deps', pkg, '--save-graph', db, '--no-cache'])
+        git(repo, 'checkout', '-q', 'v2')
+        # wrong revision for saved graph
+        with pytest.raises(SystemExit) as exc_info:
+            main(['import_deps', pkg, '--since', 'v2', '--base-graph', db,
+                  '--no-cache', '--self-check'])
+        assert exc_info.value.code == 1
+        assert 'self-check failed' in capsys.readouterr().err
+
+    def test_requires_base_graph(self, repo, capsys):
+        with pytest.raises(SystemExit) as exc_info:
+            main(['import_deps', str(repo / 'pkg'), '--since', 'v2'])
+        assert exc_info.value.code == 1
+        assert '--base-graph' in capsys.readouterr().err
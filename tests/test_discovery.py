@@ -0,0 +1,108 @@
+from import_deps import PyModule, ModuleSet
+from import_deps.discovery import ModuleFinder, DEFAULT_EXCLUDE
+
+from .test_import_deps import sample_dir, FOO, SUB
+
+
+def by_path(modules):
+    return {mod.path: mod.fqn for mod in modules}
+
+
+class Test_ModuleFinder(object):
+    def test_same_as_py_module(self):
+        finder = ModuleFinder()
+        got = by_path(finder.find(sample_dir))
+        expected = by_path(PyModule(p) for p in sample_dir.glob('**/*.py'))
+        assert expected == got
+        assert 9 == finder.num_files
+        assert 3 == finder.num_dirs
+        assert finder.elapsed > 0
+
+    def test_base_inside_package(self):
+        # fqn includes packages above base path
+        got = by_path(ModuleFinder().find(SUB.pkg))
+        assert {SUB.init: ['foo', 'sub', '__init__'],
+                SUB.a: ['foo', 'sub', 'sub_a']} == got
+
+    def test_no_init(self, tmp_path):
+        (tmp_path / 'pkg').mkdir()
+        (tmp_path / 'pkg' / 'mod.py').write_text('')
+        (tmp_path / 'pkg' / 'data').mkdir()
+        (tmp_path / 'pkg' / 'data' / '__init__.py').write_text('')
+        got = by_path(ModuleFinder().find(tmp_path))
+        assert {tmp_path / 'pkg' / 'mod.py': ['mod'],
+                tmp_path / 'pkg' / 'data' / '__init__.py':
+                ['data', '__init__']} == got
+
+    def test_module_set(self):
+        modset = ModuleSet(ModuleFinder().find(FOO.pkg))
+        assert {'foo', 'foo.sub'} == modset.pkgs
+        assert modset.by_path[FOO.a] is modset.by_name['foo.foo_a']
+        assert {FOO.b, FOO.c} == modset.get_imports(modset.by_path[FOO.a])
+
+
+def make_tree(base, paths):
+    for path in paths:
+        full = base / path
+        full.parent.mkdir(parents=True, exist_ok=True)
+        full.write_text('')
+
+
+class Test_ModuleFinder_Exclude(object):
+    def test_default_exclude(self, tmp_path):
+        make_tree(tmp_path, ['pkg/__init__.py', '.venv/lib/six.py',
+                             'build/lib/pkg/__init__.py'])
+        finder = ModuleFinder()
+        got = by_path(finder.find(tmp_path))
+        assert [tmp_path / 'pkg/__init__.py'] == list(got)
+        assert 2 == finder.num_excluded
+        # excluded directories are not listed
+        assert 2 == finder.num_dirs
+
+    def test_default_exclude_build_package(self, tmp_path):
+        # "build" and "dist" are only excluded on the top directory
+        make_tree(tmp_path, ['pkg/__init__.py', 'pkg/build/__init__.py',
+                             'pkg/build/wheel.py', 'pkg/dist.py', 'dist/x.py'])
+        got = by_path(ModuleFinder().find(tmp_path))
+        assert sorted(got) == [tmp_path / 'pkg/__init__.py',
+                               tmp_path / 'pkg/build/__init__.py',
+                               tmp_path / 'pkg/build/wheel.py',
+                               tmp_path / 'pkg/dist.py']
+        files = ['pkg/__init__.py', 'pkg/build/__init__.py', 'build/lib/y.py']
+        make_tree(tmp_path, files)
+        got = by_path(ModuleFinder().find_paths(tmp_path, files))
+        assert sorted(got) == [tmp_path / 'pkg/__init__.py',
+                               tmp_path / 'pkg/build/__init__.py']
+
+    def test_exclude_name_and_path(self, tmp_path):
+        make_tree(tmp_path, ['pkg/__init__.py', 'pkg/mod_pb2.py',
+                             'pkg/fixtures/x.py', 'fixtures/y.py'])
+        finder = ModuleFinder(exclude=['*_pb2.py', 'pkg/fixtures/'])
+        got = by_path(finder.find(tmp_path))
+        assert sorted(got) == [tmp_path / 'fixtures/y.py',
+                               tmp_path / 'pkg/__init__.py']
+
+    def test_include(self, tmp_path):
+        make_tree(tmp_path, ['pkg/__init__.py', 'pkg/models.py',
+                             'pkg/sub/__init__.py', 'pkg/sub/models.py',
+                             'pkg/views.py'])
+        got = by_path(ModuleFinder(include=['models.py']).find(tmp_path))
+        # package detection is not affected by include
+        assert {tmp_path / 'pkg/models.py': ['pkg', 'models'],
+                tmp_path / 'pkg/sub/models.py': ['pkg', 'sub', 'models']} == got
+
+
+class Test_ModuleFinder_FindPaths(object):
+    def test_same_as_find(self, tmp_path):
+        files = ['pkg/__init__.py', 'pkg/mod.py', 'pkg/data/x.py',
+                 'pkg/sub/__init__.py', 'pkg/sub/m_pb2.py', 'pkg/sub/y.py',
+                 'build/lib/z.py', 'top.py', 'README']
+        make_tree(tmp_path, files)
+        finder = ModuleFinder(exclude=DEFAULT_EXCLUDE + ('*_pb2.py',))
+        expected = by_path(finder.find(tmp_path))
+        assert expected == by_path(finder.find_paths(tmp_path, files))
+        # parent package
+        got = by_path(finder.find_paths(tmp_path / 'pkg' / 'sub',
+                                        ['__init__.py', 'y.py'], ['pkg']))
+        assert {tmp_path / 'pkg/sub/__init__.py': ['pkg', 'sub', '__init__'],
+                tmp_path / 'pkg/sub/y.py': ['pkg', 'sub', 'y']} == got
@@ -0,0 +1,184 @@
+import random
+
+from import_deps import ModuleSet
+from import_deps.graph import strongly_connected_components, cycles
+from import_deps.graph import DependencyGraph, ReachabilityIndex
+from import_deps.__main__ import detect_cycles, topological_sort
+
+from .test_import_deps import FOO
+
+
+def test_scc():
+    graph = {'a': ['b'], 'b': ['c', 'x'], 'c': ['a'], 'd': ['c'], 'e': []}
+    got = strongly_connected_components(graph)
+    assert [['a', 'b', 'c'], ['d'], ['e']] == sorted(sorted(scc) for scc in got)
+    # dependencies before dependents
+    assert ['e'] == got[-1]
+    assert got.index(['d']) > 0
+
+
+def test_scc_from_nodes():
+    graph = {'a': ['b'], 'b': [], 'c': ['a']}
+    assert [['b'], ['a']] == strongly_connected_components(graph, ['a'])
+
+
+def test_cycles():
+    graph = {'a': ['b'], 'b': ['a', 'c'], 'c': [], 'd': ['d']}
+    got = sorted(cycles(graph), key=lambda c: sorted(c[0]))
+    assert [({'a', 'b'}, {('a', 'b'), ('b', 'a')}),
+            ({'d'}, {('d', 'd')})] == got
+
+
+class Test_DependencyGraph(object):
+    def test_edges(self):
+        graph = DependencyGraph([('b', ['a', 'os']), ('a', ['b']), ('c', [])])
+        assert ['b', 'a', 'c', 'os'] == graph.names
+        assert 3 == graph.num_modules
+        assert [1, 3] == list(graph.imports(0))
+        assert [] == list(graph.imports(3))
+        assert [0] == list(graph.dependents(3))
+        assert [1] == list(graph.dependents(0))
+        assert [(0, 1), (0, 3), (1, 0)] == list(graph.edges())
+
+    def test_sccs_same_as_dict(self):
+        rand = random.Random(3)
+        names = ['m{}'.format(i) for i in range(200)]
+        modules = [(name, sorted(rand.sample(names, 2))) for name in names]
+        graph = DependencyGraph(modules)
+        got = [[graph.names[n] for n in scc] for scc in graph.sccs()]
+        assert strongly_connected_components(dict(modules)) == got
+        assert ([(members, edges) for members, edges in cycles(dict(modules))]
+                == graph.cycles())
+
+    def test_reverse_reach(self):
+        graph = DependencyGraph([('a', ['b']), ('b', ['c']), ('c', []),
+                                 ('d', ['c', 'd']), ('e', ['a'])])
+        ids = graph.ids
+        assert ['b', 'a', 'e'] == [graph.names[n] for n in graph.reverse_reach([ids['b']])]
+        got = graph.reverse_reach([ids['c'], ids['b']])
+        assert ['a', 'b', 'c', 'd', 'e'] == sorted(graph.names[n] for n in got)
+
+    def test_from_module_set(self):
+        graph = DependencyGraph.from_module_set(ModuleSet(FOO.pkg.glob('**/*.py')))
+        node = graph.ids['foo.foo_a']
+        assert ['foo.foo_b', 'foo.foo_c'] == [graph.names[n] for n in graph.imports(node)]
+        assert set() == graph.cycle_edges()
+
+
+class Test_ReachabilityIndex(object):
+    def test_reaches(self):
+        graph = DependencyGraph([('a', ['b']), ('b', ['c', 'os']), ('c', ['b']),
+                                 ('d', [])])
+        index = ReachabilityIndex(graph)
+        assert 4 == index.num_components
+        assert index.reaches('a', 'c')
+        assert index.reaches('c', 'b')
+        assert index.reaches('c', 'os')
+        assert index.reaches('d', 'd')
+        assert not index.reaches('b', 'a')
+        assert not index.reaches('os', 'a')
+        assert not index.reaches('a', 'd')
+        assert index.nbytes > 0
+        assert index.elapsed > 0
+
+    def test_same_as_dfs(self):
+        rand = random.Random(5)
+        names = ['m{}'.format(i) for i in range(100)]
+        modules = [(name, rand.sample(names, rand.randint(0, 2))) for name in names]
+        index = ReachabilityIndex(DependencyGraph(modules))
+        edges = dict(modules)
+        for name in names:
+            seen = {name}
+            stack = [name]
+            while stack:
+                for dep in edges[stack.pop()]:
+                    if dep not in seen:
+                        seen.add(dep)
+                        stack.append(dep)
+            assert seen == set(target for target in names
+                               if index.reaches(name, target))
+
+
+class Test_Stress(object):
+    # recursive implementations would hit RecursionError
+    def test_long_chain(self):
+        results = [{'module': 'm{}'.format(i), 'imports': ['m{}'.format(i + 1)]}
+                   for i in range(100000)]
+        results.append({'module': 'm100000', 'imports': []})
+        assert set() == detect_cycles(results)
+        got = topological_sort(results)
+        assert 'm100000' == got[0]
+        assert 'm0' == got[-1]
+
+    def test_big_cycle(self):
+        size = 10000
+        results = [{'module': 'm{}'.format(i),
+                    'imports': ['m{}'.format((i + 1) % size)]}
+                   for i in range(size)]
+        results.append({'module': 'x', 'imports': ['m0']})
+        edges = detect_cycles(results)
+        assert size == len(edges)
+        assert ('m9999', 'm0') in edges
+        assert ('x', 'm0') not in edges
+        graph = {r['module']: r['imports'] for r in results}
+        assert [size] == [len(members) for members, _ in cycles(graph)]
+        got = topological_sort(results)
+        assert 'x' == got[-1]
+        assert sorted(got[:-1]) == got[:-1]
+
+
+def reference_sort(results):
+    """straightforward implementation of topological sort ordering on a DAG:
+    higher rank first, FIFO within same rank, isolated nodes last
+    """
+    modules = [r['module'] for r in results]
+    deps = {r['module']: list(r['imports']) for r in results}
+    dependents = {m: [] for m in modules}
+    for m in modules:
+        for d in deps[m]:
+            dependents[d].append(m)
+    rank = {}
+    def get_rank(node):
+        if node not in rank:
+            rank[node] = 1 + max([get_rank(d) for d in dependents[node]],
+                                 default=0)
+        return rank[node]
+    isolated = [m for m in modules if not deps[m] and not dependents[m]]
+    queue = sorted((m for m in modules if not deps[m] and m not in isolated),
+                   key=lambda m: (-get_rank(m), m))
+    in_degree = {m: len(deps[m]) for m in modules}
+    output = []
+    while queue:
+        node = queue.pop(0)
+        output.append(node)
+        for dependent in dependents[node]:
+            in_degree[dependent] -= 1
+            if in_degree[dependent] == 0:
+                pos = len(queue)
+                for i, queued in enumerate(queue):
+                    if get_rank(queued) < get_rank(dependent):
+                        pos = i
+                        break
+                queue.insert(pos, dependent)
+    return output + sorted(isolated)
+
+
+def test_topological_sort_order():
+    rand = random.Random(3)
+    for _ in range(50):
+        size = rand.randint(1, 30)
+        names = ['m{:02}'.format(i) for i in range(size)]
+        # only import modules with smaller number: no cycles
+        results = [{'module': name,
+                    'imports': sorted(rand.sample(names[:i], min(i, rand.randint(0, 3))))}
+                   for i, name in enumerate(names)]
+        assert reference_sort(results) == topological_sort(results)
+
+
+def test_topological_sort_wide():
+    results = [{'module': 'core', 'imports': []}]
+    results.extend({'module': 'm{:05}'.format(i), 'imports': ['core']}
+                   for i in range(20000))
+    got = topological_sort(results)
+    assert ['core', 'm00000', 'm00001'] == got[:3]
+    assert 'm19999' == got[-1]
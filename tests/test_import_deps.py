@@ -1,4 +1,8 @@
+import asyncio
+import concurrent.futures
+import io
 import json
+import threading
 import os
 import pathlib
 
@@ -7,7 +11,10 @@ import pytest
 from import_deps import ast_imports
 from import_deps import PyModule
 from import_deps import ModuleSet
-from import_deps.__main__ import main
+from import_deps import LazyModuleSet
+from import_deps import _make_chunks, _trie_pattern
+from import_deps.cache import ParseCache
+from import_deps.__main__ import main, format_dot, write_dot
 
 
 # list of modules in sample folder used for testing
@@ -48,6 +55,45 @@ def test_ast_imports():
     assert 7 == len(imports)
 
 
+TOP_LEVEL_SRC = """\
+import a
+try:
+    from b import c
+except ImportError:
+    pass
+class X:
+    import d
+    def method(self):
+        import e
+async def f():
+    if True:
+        from g import h
+data = {'x': [i for i in range(3)]}
+"""
+
+def test_ast_imports_nested(tmp_path):
+    path = tmp_path / 'mod.py'
+    path.write_text(TOP_LEVEL_SRC)
+    got = [imp[1] for imp in ast_imports(path)]
+    assert ['a', 'c', 'd', 'e', 'h'] == got
+
+def test_ast_imports_top_level_only(tmp_path):
+    path = tmp_path / 'mod.py'
+    path.write_text(TOP_LEVEL_SRC)
+    got = [imp[1] for imp in ast_imports(path, top_level_only=True)]
+    assert ['a', 'c', 'd'] == got
+
+
+def test_make_chunks(tmp_path):
+    paths = []
+    for name, size in (('a', 10), ('big', 1000), ('b', 20), ('c', 30)):
+        paths.append(tmp_path / (name + '.py'))
+        paths[-1].write_text('#' * size)
+    chunks = _make_chunks(paths, 2)
+    # big file alone on first chunk
+    assert chunks[0] == [tmp_path / 'big.py']
+    assert sorted(p for chunk in chunks for p in chunk) == sorted(paths)
+
 
 class Test_PyModule(object):
     def test_repr(self):
@@ -106,6 +152,23 @@ class Test_ModuleSet_Init(object):
         assert 3 == len(modset.by_path)
         assert modset.by_path[SUB.a].fqn == ['foo', 'sub', 'sub_a']
 
+    def test_same_name(self, tmp_path):
+        # module with smallest path is used
+        (tmp_path / 'x').mkdir()
+        (tmp_path / 'y').mkdir()
+        x = PyModule(tmp_path / 'x' / 'utils.py')
+        y = PyModule(tmp_path / 'y' / 'utils.py')
+        modset = ModuleSet([y, x])
+        assert x is modset.by_name['utils']
+        modset.remove_module(y)
+        assert x is modset.by_name['utils']
+        modset.add_module(y)
+        modset.remove_module(x)
+        assert y is modset.by_name['utils']
+        assert {'utils': 1} == modset._top_level
+        modset.remove_module(y)
+        assert {} == modset.by_name == modset.by_path == modset._top_level
+
 
 class Test_ModuleSet_GetImports(object):
 
@@ -189,6 +252,63 @@ class Test_ModuleSet_GetImports(object):
 
 
 
+    def test_get_all_imports(self):
+        modset = ModuleSet([FOO.init, FOO.a, FOO.b, FOO.c, BAR])
+        got = modset.get_all_imports(return_fqn=True)
+        assert [name for name, _ in got] == [
+            'bar', 'foo.__init__', 'foo.foo_a', 'foo.foo_b', 'foo.foo_c']
+        assert dict(got)['foo.foo_a'] == {'bar', 'foo.foo_b', 'foo.foo_c'}
+
+    def test_get_all_imports_jobs(self):
+        modset = ModuleSet(sample_dir.glob('**/*.py'))
+        expected = modset.get_all_imports()
+        assert expected == modset.get_all_imports(jobs=2)
+
+    def test_iter_imports(self):
+        modset = ModuleSet([FOO.init, FOO.a, FOO.b, FOO.c, BAR])
+        got = modset.iter_imports(return_fqn=True)
+        assert ('bar', {'foo.__init__'}) == next(got)
+        assert modset.get_all_imports(return_fqn=True)[1:] == list(got)
+
+
+    def test_max_file_size(self):
+        # foo_a bigger than 50 bytes
+        modset = ModuleSet([FOO.init, FOO.a, FOO.c, BAR], max_file_size=50)
+        assert set() == modset.get_imports(modset.by_name['foo.foo_a'])
+        assert [modset.by_name['foo.foo_a']] == modset.skipped
+        # can still be imported
+        assert {FOO.init} == modset.get_imports(modset.by_name['foo.foo_c'])
+
+
+    def test_resolve_memo(self):
+        modset = ModuleSet([FOO.init, FOO.c, FOO.d, SUB.init, SUB.a, BAZ])
+        init = modset.by_name['foo.__init__']
+        entry = ('foo', 'obj_i', None, 0)
+        assert (FOO.init, 'foo.__init__') == modset._resolve_entry(init, entry)
+        assert (1, 0) == (modset.resolve_misses, modset.resolve_hits)
+        # absolute import, same result for any module
+        modset._resolve_entry(modset.by_name['baz'], entry)
+        assert (1, 1) == (modset.resolve_misses, modset.resolve_hits)
+        # relative import memoized by its name
+        rel = ('', 'foo_c', None, 1)
+        assert (FOO.c, 'foo.foo_c') == modset._resolve_entry(
+            modset.by_name['foo.foo_d'], rel)
+        assert (FOO.c, 'foo.foo_c') == modset._resolve_entry(
+            modset.by_name['foo.sub.sub_a'], ('', 'foo_c', None, 2))
+        assert (2, 2) == (modset.resolve_misses, modset.resolve_hits)
+        assert (SUB.init, 'foo.sub.__init__') == modset._resolve_entry(
+            modset.by_name['foo.sub.sub_a'], rel)
+        assert (3, 2) == (modset.resolve_misses, modset.resolve_hits)
+
+    def test_resolve_memo_cleared(self):
+        modset = ModuleSet([FOO.init, FOO.a, BAR])
+        foo_a = modset.by_name['foo.foo_a']
+        assert {'bar', 'foo.__init__'} == modset.get_imports(foo_a, True)
+        modset.add_module(FOO.b)
+        assert {'bar', 'foo.foo_b'} == modset.get_imports(foo_a, True)
+        modset.remove_module(modset.by_name['bar'])
+        assert {'foo.foo_b'} == modset.get_imports(foo_a, True)
+
     def test_mod_imports(self):
         # foo_a  =>  import bar
         modset = ModuleSet([FOO.init, FOO.a, FOO.b, FOO.c, BAR])
@@ -197,6 +317,171 @@ class Test_ModuleSet_GetImports(object):
         assert imports == ['bar', 'foo.foo_b', 'foo.foo_c']
 
 
+class Test_ModuleSet_AiterImports(object):
+    @staticmethod
+    def collect(agen):
+        async def run():
+            return [item async for item in agen]
+        return asyncio.run(run())
+
+    @pytest.mark.parametrize('return_fqn', [False, True])
+    def test_same_as_sync(self, return_fqn):
+        modset = ModuleSet(sample_dir.glob('**/*.py'))
+        got = self.collect(modset.aiter_imports(return_fqn, concurrency=2))
+        assert modset.get_all_imports(return_fqn) == got
+
+    def test_cache_and_executor(self, tmp_path):
+        expected = ModuleSet(sample_dir.glob('**/*.py')).get_all_imports(True)
+        cache = ParseCache(str(tmp_path))
+        modset = ModuleSet(sample_dir.glob('**/*.py'), cache=cache)
+        modset.parse_modules([modset.by_name['foo.foo_a']])
+        with concurrent.futures.ProcessPoolExecutor(2) as executor:
+            got = self.collect(modset.aiter_imports(True, executor=executor))
+        assert expected == got
+        assert 1 == cache.hits
+
+    def test_backpressure_and_close(self):
+        started = []
+        lock = threading.Lock()
+        def parse(path):
+            with lock:
+                started.append(path)
+            return ast_imports(path)
+        modset = ModuleSet(sample_dir.glob('**/*.py'), parse=parse)
+        expected = modset.get_all_imports()[0]
+        del started[:]
+
+        async def run():
+            agen = modset.aiter_imports(concurrency=2)
+            first = await agen.__anext__()
+            await asyncio.sleep(0.05)
+            num_started = len(started)
+            await agen.aclose()
+            await asyncio.sleep(0.05)
+            return first, num_started
+        first, num_started = asyncio.run(run())
+        assert expected == first
+        assert num_started == 2
+        assert len(started) == 2
+
+
+def test_trie_pattern():
+    assert 'ba(?:r|z)' == _trie_pattern(['bar', 'baz'])
+    assert '(?:a(?:b)?|c\\.)' == _trie_pattern(['c.', 'ab', 'a'])
+
+
+class Test_ModuleSet_Prefilter(object):
+    def test_same_as_full(self):
+        expected = ModuleSet(sample_dir.glob('**/*.py')).get_all_imports(True)
+        modset = ModuleSet(sample_dir.glob('**/*.py'), prefilter=True)
+        assert expected == modset.get_all_imports(True)
+        assert expected == modset.get_all_imports(True, jobs=2)
+        assert modset.num_prefiltered > 0
+        # only top-level packages of the set are tracked
+        modset = ModuleSet(FOO.pkg.glob('**/*.py'), prefilter=True)
+        assert dict(modset.get_all_imports(True)) == {
+            'foo.__init__': set(), 'foo.foo_a': {'foo.foo_b', 'foo.foo_c'},
+            'foo.foo_b': set(), 'foo.foo_c': {'foo.__init__'},
+            'foo.foo_d': {'foo.foo_c'}, 'foo.sub.__init__': set(),
+            'foo.sub.sub_a': {'foo.foo_d'}}
+        assert 3 == modset.num_prefiltered
+
+    def test_skip_unrelated(self, tmp_path):
+        pkg = tmp_path / 'pkg'
+        pkg.mkdir()
+        (pkg / '__init__.py').write_text('')
+        (pkg / 'std.py').write_text('import os\nimport pkgutil\n')
+        (pkg / 'rel.py').write_text('from.std import x\n')
+        (pkg / 'cont.py').write_text('from \\\n    .rel import y\n')
+        (pkg / 'comment.py').write_text('import os  # not pkg\n')
+        parsed = []
+        def parse(path):
+            parsed.append(path.name)
+            return ast_imports(path)
+        modset = ModuleSet(pkg.glob('*.py'), parse=parse, prefilter=True)
+        got = dict(modset.get_all_imports(True))
+        assert got['pkg.rel'] == {'pkg.std'}
+        assert got['pkg.cont'] == {'pkg.rel'}
+        assert ['comment.py', 'cont.py', 'rel.py'] == sorted(parsed)
+        assert 2 == modset.num_prefiltered
+
+    def test_mmap(self, tmp_path, monkeypatch):
+        monkeypatch.setattr('import_deps.PREFILTER_MMAP_SIZE', 10)
+        (tmp_path / 'a.py').write_text('import b\n' + ' ' * 20)
+        (tmp_path / 'b.py').write_text('import os\n' + ' ' * 20)
+        modset = ModuleSet(tmp_path.glob('*.py'), prefilter=True)
+        assert [('a', {'b'}), ('b', set())] == modset.get_all_imports(True)
+        assert 1 == modset.num_prefiltered
+
+    def test_not_cached(self, tmp_path):
+        cache = ParseCache(str(tmp_path))
+        modset = ModuleSet(FOO.pkg.glob('**/*.py'), cache=cache, prefilter=True)
+        modset.get_all_imports()
+        assert 4 == len(cache)
+        got = Test_ModuleSet_AiterImports.collect(modset.aiter_imports(True))
+        assert 4 == cache.hits
+        assert 6 == modset.num_prefiltered
+        assert modset.get_all_imports(True) == got
+
+
+class Test_LazyModuleSet(object):
+    def test_same_as_module_set(self):
+        modset = ModuleSet(sample_dir.glob('**/*.py'))
+        for name, mod in modset.by_name.items():
+            lazy = LazyModuleSet(sample_dir)
+            assert modset.get_imports(mod) == lazy.get_imports(mod), name
+
+    def test_find_memoized(self):
+        lazy = LazyModuleSet(sample_dir)
+        got = lazy.get_imports(PyModule(FOO.a), return_fqn=True)
+        assert {'bar', 'foo.foo_b', 'foo.foo_c'} == got
+        assert lazy.by_name['foo.foo_c'].path == FOO.c
+        assert {'foo'} == lazy.pkgs
+        assert lazy._found['sample_f'] is None
+        found = dict(lazy._found)
+        lazy.get_imports(PyModule(FOO.a))
+        assert found == lazy._found
+
+    def test_not_package(self, tmp_path):
+        # modules are found only if parent directories are packages
+        (tmp_path / 'pkg').mkdir()
+        (tmp_path / 'pkg' / 'mod.py').write_text('')
+        (tmp_path / 'main.py').write_text('import pkg.mod\n')
+        lazy = LazyModuleSet(tmp_path)
+        assert set() == lazy.get_imports(PyModule(tmp_path / 'main.py'))
+        (tmp_path / 'pkg' / '__init__.py').write_text('')
+        lazy = LazyModuleSet(tmp_path)
+        assert ({tmp_path / 'pkg' / 'mod.py'} ==
+                lazy.get_imports(PyModule(tmp_path / 'main.py')))
+
+    @pytest.mark.parametrize('args', [
+        ['--exclude', 'gen'], ['--exclude', 'pkg/gen/t.py'], ['--exclude', '__init__.py'],
+        ['--include', 'u.py'], ['--include', 'pkg/gen/*'], [],
+    ])
+    def test_finder_patterns_cli(self, tmp_path, capsys, args):
+        for path, content in [('pkg/__init__.py', ''),
+                              ('pkg/m.py', 'from pkg.gen import t\nfrom . import u\n'),
+                              ('pkg/u.py', ''), ('pkg/gen/__init__.py', ''),
+                              ('pkg/gen/t.py', '')]:
+            (tmp_path / path).parent.mkdir(exist_ok=True)
+            (tmp_path / path).write_text(content)
+        outputs = []
+        for lazy_args in ([], ['--no-lazy']):
+            with pytest.raises(SystemExit):
+                main(['import_deps', str(tmp_path / 'pkg/m.py'), '--no-cache']
+                     + args + lazy_args)
+            outputs.append(capsys.readouterr().out)
+        assert outputs[0] == outputs[1]
+        if args == ['--exclude', 'gen']:
+            assert 'pkg.u\n' == outputs[0]
+
+    def test_mod_imports(self):
+        lazy = LazyModuleSet(sample_dir)
+        assert {'foo.foo_d'} == lazy.mod_imports('foo.sub.sub_a')
+        with pytest.raises(KeyError):
+            lazy.mod_imports('foo.not_found')
+
+
 class Test_CLI(object):
     def test_single_file(self, capsys):
         # Test single file analysis
@@ -210,6 +495,15 @@ class Test_CLI(object):
         assert 'foo.foo_b' in lines
         assert 'foo.foo_c' in lines
 
+    def test_single_file_no_lazy(self, capsys):
+        with pytest.raises(SystemExit):
+            main(['import_deps', str(FOO.a)])
+        expected = capsys.readouterr().out
+        with pytest.raises(SystemExit) as exc_info:
+            main(['import_deps', str(FOO.a), '--no-lazy'])
+        assert exc_info.value.code == 0
+        assert expected == capsys.readouterr().out
+
     def test_single_file_json(self, capsys):
         # Test single file with JSON output
         with pytest.raises(SystemExit) as exc_info:
@@ -262,6 +556,51 @@ class Test_CLI(object):
         assert sub_a is not None
         assert 'foo.foo_d' in sub_a['imports']
 
+    def test_directory_jobs(self, capsys):
+        with pytest.raises(SystemExit):
+            main(['import_deps', str(FOO.pkg), '--json'])
+        expected = capsys.readouterr().out
+        with pytest.raises(SystemExit) as exc_info:
+            main(['import_deps', str(FOO.pkg), '--json', '--jobs', '2',
+                  '--no-cache'])
+        assert exc_info.value.code == 0
+        assert expected == capsys.readouterr().out
+
+    def test_negative_jobs(self, capsys):
+        with pytest.raises(SystemExit) as exc_info:
+            main(['import_deps', str(FOO.pkg), '--jobs', '-1'])
+        assert exc_info.value.code == 1
+        assert 'Error: --jobs must be 0 or greater' in capsys.readouterr().err
+
+    def test_top_level_only(self, tmp_path, capsys):
+        pkg = tmp_path / 'pkg'
+        pkg.mkdir()
+        (pkg / '__init__.py').write_text('')
+        (pkg / 'a.py').write_text('from . import b\ndef f():\n    from . import c\n')
+        (pkg / 'b.py').write_text('')
+        (pkg / 'c.py').write_text('')
+        with pytest.raises(SystemExit):
+            main(['import_deps', str(pkg / 'a.py'), '--no-cache'])
+        assert ['pkg.b', 'pkg.c'] == capsys.readouterr().out.split()
+        with pytest.raises(SystemExit):
+            main(['import_deps', str(pkg / 'a.py'), '--no-cache',
+                  '--top-level-only'])
+        assert ['pkg.b'] == capsys.readouterr().out.split()
+
+    def test_cache_per_engine(self, tmp_path, capsys):
+        # "fast" engine does not detect syntax errors outside imports
+        pkg = tmp_path / 'pkg'
+        pkg.mkdir()
+        (pkg / '__init__.py').write_text('')
+        (pkg / 'a.py').write_text('import os\nx = (\n')
+        os.utime(pkg / 'a.py', (0, 0))
+        with pytest.raises(SystemExit) as exc_info:
+            main(['import_deps', str(pkg), '--engine', 'fast'])
+        assert exc_info.value.code == 0
+        assert os.path.exists('.import_deps_cache/imports-fast.json')
+        with pytest.raises(SyntaxError):
+            main(['import_deps', str(pkg), '--engine', 'ast'])
+
     def test_single_file_dot(self, capsys):
         # Test single file with DOT output
         with pytest.raises(SystemExit) as exc_info:
@@ -420,3 +759,97 @@ class Test_CLI(object):
         assert sorted_modules.index('B') < sorted_modules.index('D')
         assert sorted_modules.index('C') < sorted_modules.index('D')
         assert sorted_modules.index('E') == len(sorted_modules) - 1
+
+    def test_detect_cycles(self):
+        from import_deps.__main__ import detect_cycles
+        # A -> B -> A, B -> C -> D -> B; D -> E; F -> F
+        results = [
+            {'module': 'A', 'imports': ['B']},
+            {'module': 'B', 'imports': ['A', 'C']},
+            {'module': 'C', 'imports': ['D']},
+            {'module': 'D', 'imports': ['B', 'E']},
+            {'module': 'E', 'imports': []},
+            {'module': 'F', 'imports': ['F']},
+        ]
+        assert detect_cycles(results) == {
+            ('A', 'B'), ('B', 'A'), ('B', 'C'), ('C', 'D'), ('D', 'B'),
+            ('F', 'F')}
+
+    def test_check_cycles(self, tmp_path, capsys):
+        (tmp_path / 'a.py').write_text('import b\n')
+        (tmp_path / 'b.py').write_text('import a\n')
+        with pytest.raises(SystemExit) as exc_info:
+            main(['import_deps', str(tmp_path), '--check', '--no-cache'])
+        assert exc_info.value.code == 1
+        assert capsys.readouterr().err == (
+            'Circular dependencies detected:\n  a -> b\n  b -> a\n')
+
+    def test_rdeps(self, capsys):
+        with pytest.raises(SystemExit) as exc_info:
+            main(['import_deps', str(FOO.pkg), '--rdeps', 'foo.foo_c'])
+        assert exc_info.value.code == 0
+        assert capsys.readouterr().out == (
+            'foo.foo_a\nfoo.foo_d\nfoo.sub.sub_a\n')
+
+    def test_rdeps_not_found(self, capsys):
+        with pytest.raises(SystemExit) as exc_info:
+            main(['import_deps', str(FOO.pkg), '--rdeps', 'foo.xxx'])
+        assert exc_info.value.code == 1
+        assert 'foo.xxx' in capsys.readouterr().err
+
+    def test_affected(self, capsys):
+        with pytest.raises(SystemExit) as exc_info:
+            main(['import_deps', str(FOO.pkg), '--json',
+                  '--affected', str(FOO.d), str(SUB.init)])
+        assert exc_info.value.code == 0
+        got = json.loads(capsys.readouterr().out)
+        assert [str(FOO.d), str(SUB.init), str(SUB.a)] == got
+
+    def test_affected_tests(self, tmp_path, capsys):
+        (tmp_path / 'app.py').write_text('')
+        (tmp_path / 'util.py').write_text('import app\n')
+        (tmp_path / 'tests').mkdir()
+        (tmp_path / 'tests' / 'test_app.py').write_text('import util\n')
+        (tmp_path / 'tests' / 'test_other.py').write_text('')
+        with pytest.raises(SystemExit):
+            main(['import_deps', str(tmp_path), '--no-cache',
+                  '--affected', str(tmp_path / 'app.py'), '--tests', 'test_*.py'])
+        assert capsys.readouterr().out == str(tmp_path / 'tests' / 'test_app.py') + '\n'
+
+    def test_query(self, tmp_path, capsys):
+        queries = tmp_path / 'queries.txt'
+        queries.write_text('foo.sub.sub_a foo.foo_c\n\n'
+                           'foo.foo_c foo.foo_a\nfoo.foo_c foo.xxx\n')
+        with pytest.raises(SystemExit) as exc_info:
+            main(['import_deps', str(FOO.pkg), '--query', str(queries)])
+        assert exc_info.value.code == 0
+        captured = capsys.readouterr()
+        assert captured.out == ('foo.sub.sub_a foo.foo_c yes\n'
+                                'foo.foo_c foo.foo_a no\n'
+                                'foo.foo_c foo.xxx no\n')
+        assert 'Reachability index: ' in captured.err
+        assert 'module not found: foo.xxx' in captured.err
+
+    def test_jsonl(self, capsys):
+        with pytest.raises(SystemExit):
+            main(['import_deps', str(FOO.pkg), '--json'])
+        expected = json.loads(capsys.readouterr().out)
+        with pytest.raises(SystemExit) as exc_info:
+            main(['import_deps', str(FOO.pkg), '--jsonl', '--jobs', '2', '--no-cache'])
+        assert exc_info.value.code == 0
+        lines = capsys.readouterr().out.splitlines()
+        got = [json.loads(line) for line in lines]
+        assert expected == sorted(got, key=lambda result: result['module'])
+
+    def test_write_dot_nested(self):
+        results = [{'module': 'a.b.c.m', 'imports': ['a.x']},
+                   {'module': 'a.x', 'imports': []},
+                   {'module': 'a.b.y', 'imports': []}]
+        out = io.StringIO()
+        write_dot(results, out)
+        got = out.getvalue()
+        assert got == format_dot(results) + '\n'
+        clusters = [line for line in got.splitlines() if 'subgraph' in line]
+        assert clusters == ['    subgraph cluster_a {',
+                            '        subgraph cluster_a_b {',
+                            '            subgraph cluster_a_b_c {']
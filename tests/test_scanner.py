@@ -0,0 +1,130 @@
+import pathlib
+import sysconfig
+import textwrap
+
+import pytest
+
+from import_deps import ast_imports, _parse_imports
+from import_deps.scanner import scan_imports, fast_imports
+from import_deps.__main__ import main
+
+from .test_import_deps import sample_dir, FOO
+
+
+def check_same(source):
+    source = textwrap.dedent(source).encode('utf-8')
+    assert _parse_imports(source, 'x.py') == scan_imports(source, 'x.py')
+
+
+class Test_ScanImports(object):
+    def test_no_imports(self):
+        assert [] == scan_imports(b'x = 1\n')
+
+    def test_import_as(self):
+        check_same('''
+        import os.path as osp, sys
+        from .. import a as b, c
+        ''')
+
+    def test_multiline(self):
+        check_same('''
+        from foo import (a,  # comment with ) parenthesis
+                         b as c,
+        )
+        from bar import x, \\
+            y
+        ''')
+
+    def test_nested(self):
+        check_same('''
+        def f():
+            import a
+            class X:
+                if True:
+                    from b import c
+        try:
+            import d
+        except ImportError:
+            d = None
+        ''')
+
+    def test_strings_and_comments(self):
+        check_same("""
+        '''docstring
+        import not_a
+        from not_b import x
+        '''
+        # import not_c
+        s = "import not_d"
+        t = '''
+        import not_e'''
+        r = 'it\\'s\\
+        import not_f'
+        import g
+        """)
+
+    def test_yield_raise_from(self):
+        check_same('''
+        def f():
+            yield from g()
+            raise ValueError() from None
+        from h import i
+        ''')
+
+    def test_compound_statement(self):
+        check_same('''
+        if True: import a
+        x = 1; from b import c
+        try: from d import e
+        except ImportError: pass
+        ''')
+
+    def test_crlf(self):
+        source = b'from a import (b,\r\n   c)\r\nimport d\r\n'
+        assert _parse_imports(source, 'x.py') == scan_imports(source)
+
+    def test_encoding(self):
+        source = '# -*- coding: latin-1 -*-\nimport caf\xe9\n'
+        assert ([(None, 'caf\xe9', None, None)] ==
+                scan_imports(source.encode('latin-1')))
+
+    def test_top_level_only(self):
+        source = b'import a\nif x:\n    import b\ndef f():\n    import c\n'
+        expected = _parse_imports(source, 'x.py', top_level_only=True)
+        assert [(None, 'a', None, None), (None, 'b', None, None)] == expected
+        assert expected == scan_imports(source, top_level_only=True)
+        source = b'import a\nx = 1\n'
+        assert ([(None, 'a', None, None)] ==
+                scan_imports(source, top_level_only=True))
+
+    def test_syntax_error_in_import(self):
+        with pytest.raises(SyntaxError):
+            scan_imports(b'import\n')
+
+
+def test_same_as_ast_sample():
+    for path in sorted(sample_dir.glob('**/*.py')):
+        assert ast_imports(path) == fast_imports(path)
+
+
+def test_same_as_ast_stdlib():
+    stdlib = pathlib.Path(sysconfig.get_paths()['stdlib'])
+    count = 0
+    for path in sorted(stdlib.glob('*.py')):
+        try:
+            expected = _parse_imports(path.read_bytes(), path)
+        except (SyntaxError, ValueError):
+            continue
+        assert expected == fast_imports(path), path
+        count += 1
+    assert count > 100
+
+
+def test_cli_engine(capsys):
+    with pytest.raises(SystemExit):
+        main(['import_deps', str(FOO.pkg), '--no-cache'])
+    expected = capsys.readouterr().out
+    with pytest.raises(SystemExit) as exc_info:
+        main(['import_deps', str(FOO.pkg), '--no-cache', '--engine', 'fast'])
+    assert exc_info.value.code == 0
+    assert expected == capsys.readouterr().out
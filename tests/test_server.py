@@ -0,0 +1,94 @@
+import threading
+
+import pytest
+
+from import_deps import server
+from import_deps.server import ImportServer
+from import_deps.watch import IncrementalGraph
+from import_deps.__main__ import main
+
+from .test_import_deps import FOO
+from .test_watch import write
+
+
+@pytest.fixture
+def pkg(tmp_path):
+    write(tmp_path / 'pkg/__init__.py', '')
+    write(tmp_path / 'pkg/a.py', 'from . import b\n')
+    write(tmp_path / 'pkg/b.py', 'from . import c\n')
+    write(tmp_path / 'pkg/c.py', '')
+    return tmp_path
+
+
+class Test_ImportServer(object):
+    def test_queries(self, pkg):
+        srv = ImportServer(IncrementalGraph(pkg))
+        assert [{'module': 'pkg.a', 'imports': ['pkg.b']}] == \
+            srv.handle({'query': 'deps', 'modules': ['pkg.a']})['result']
+        assert 4 == len(srv.handle({'query': 'deps'})['result'])
+        assert ['pkg.a', 'pkg.b'] == \
+            srv.handle({'query': 'rdeps', 'modules': ['pkg.c']})['result']
+        assert [] == srv.handle({'query': 'cycles'})['result']
+        assert ['pkg.c', 'pkg.b', 'pkg.a', 'pkg.__init__'] == \
+            srv.handle({'query': 'sort'})['result']
+
+    def test_refresh(self, pkg):
+        srv = ImportServer(IncrementalGraph(pkg))
+        assert [] == srv.handle({'query': 'cycles'})['result']
+        write(pkg / 'pkg/c.py', 'from . import a\n')
+        response = srv.handle({'query': 'cycles', 'files': [str(pkg / 'pkg/c.py')]})
+        assert [['pkg.a', 'pkg.b'], ['pkg.b', 'pkg.c'], ['pkg.c', 'pkg.a']] == \
+            [list(edge) for edge in response['result']]
+
+    def test_errors(self, pkg):
+        srv = ImportServer(IncrementalGraph(pkg))
+        assert 'error' in srv.handle({'query': 'xxx'})
+        assert 'error' in srv.handle({'query': 'rdeps'})
+        assert 'error' in srv.handle({'query': 'deps', 'modules': 'pkg.a'})
+        response = srv.handle({'query': 'rdeps', 'modules': ['pkg.x']})
+        assert 'module not found: pkg.x' == response['error']
+
+
+class Test_CLI(object):
+    @pytest.fixture
+    def socket_path(self, tmp_path):
+        socket_path = tmp_path / 's.sock'
+        srv = ImportServer(IncrementalGraph(FOO.pkg))
+        thread = threading.Thread(target=srv.serve, args=(socket_path,))
+        thread.start()
+        try:
+            for _ in range(100):
+                if server.is_running(socket_path):
+                    break
+                threading.Event().wait(0.01)
+            yield socket_path
+        finally:
+            server.request(socket_path, 'stop')
+            thread.join()
+        assert not socket_path.exists()
+
+    @pytest.mark.parametrize('args', [
+        [], ['--json'], ['--sort'], ['--check'],
+        ['--rdeps', 'foo.foo_c'], ['--rdeps', 'foo.foo_c', '--json'],
+        ['--rdeps', 'foo.xxx'],
+    ])
+    def test_same_output(self, socket_path, capsys, args):
+        with pytest.raises(SystemExit) as exc_info:
+            main(['import_deps', str(FOO.pkg), '--no-cache'] + args)
+        expected = (exc_info.value.code, capsys.readouterr())
+        with pytest.raises(SystemExit) as exc_info:
+            main(['import_deps', '--connect', str(socket_path),
+                  '--changed', str(FOO.a)] + args)
+        assert expected == (exc_info.value.code, capsys.readouterr())
+
+    def test_connect_error(self, tmp_path, capsys):
+        with pytest.raises(SystemExit) as exc_info:
+            main(['import_deps', '--connect', str(tmp_path / 'x.sock')])
+        assert exc_info.value.code == 1
+        assert 'could not query server' in capsys.readouterr().err
+
+    def test_connect_with_path(self, tmp_path, capsys):
+        with pytest.raises(SystemExit) as exc_info:
+            main(['import_deps', str(FOO.pkg), '--connect', str(tmp_path / 'x.sock')])
+        assert exc_info.value.code == 1
+        assert '--connect can only be used with' in capsys.readouterr().err
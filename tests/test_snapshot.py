@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+from import_deps import ModuleSet
+from import_deps.__main__ import main
+from import_deps.graph import DependencyGraph
+from import_deps.snapshot import save_graph, GraphSnapshot
+
+from .test_import_deps import FOO
+
+
+class Test_GraphSnapshot(object):
+    def test_save_load(self, tmp_path):
+        mset = ModuleSet(FOO.pkg.glob('**/*.py'))
+        graph = DependencyGraph.from_module_set(mset)
+        paths = {name: mod.path for name, mod in mset.by_name.items()}
+        db = tmp_path / 'graph.db'
+        save_graph(db, graph, paths, FOO.pkg)
+
+        snapshot = GraphSnapshot(db)
+        assert FOO.pkg == snapshot.base_path
+        assert paths == snapshot.paths()
+        got = snapshot.graph()
+        assert graph.names == got.names
+        assert list(graph.edges()) == list(got.edges())
+        assert ['foo.foo_b', 'foo.foo_c'] == snapshot.imports('foo.foo_a')
+        assert ['foo.foo_a', 'foo.foo_d'] == snapshot.dependents('foo.foo_c')
+        snapshot.close()
+
+    def test_invalid(self, tmp_path):
+        db = tmp_path / 'graph.db'
+        db.write_text('xxx')
+        with pytest.raises(ValueError):
+            GraphSnapshot(db)
+        with pytest.raises(ValueError):
+            GraphSnapshot(tmp_path / 'not-found.db')
+
+
+class Test_CLI(object):
+    @pytest.mark.parametrize('args', [
+        [], ['--json'], ['--dot'], ['--sort'], ['--check'],
+        ['--rdeps', 'foo.foo_c'], ['--affected', str(FOO.d), '--tests', 'sub/*'],
+    ])
+    def test_same_output(self, tmp_path, capsys, args):
+        db = str(tmp_path / 'graph.db')
+        with pytest.raises(SystemExit):
+            main(['import_deps', str(FOO.pkg), '--save-graph', db] + args)
+        expected = capsys.readouterr()
+        with pytest.raises(SystemExit) as exc_info:
+            main(['import_deps', '--load-graph', db] + args)
+        assert exc_info.value.code == 0
+        assert expected == capsys.readouterr()
+
+    def test_load_error(self, tmp_path, capsys):
+        with pytest.raises(SystemExit) as exc_info:
+            main(['import_deps', '--load-graph', str(tmp_path / 'x.db')])
+        assert exc_info.value.code == 1
+        assert 'file not found' in capsys.readouterr().err
+
+    @pytest.mark.parametrize('name', ['no_dir/graph.db', 'a_dir'])
+    def test_save_error(self, tmp_path, capsys, name):
+        (tmp_path / 'a_dir').mkdir()
+        with pytest.raises(SystemExit) as exc_info:
+            main(['import_deps', str(FOO.pkg), '--no-cache',
+                  '--save-graph', str(tmp_path / name)])
+        assert exc_info.value.code == 1
+        assert 'Error: can not save graph' in capsys.readouterr().err
+        # temporary file removed
+        assert ['a_dir'] == sorted(os.listdir(tmp_path))
+
+    def test_path_required(self, capsys):
+        with pytest.raises(SystemExit) as exc_info:
+            main(['import_deps', '--json'])
+        assert exc_info.value.code == 1
+        assert 'PATH is required' in capsys.readouterr().err
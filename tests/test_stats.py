@@ -0,0 +1,94 @@
+import json
+
+import pytest
+
+from import_deps import ModuleSet
+from import_deps.__main__ import main
+from import_deps.cache import ParseCache
+from import_deps.stats import Stats
+
+from .test_import_deps import FOO
+
+
+class Test_ModuleSet_Hooks(object):
+    def test_parse(self):
+        calls = []
+        mset = ModuleSet(FOO.pkg.glob('**/*.py'))
+        mset.hooks.append(lambda mod, elapsed, size, cached:
+                          calls.append((mod.path, size, cached)))
+        mset.parse_modules(list(mset.by_path.values()))
+        assert len(calls) == len(mset.by_path)
+        assert (FOO.a, FOO.a.stat().st_size, False) in calls
+
+    def test_parse_jobs(self):
+        calls = []
+        mset = ModuleSet(FOO.pkg.glob('**/*.py'))
+        mset.hooks.append(lambda mod, elapsed, size, cached: calls.append(mod.path))
+        mset.parse_modules(list(mset.by_path.values()), jobs=2)
+        assert sorted(mset.by_path) == sorted(calls)
+
+    def test_cached(self, tmp_path):
+        mset = ModuleSet([FOO.a], cache=ParseCache(str(tmp_path)))
+        mset.parse_modules(list(mset.by_path.values()))
+        stats = Stats()
+        mset.hooks.append(stats)
+        mset.parse_modules(list(mset.by_path.values()))
+        assert (0, 1, 0) == (stats.num_parsed, stats.num_cached, stats.bytes_read)
+
+
+class Test_Stats(object):
+    def test_phases(self):
+        stats = Stats()
+        stats.start('a')
+        stats.start('b')
+        stats.start('a')
+        stats.stop()
+        stats.stop()
+        assert ['a', 'b'] == list(stats.phases)
+        report = stats.report()
+        assert ['a', 'b'] == [phase['name'] for phase in report['phases']]
+        assert report['files_per_sec'] is None
+
+    def test_slowest(self):
+        stats = Stats(num_slowest=2)
+        mset = ModuleSet([FOO.a, FOO.b, FOO.c])
+        for elapsed, mod in zip((0.3, 0.1, 0.2), mset.by_path.values()):
+            stats(mod, elapsed, 10, False)
+        assert [0.3, 0.2] == [elapsed for elapsed, _, _ in stats.slowest()]
+        assert (3, 30) == (stats.num_parsed, stats.bytes_read)
+
+
+class Test_CLI(object):
+    def test_stats(self, capsys):
+        with pytest.raises(SystemExit) as exc_info:
+            main(['import_deps', str(FOO.pkg), '--no-cache', '--check', '--stats'])
+        assert exc_info.value.code == 0
+        err = capsys.readouterr().err
+        for phase in ('discovery', 'parse', 'resolve', 'graph', 'cycles', 'total'):
+            assert f'  {phase} ' in err
+        assert 'slowest files:' in err
+
+    def test_stats_json(self, tmp_path, capsys):
+        out_file = tmp_path / 'stats.json'
+        with pytest.raises(SystemExit) as exc_info:
+            main(['import_deps', str(FOO.pkg), '--no-cache', '--json',
+                  '--stats-json', str(out_file), '--stats-slowest', '2'])
+        assert exc_info.value.code == 0
+        json.loads(capsys.readouterr().out)
+        report = json.loads(out_file.read_text())
+        assert report['parsed'] == report['files'] > 2
+        assert report['resolve_hits'] + report['resolve_misses'] > 0
+        assert 2 == len(report['slowest'])
+        assert 'output' == report['phases'][-1]['name']
+
+    def test_stats_prefiltered(self, tmp_path, capsys):
+        out_file = tmp_path / 'stats.json'
+        with pytest.raises(SystemExit) as exc_info:
+            main(['import_deps', str(FOO.pkg), '--no-cache', '--json', '--prefilter',
+                  '--stats-json', str(out_file)])
+        assert exc_info.value.code == 0
+        json.loads(capsys.readouterr().out)
+        report = json.loads(out_file.read_text())
+        # foo/__init__.py, foo/sub/__init__.py and foo/foo_b.py
+        assert (7, 4, 3) == (report['files'], report['parsed'],
+                             report['prefiltered'])
@@ -0,0 +1,204 @@
+import io
+import os
+import random
+
+import pytest
+
+from import_deps import ModuleSet
+from import_deps.discovery import ModuleFinder
+from import_deps.graph import cycles
+from import_deps import watch
+from import_deps.watch import IncrementalGraph, run
+from import_deps.__main__ import main
+
+
+def write(path, content):
+    """write file making sure mtime changes"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    exists = path.exists()
+    mtime = os.stat(path).st_mtime_ns if exists else 0
+    path.write_text(content)
+    if exists:
+        os.utime(path, ns=(mtime + 10**9, mtime + 10**9))
+
+
+def full_graph(base_path):
+    """compute graph from scratch"""
+    mset = ModuleSet(ModuleFinder().find(base_path))
+    imports = dict(mset.get_all_imports(return_fqn=True))
+    cycle_edges = set()
+    for _, edges in cycles(imports):
+        cycle_edges.update(edges)
+    return imports, cycle_edges
+
+
+def check_graph(graph):
+    imports, cycle_edges = full_graph(graph.base_path)
+    assert imports == graph.imports
+    assert cycle_edges == graph.cycle_edges
+
+
+class Test_IncrementalGraph(object):
+    def test_initial(self, tmp_path):
+        write(tmp_path / 'pkg/__init__.py', '')
+        write(tmp_path / 'pkg/a.py', 'from . import b\n')
+        write(tmp_path / 'pkg/b.py', '')
+        graph = IncrementalGraph(tmp_path)
+        assert {'pkg.__init__': set(), 'pkg.a': {'pkg.b'},
+                'pkg.b': set()} == graph.imports
+        assert set() == graph.cycle_edges
+        assert ([], [], []) == graph.update()
+
+    def test_modify_cycle(self, tmp_path):
+        write(tmp_path / 'pkg/__init__.py', '')
+        write(tmp_path / 'pkg/a.py', 'from . import b\n')
+        write(tmp_path / 'pkg/b.py', '')
+        graph = IncrementalGraph(tmp_path)
+
+        write(tmp_path / 'pkg/b.py', 'from . import a\n')
+        assert ([], [], ['pkg.b']) == graph.update()
+        assert {('pkg.a', 'pkg.b'), ('pkg.b', 'pkg.a')} == graph.cycle_edges
+
+        write(tmp_path / 'pkg/a.py', '')
+        assert ([], [], ['pkg.a']) == graph.update()
+        assert set() == graph.cycle_edges
+        check_graph(graph)
+
+    def test_add_remove(self, tmp_path):
+        write(tmp_path / 'pkg/__init__.py', '')
+        write(tmp_path / 'pkg/a.py', 'from . import b\n')
+        graph = IncrementalGraph(tmp_path)
+        # "b" is an object in pkg.__init__
+        assert {'pkg.__init__'} == graph.imports['pkg.a']
+
+        write(tmp_path / 'pkg/b.py', '')
+        assert (['pkg.b'], [], []) == graph.update()
+        assert {'pkg.b'} == graph.imports['pkg.a']
+
+        (tmp_path / 'pkg/b.py').unlink()
+        assert ([], ['pkg.b'], []) == graph.update()
+        assert {'pkg.__init__'} == graph.imports['pkg.a']
+        check_graph(graph)
+
+    def test_package_created(self, tmp_path):
+        # adding __init__.py changes name of modules in directory
+        write(tmp_path / 'main.py', 'import pkg.a\n')
+        write(tmp_path / 'pkg/a.py', '')
+        graph = IncrementalGraph(tmp_path)
+        assert {'main': set(), 'a': set()} == graph.imports
+        write(tmp_path / 'pkg/__init__.py', '')
+        graph.update()
+        assert {'pkg.a'} == graph.imports['main']
+        check_graph(graph)
+
+    def test_unchanged_dirs(self, tmp_path):
+        write(tmp_path / 'pkg/__init__.py', '')
+        write(tmp_path / 'pkg/a.py', '')
+        write(tmp_path / 'pkg/b.py', '')
+        for path in (tmp_path, tmp_path / 'pkg'):
+            os.utime(path, ns=(10**18, 10**18))
+        graph = IncrementalGraph(tmp_path)
+        assert graph._dirs is not None
+        # directories are not listed again
+        (tmp_path / 'pkg/x').mkdir()
+        os.utime(tmp_path / 'pkg', ns=(10**18, 10**18))
+        write(tmp_path / 'pkg/x/c.py', '')
+        write(tmp_path / 'pkg/a.py', 'from . import b\n')
+        assert ([], [], ['pkg.a']) == graph.update()
+        # only given files are checked
+        write(tmp_path / 'pkg/b.py', 'from . import a\n')
+        write(tmp_path / 'pkg/a.py', '')
+        assert ([], [], ['pkg.b']) == graph.update([tmp_path / 'pkg/b.py'])
+        assert ([], [], ['pkg.a']) == graph.update()
+        # new file changes directory mtime
+        write(tmp_path / 'pkg/d.py', '')
+        assert ['c', 'pkg.d'] == sorted(graph.update()[0])
+        check_graph(graph)
+
+    def test_random_changes(self, tmp_path):
+        rand = random.Random(42)
+        names = ['m{}'.format(i) for i in range(12)]
+        write(tmp_path / 'pkg/__init__.py', '')
+        graph = IncrementalGraph(tmp_path)
+        for _ in range(30):
+            for name in rand.sample(names, 3):
+                path = tmp_path / 'pkg' / (name + '.py')
+                if path.exists() and rand.random() < 0.2:
+                    path.unlink()
+                    continue
+                deps = rand.sample(names, rand.randint(0, 3))
+                write(path, ''.join('from . import {}\n'.format(dep)
+                                    for dep in deps))
+            graph.update()
+            check_graph(graph)
+
+    def test_duplicate_names(self, tmp_path):
+        # scripts on non-package directories, both named "utils"
+        write(tmp_path / 'scripts/utils.py', '')
+        write(tmp_path / 'tools/utils.py', 'import main\n')
+        write(tmp_path / 'tools/main.py', 'import utils\n')
+        graph = IncrementalGraph(tmp_path)
+        assert {'utils'} == graph.imports['main']
+        check_graph(graph)
+        (tmp_path / 'scripts/utils.py').unlink()
+        graph.update()
+        assert {'utils'} == graph.imports['main']
+        assert {('main', 'utils'), ('utils', 'main')} == graph.cycle_edges
+        check_graph(graph)
+        (tmp_path / 'tools/utils.py').unlink()
+        graph.update()
+        assert {'main': set()} == graph.imports
+        check_graph(graph)
+        write(tmp_path / 'scripts/utils.py', 'import main\n')
+        graph.update()
+        check_graph(graph)
+
+    def test_random_changes_duplicate_names(self, tmp_path):
+        rand = random.Random(7)
+        names = ['m{}'.format(i) for i in range(6)]
+        graph = IncrementalGraph(tmp_path)
+        for _ in range(40):
+            for name in rand.sample(names, 3):
+                path = tmp_path / rand.choice(['a', 'b']) / (name + '.py')
+                if path.exists() and rand.random() < 0.3:
+                    path.unlink()
+                    continue
+                deps = rand.sample(names, rand.randint(0, 3))
+                write(path, ''.join('import {}\n'.format(dep) for dep in deps))
+            graph.update()
+            check_graph(graph)
+
+
+def test_run(tmp_path):
+    write(tmp_path / 'a.py', '')
+    write(tmp_path / 'b.py', '')
+    graph = IncrementalGraph(tmp_path)
+    write(tmp_path / 'a.py', 'import b\n')
+    write(tmp_path / 'b.py', 'import a\n')
+    out = io.StringIO()
+    run(graph, interval=0, max_iterations=2, out=out)
+    lines = out.getvalue().splitlines()
+    assert lines[0].startswith('2 modified, 0 added, 0 removed: updated in')
+    assert lines[1:] == ['Circular dependencies detected:',
+                         '  a -> b', '  b -> a']
+
+
+def test_cli_watch_requires_directory(tmp_path, capsys):
+    write(tmp_path / 'a.py', '')
+    with pytest.raises(SystemExit) as exc_info:
+        main(['import_deps', str(tmp_path / 'a.py'), '--watch'])
+    assert exc_info.value.code == 1
+    assert '--watch requires a package directory' in capsys.readouterr().err
+
+
+def test_cli_watch(tmp_path, capsys, monkeypatch):
+    write(tmp_path / 'a.py', 'import b\n')
+    write(tmp_path / 'b.py', 'import a\n')
+    graphs = []
+    monkeypatch.setattr(watch, 'run',
+                        lambda graph, interval: graphs.append(graph))
+    with pytest.raises(SystemExit) as exc_info:
+        main(['import_deps', str(tmp_path), '--watch', '--no-cache'])
+    assert exc_info.value.code == 0
+    assert {'a': {'b'}, 'b': {'a'}} == graphs[0].imports
+    assert capsys.readouterr().out.startswith('Watching 2 modules: loaded in')